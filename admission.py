@@ -0,0 +1,174 @@
+import logging
+import time
+from typing import List, Dict, Any, Callable, Optional, Set
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - ADMISSION - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+TEMP_LIMIT = 83 # Consumer GPUs start pulling clocks around here
+TEMP_MARGIN = 5 # Delay jobs predicted to run this far past TEMP_LIMIT
+TREND_WINDOW = 60 # Seconds of temperature history used for the trend, and how far ahead it is projected
+MEMORY_HEADROOM_MB = 512 # CUDA context and allocator slack on top of the job's own need
+THROTTLE_SLOWDOWN_PER_C = 0.03 # Roughly 3% of clocks lost per degree over the limit
+DEFAULT_TRANSFER_FRACTION = 0.1 # Share of job time spent on host<->device copies
+RETRY_AFTER = 15 # Seconds before a delayed job is re-evaluated
+MAX_DELAY = 600 # A job delayed this long is rejected
+
+def link_factor(gpu: Dict[str, Any]) -> float:
+    """
+    Negotiated / maximum PCIe lane count (1.0 when unknown). Only the width is
+    used: idle GPUs drop their link generation to save power, so the current
+    generation says little until the job is already running.
+    """
+    current, maximum = gpu.get("pcie_width_current", -1), gpu.get("pcie_width_max", -1)
+    if current is None or maximum is None or current <= 0 or maximum <= 0:
+        return 1.0
+    return min(current / maximum, 1.0)
+
+class AdmissionController:
+    """
+    Decides whether a placed job should start now, based on live telemetry of
+    the devices it was given.
+
+    For each device: current temperature and its trend (from the telemetry
+    sampler) projected over TREND_WINDOW seconds, or the job's
+    expected_duration if shorter (a linear fit says little about heating
+    further out than it has seen), free memory against
+    the job's min_memory_mb plus headroom, and the negotiated link width.
+    The decision is one of:
+      accept - start now; expected_slowdown estimates thermal and link losses
+      delay  - a device is throttling, about to, or short on free memory; retry later
+      reject - the job has been delayed past MAX_DELAY, or the expected link
+               slowdown exceeds the job's max_slowdown (that will not improve)
+
+    trend(uuid) returns the temperature slope in degrees per second.
+
+    miner_gpus() returns the UUIDs the miner is running on (None: unknown, so
+    all of them), read by refresh() before each round of decisions. The miner
+    is paused before a job starts, so its heat is not held against the job on
+    those devices. With frees_vram (the miner is stopped for jobs) memory the
+    miner holds is counted as reclaimable, so only the device total is checked;
+    otherwise the miner keeps its memory through the job, and a shortfall on
+    its devices rejects the job at once rather than waiting for it to clear.
+    """
+
+    def __init__(self, trend: Optional[Callable[[str], float]] = None, frees_vram: bool = False,
+                 temp_limit: float = TEMP_LIMIT, max_delay: float = MAX_DELAY,
+                 miner_gpus: Optional[Callable[[], Optional[Set[str]]]] = None):
+        self.trend = trend
+        self.frees_vram = frees_vram
+        self.temp_limit = temp_limit
+        self.max_delay = max_delay
+        self.miner_gpus = miner_gpus
+        self.mining: Optional[Set[str]] = set() # Devices the miner runs on (None = all)
+        self.first_seen: Dict[str, float] = {} # job_id -> first evaluation time
+
+    def refresh(self):
+        """Re-reads where the miner runs. Blocking (walks the process table); call off the event loop."""
+        if self.miner_gpus is None:
+            return
+        try:
+            self.mining = self.miner_gpus()
+        except Exception as e:
+            logger.warning(f"Could not locate the miner: {e}")
+            self.mining = None
+
+    def forget(self, job_id: str):
+        """Drops the delay history of a job that has finished or left the queue."""
+        self.first_seen.pop(str(job_id), None)
+
+    def assess(self, gpu: Dict[str, Any], need_mb: int, horizon: float) -> Dict[str, Any]:
+        """Per-device view: projected temperature, memory fit and slowdown factors."""
+        temperature = gpu.get("temperature", 0) or 0
+        mining = self.mining is None or gpu["uuid"] in self.mining
+        # The miner's load (and the rise it causes) stops when it is paused for the job
+        slope = self.trend(gpu["uuid"]) if self.trend and not mining else 0.0
+        # Only a rising trend is projected; a cooling device is judged on its current reading
+        predicted = temperature + max(slope, 0.0) * horizon
+        total = gpu.get("memory_total", 0)
+        free = total if self.frees_vram else total - gpu.get("memory_used", 0)
+        link = link_factor(gpu)
+
+        reason = None
+        clears = True
+        if temperature >= self.temp_limit and not mining:
+            reason = f"GPU {gpu.get('index', gpu['uuid'])} at {temperature}C (limit {self.temp_limit}C)"
+        elif predicted >= self.temp_limit + TEMP_MARGIN and not mining:
+            reason = f"GPU {gpu.get('index', gpu['uuid'])} heading for {predicted:.0f}C ({slope * 60:+.1f}C/min)"
+        elif need_mb and free < need_mb + MEMORY_HEADROOM_MB:
+            reason = f"GPU {gpu.get('index', gpu['uuid'])} has {free} MB free, job needs {need_mb} MB + {MEMORY_HEADROOM_MB} MB headroom"
+            if mining and not self.frees_vram:
+                # A paused miner keeps its memory, so this shortfall does not clear by waiting
+                reason += " (held by the miner through the job)"
+                clears = False
+
+        return {
+            "uuid": gpu["uuid"],
+            "ready": reason is None,
+            "reason": reason,
+            "clears": clears,
+            "predicted_temp": round(predicted, 1),
+            "fits": not need_mb or free >= need_mb + MEMORY_HEADROOM_MB,
+            "thermal_slowdown": 1 + THROTTLE_SLOWDOWN_PER_C * max(predicted - self.temp_limit, 0),
+            "link_factor": link
+        }
+
+    def unready(self, job_data: Dict[str, Any], gpus: List[Dict[str, Any]]) -> Dict[str, str]:
+        """{uuid: reason} for devices the job should not be started on right now."""
+        need_mb, horizon = self._needs(job_data)
+        unready = {}
+        for gpu in gpus:
+            assessment = self.assess(gpu, need_mb, horizon)
+            if not assessment["ready"]:
+                unready[gpu["uuid"]] = assessment["reason"]
+        return unready
+
+    @staticmethod
+    def _needs(job_data: Dict[str, Any]):
+        need_mb = int(job_data.get("min_memory_mb", 0))
+        horizon = min(float(job_data.get("expected_duration", TREND_WINDOW)), TREND_WINDOW)
+        return need_mb, horizon
+
+    def decide(self, job_data: Dict[str, Any], gpus: List[Dict[str, Any]],
+               blocked: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """
+        Decision for a job on the given devices. blocked carries reasons for
+        devices the scheduler could not place the job on because of this
+        controller; when set the job is delayed (or rejected once it has waited
+        past max_delay).
+        """
+        job_id = str(job_data.get("job_id"))
+        now = time.time()
+        waited = now - self.first_seen.setdefault(job_id, now)
+        need_mb, horizon = self._needs(job_data)
+        assessments = [self.assess(gpu, need_mb, horizon) for gpu in gpus]
+
+        transfer = float(job_data.get("transfer_fraction", DEFAULT_TRANSFER_FRACTION))
+        thermal = max((a["thermal_slowdown"] for a in assessments), default=1.0)
+        link = min((a["link_factor"] for a in assessments), default=1.0)
+        link_slowdown = 1 + transfer * (1 / link - 1)
+        decision = {
+            "decision": "accept",
+            "reason": "ok",
+            "fits": all(a["fits"] for a in assessments),
+            "predicted_temp": max((a["predicted_temp"] for a in assessments), default=None),
+            "expected_slowdown": round(thermal * link_slowdown, 3),
+            "waited": round(waited, 1)
+        }
+
+        reasons = list((blocked or {}).values()) + [a["reason"] for a in assessments if not a["ready"]]
+        unready = [a for a in assessments if not a["ready"]]
+        max_slowdown = job_data.get("max_slowdown")
+        if max_slowdown is not None and link_slowdown > float(max_slowdown):
+            decision.update(decision="reject", reason=f"Link at {link:.0%} of its width: expected slowdown {link_slowdown:.2f}x exceeds {max_slowdown}x")
+        elif unready and not any(a["clears"] for a in unready):
+            decision.update(decision="reject", reason=unready[0]["reason"])
+        elif reasons and waited >= self.max_delay:
+            decision.update(decision="reject", reason=f"Delayed {waited:.0f}s: {reasons[0]}")
+        elif reasons:
+            decision.update(decision="delay", reason=reasons[0], retry_after=RETRY_AFTER)
+
+        if decision["decision"] != "delay":
+            self.first_seen.pop(job_id, None)
+        return decision
@@ -0,0 +1,437 @@
+"""
+Benchmarks for the node agent's hot paths, run against mock backends.
+
+    python bench.py                          # run, write bench_results.json
+    python bench.py --save-baseline          # run and store as bench_baseline.json
+    python bench.py --baseline bench_baseline.json --tolerance 0.25
+
+Exits with status 1 when any benchmark's median is slower than the baseline
+by more than the tolerance, so it can gate fleet rollouts.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import platform
+import statistics
+import sys
+import time
+from typing import List, Dict, Any, Callable
+
+import classifier
+import hardware
+import metrics
+import process_controller
+import simulator
+
+# Benchmarks should not be dominated by log formatting
+logging.disable(logging.WARNING)
+
+# --- Harness ---
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    """Summary statistics for samples in milliseconds."""
+    samples = sorted(samples)
+    return {
+        "iterations": len(samples),
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "p50_ms": round(samples[len(samples) // 2], 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(0.95 * len(samples)))], 4),
+        "min_ms": round(samples[0], 4)
+    }
+
+def measure(fn: Callable[[], Any], iterations: int, warmup: int = 2) -> Dict[str, Any]:
+    """Times fn() and returns summary statistics in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return summarize(samples)
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, min_delta_ms: float = 0.5) -> List[str]:
+    """
+    Returns a line per benchmark whose median regressed beyond tolerance.
+    Slowdowns smaller than min_delta_ms are treated as noise.
+    """
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base or "p50_ms" not in base or "p50_ms" not in current:
+            continue
+        ratio = current["p50_ms"] / base["p50_ms"] if base["p50_ms"] else 1.0
+        current["vs_baseline"] = round(ratio, 3)
+        if ratio > 1 + tolerance and current["p50_ms"] - base["p50_ms"] >= min_delta_ms:
+            regressions.append(f"{name}: p50 {current['p50_ms']}ms vs baseline {base['p50_ms']}ms ({ratio:.2f}x)")
+    return regressions
+
+# --- Mock backends ---
+
+def scaled_mock_nvml(device_count: int):
+    """MockNVML scaled to device_count identical devices, with constant readings."""
+    return simulator.FleetNVML(device_count, static=True)
+
+class FakeProcess:
+    def __init__(self, table, pid):
+        if pid not in table:
+            raise process_controller.psutil.NoSuchProcess(pid)
+        self.pid = pid
+        self._entry = table[pid]
+
+    def oneshot(self):
+        return contextlib.nullcontext()
+
+    def name(self):
+        return self._entry["name"]
+
+    def cmdline(self):
+        return self._entry["cmdline"]
+
+    def create_time(self):
+        return self._entry["create_time"]
+
+    def status(self):
+        return "sleeping"
+
+    def parents(self):
+        return []
+
+    def children(self, recursive=False):
+        return []
+
+class FakePsutil:
+    """Just enough of psutil for MinerController, over a synthetic process table."""
+
+    def __init__(self, process_count: int):
+        real = process_controller.psutil
+        self.NoSuchProcess = real.NoSuchProcess
+        self.AccessDenied = real.AccessDenied
+        self.ZombieProcess = real.ZombieProcess
+        self.STATUS_ZOMBIE = real.STATUS_ZOMBIE
+        self.table = {
+            pid: {"name": "python3" if pid % 7 == 0 else f"worker-{pid % 50}",
+                  "cmdline": ["/usr/bin/python3", f"/srv/app/task_{pid}.py", "--flag"] if pid % 7 == 0 else [f"worker-{pid % 50}"],
+                  "create_time": 1000.0 + pid}
+            for pid in range(2, process_count + 2)
+        }
+        # One real miner at the end of the table
+        miner_pid = process_count + 2
+        self.table[miner_pid] = {"name": "t-rex", "cmdline": ["t-rex", "-a", "ethash"], "create_time": 5000.0}
+
+    def pids(self):
+        return list(self.table)
+
+    def Process(self, pid):
+        return FakeProcess(self.table, pid)
+
+# --- Benchmarks ---
+
+def bench_audit(devices: int, iterations: int) -> Dict[str, Any]:
+    nvml = scaled_mock_nvml(devices)
+    session = hardware.NVMLSession(nvml=nvml)
+    results = {f"audit_gpu_warm[{devices}]": measure(session.poll, iterations)}
+
+    def cold():
+        # Equivalent of the old per-call init + full inventory + shutdown
+        s = hardware.NVMLSession(nvml=nvml)
+        s.poll()
+        s.close()
+
+    results[f"audit_gpu_cold[{devices}]"] = measure(cold, iterations)
+    return results
+
+def bench_placement(devices: int, iterations: int) -> Dict[str, Any]:
+    """Inventory with sysfs NUMA resolution, and per-job placement lookups, on a dual-socket fixture."""
+    import tempfile
+    nvml = scaled_mock_nvml(devices)
+    bus_ids = [hardware._to_str(nvml.nvmlDeviceGetPciInfo(f"SimHandle_{i}").busId) for i in range(devices)]
+    with tempfile.TemporaryDirectory() as root:
+        simulator.build_sysfs(root, bus_ids, nodes=2)
+
+        def cold():
+            s = hardware.NVMLSession(nvml=nvml, sysfs_root=root)
+            s.poll()
+            s.close()
+
+        session = hardware.NVMLSession(nvml=nvml, sysfs_root=root)
+        gpus = session.poll()
+        first, last = gpus[0]["uuid"], gpus[-1]["uuid"]
+        if session.placement([first]) != {"cpuset_cpus": "0-7", "cpuset_mems": "0"} or \
+                (devices > 1 and session.placement([first, last])):
+            raise RuntimeError(f"Unexpected NUMA placement: {session.placement([first])}")
+        return {
+            f"audit_gpu_cold_numa[{devices}]": measure(cold, iterations),
+            f"numa_placement[{devices}]": measure(lambda: session.placement([first]), iterations)
+        }
+
+def bench_metrics(iterations: int, calls: int = 1000) -> Dict[str, Any]:
+    """Cost of the always-on instrumentation: timers and a scrape."""
+    def timers():
+        for _ in range(calls):
+            with metrics.timer("bench_seconds", path="hot"):
+                pass
+
+    results = {f"metrics_timer[{calls}]": measure(timers, iterations)}
+    results["metrics_render"] = measure(metrics.render, iterations)
+    return results
+
+def bench_classify(size: int, iterations: int) -> Dict[str, Any]:
+    inventory = [
+        {"index": i, "name": "NVIDIA GeForce RTX 3090", "uuid": f"GPU-{i:08d}", "pci_bus_id": f"0000:{i % 256:02x}:00.0",
+         "memory_total": 24576, "pcie_gen_current": 1 + i % 4, "pcie_width_current": (1, 4, 8, 16)[i % 4],
+         "driver_version": "535.104"}
+        for i in range(size)
+    ]
+    results = {f"classify_gpus[{size}]": measure(lambda: classifier.classify_gpus(inventory), iterations)}
+    columns = classifier.to_columns(inventory)
+    results[f"classify_columns[{size}]"] = measure(lambda: classifier.classify_columns(columns), iterations)
+    return results
+
+def bench_miner_discovery(processes: int, iterations: int) -> Dict[str, Any]:
+    fake = FakePsutil(processes)
+    real = process_controller.psutil
+    process_controller.psutil = fake
+    try:
+        def cold():
+            process_controller.MinerController().refresh(full=True)
+
+        warm_ctrl = process_controller.MinerController()
+        warm_ctrl.refresh(full=True)
+        return {
+            f"find_miner_cold[{processes}]": measure(cold, iterations),
+            f"find_miner_incremental[{processes}]": measure(warm_ctrl.refresh, iterations)
+        }
+    finally:
+        process_controller.psutil = real
+
+def bench_report(nodes: int, iterations: int) -> Dict[str, Any]:
+    import importlib.util
+    import os
+    import tempfile
+    import reporter
+
+    fleet = classifier.classify_gpus([
+        {"index": i, "name": "NVIDIA GeForce RTX 4090", "uuid": f"GPU-FLEET-{i:08d}",
+         "memory_total": 24576, "pcie_gen_current": 4, "pcie_width_current": 16 if i % 3 else 1}
+        for i in range(nodes)
+    ])
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.pdf")
+        for fmt, name in (("pdf", f"generate_report[{nodes}]"), ("jsonl", f"generate_report_jsonl[{nodes}]"),
+                          ("csv", f"generate_report_csv[{nodes}]")):
+            render = lambda: reporter.generate_report(fleet, path, force=True, formats=(fmt,))
+            # reporter imports fpdf lazily and logs (rather than raises) a failed render
+            if fmt == "pdf" and importlib.util.find_spec("fpdf") is None:
+                results[name] = {"skipped": "No module named 'fpdf'"}
+            elif not render():
+                results[name] = {"skipped": f"{fmt} report was not written"}
+            else:
+                results[name] = measure(render, iterations, warmup=1)
+        return results
+
+def bench_heartbeat(iterations: int) -> Dict[str, Any]:
+    name = "heartbeat_roundtrip"
+    try:
+        import aiohttp
+        from aiohttp import web
+        import transport
+    except ImportError as e:
+        return {name: {"skipped": str(e)}}
+
+    async def run():
+        async def heartbeat(request):
+            await request.json()
+            return web.json_response({"command": "IDLE"})
+
+        app = web.Application()
+        app.router.add_post("/heartbeat", heartbeat)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        session_nvml = hardware.NVMLSession(nvml=scaled_mock_nvml(8))
+
+        async def payload():
+            gpus = session_nvml.poll()
+            return {"node_id": gpus[0]["uuid"], "status": "IDLE", "gpu_temp": gpus[0]["temperature"]}
+
+        samples = []
+        try:
+            async with aiohttp.ClientSession() as session:
+                channel = transport.JobChannel(session, f"http://127.0.0.1:{port}/heartbeat", payload, lambda data: None)
+                for i in range(iterations + 2):
+                    started = time.perf_counter()
+                    await channel.poll_once()
+                    if i >= 2: # Warmup
+                        samples.append((time.perf_counter() - started) * 1000)
+        finally:
+            await runner.cleanup()
+        return samples
+
+    return {name: summarize(asyncio.run(run()))}
+
+def bench_containers(concurrency: int, iterations: int) -> Dict[str, Any]:
+    """Concurrent job lifecycles through the asyncio Docker API against simulator.FakeDockerAPI."""
+    import os
+    import tempfile
+    import container_manager
+
+    name = f"container_lifecycle_async[{concurrency}]"
+    try:
+        import aiohttp # noqa: F401
+    except ImportError as e:
+        return {name: {"skipped": str(e)}}
+
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            fake = simulator.FakeDockerAPI(run_seconds=0.05)
+            client = container_manager.AsyncDocker(await fake.start(os.path.join(tmp, "docker.sock")))
+            samples = []
+            try:
+                for i in range(iterations + 1):
+                    started = time.perf_counter()
+                    outputs = await asyncio.gather(*(client.run("alpine", f"echo job-{n}") for n in range(concurrency)))
+                    if i: # First round is warmup
+                        samples.append((time.perf_counter() - started) * 1000)
+                    if any(f"job-{n}" not in out for n, out in enumerate(outputs)) or fake.containers:
+                        raise RuntimeError("Fake Docker lifecycle check failed")
+            finally:
+                await client.close()
+                await fake.stop()
+            return samples
+
+    return {name: summarize(asyncio.run(run()))}
+
+# Runs the real agent entry point in a fresh interpreter against a local stand-in
+# server (MockNVML, no Docker) and prints import and first-heartbeat times in ms.
+STARTUP_SCRIPT = r'''
+import asyncio, json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+from aiohttp import web
+
+async def run():
+    first = asyncio.get_running_loop().create_future()
+
+    async def heartbeat(request):
+        await request.read()
+        if not first.done():
+            first.set_result(time.perf_counter())
+        return web.json_response({"command": "IDLE"})
+
+    app = web.Application()
+    app.router.add_post("/heartbeat", heartbeat)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    main.C2_URL = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/heartbeat"
+    main.C2_WS_URL = None
+    agent = asyncio.create_task(main.main())
+    beat = await asyncio.wait_for(first, 60)
+    agent.cancel()
+    await runner.cleanup()
+    return beat
+
+beat = asyncio.run(run())
+print(json.dumps({"import_ms": (imported - started) * 1000, "first_heartbeat_ms": (beat - started) * 1000}))
+'''
+
+def bench_startup(iterations: int) -> Dict[str, Any]:
+    """Agent import time and time to the first heartbeat, each in a fresh process."""
+    import os
+    import subprocess
+    import tempfile
+
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)),
+                                                                     os.environ.get("PYTHONPATH")])))
+    imports, beats = [], []
+    for _ in range(iterations):
+        # Fresh working directory so no cached certificate or image state is reused
+        with tempfile.TemporaryDirectory() as tmp:
+            proc = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT], cwd=tmp, env=env,
+                                  capture_output=True, text=True, timeout=120)
+        if proc.returncode != 0:
+            # A crashed start is a failed startup budget, not a missing dependency
+            return {"agent_first_heartbeat": {"failed": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip()
+                                              else f"exit code {proc.returncode}"}}
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        imports.append(result["import_ms"])
+        beats.append(result["first_heartbeat_ms"])
+    return {"agent_import": summarize(imports), "agent_first_heartbeat": summarize(beats)}
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Node agent hot-path benchmarks")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--devices", type=int, default=8, help="Mock GPUs per node for audit_gpu")
+    parser.add_argument("--inventory", type=int, default=100000, help="GPUs in the classification inventory")
+    parser.add_argument("--processes", type=int, default=5000, help="Synthetic process table size")
+    parser.add_argument("--fleet", type=int, default=1000, help="Nodes in the fleet report")
+    parser.add_argument("--containers", type=int, default=32, help="Concurrent job lifecycles against the fake Docker API")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", default="bench_baseline.json")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5, help="Ignore slowdowns smaller than this")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed median slowdown vs baseline (0.25 = 25%%)")
+    parser.add_argument("--startup-runs", type=int, default=3, help="Fresh agent processes to time (0 = skip)")
+    parser.add_argument("--startup-budget-ms", type=float, default=2000, help="Fail if the median first heartbeat is slower")
+    args = parser.parse_args(argv)
+
+    results = {}
+    results.update(bench_audit(args.devices, args.iterations))
+    results.update(bench_classify(args.inventory, max(3, args.iterations // 10)))
+    results.update(bench_miner_discovery(args.processes, args.iterations))
+    results.update(bench_report(args.fleet, max(3, args.iterations // 10)))
+    results.update(bench_heartbeat(args.iterations))
+    results.update(bench_placement(args.devices, args.iterations))
+    results.update(bench_metrics(args.iterations))
+    results.update(bench_containers(args.containers, max(3, args.iterations // 10)))
+    if args.startup_runs > 0:
+        results.update(bench_startup(args.startup_runs))
+
+    regressions = []
+    first_beat = results.get("agent_first_heartbeat", {})
+    if "failed" in first_beat:
+        regressions.append(f"agent_first_heartbeat: agent failed to start ({first_beat['failed']})")
+    elif first_beat.get("p50_ms", 0) > args.startup_budget_ms:
+        regressions.append(f"agent_first_heartbeat: p50 {first_beat['p50_ms']}ms exceeds startup budget {args.startup_budget_ms}ms")
+    if not args.save_baseline:
+        try:
+            with open(args.baseline) as f:
+                regressions.extend(compare(results, json.load(f)["results"], args.tolerance, args.min_delta_ms))
+        except FileNotFoundError:
+            print(f"No baseline at {args.baseline}; skipping comparison.")
+
+    output = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args)
+        },
+        "results": results,
+        "regressions": regressions
+    }
+    with open(args.baseline if args.save_baseline else args.output, "w") as f:
+        json.dump(output, f, indent=2)
+
+    for name, result in results.items():
+        if "skipped" in result:
+            print(f"{name:<40} skipped ({result['skipped']})")
+        elif "failed" in result:
+            print(f"{name:<40} FAILED ({result['failed']})")
+        else:
+            print(f"{name:<40} p50 {result['p50_ms']:>10.3f} ms   p95 {result['p95_ms']:>10.3f} ms")
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
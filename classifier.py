@@ -1,13 +1,90 @@
-from typing import List, Dict, Any
+import string
+from typing import List, Dict, Any, Optional, Sequence
 
-def classify_gpus(gpu_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Usable PCIe throughput per lane in GB/s, by link generation
+PCIE_LANE_GBPS = {1: 0.25, 2: 0.5, 3: 0.985, 4: 1.969, 5: 3.938, 6: 7.563}
+
+# Tier rules are checked in order; the first match wins and the last rule should be a catch-all.
+# Conditions: min_pcie_width, min_bandwidth_gbps (gen x width), min_memory_mb, models (name substrings),
+# min_measured_gbps (benchmarked bandwidth, theoretical at the link's maximum generation when not measured) and
+# max_link_efficiency (measured / theoretical; only matches benchmarked devices).
+# Reasons are format strings over the numeric columns plus bandwidth_gbps and measured_gbps.
+DEFAULT_RULES = [
+    {"tier": "Tier B", "min_pcie_width": 8, "reason": "High Bandwidth (x{pcie_width_current})"},
+    {"tier": "Tier C", "reason": "Low Bandwidth (x{pcie_width_current}) - Mining Rig Detected"}
+]
+
+# Tiering on benchmarked bandwidth (see gpu_benchmark.annotate). 1.5 GB/s is roughly
+# what an x8 Gen1 or x4 Gen2 link delivers in practice; a link delivering less than
+# half its negotiated bandwidth points at a degraded riser.
+MEASURED_RULES = [
+    {"tier": "Tier C", "max_link_efficiency": 0.5, "reason": "Degraded Link ({measured_gbps} of {bandwidth_gbps} GB/s) - Check Riser"},
+    {"tier": "Tier B", "min_measured_gbps": 1.5, "reason": "High Bandwidth ({measured_gbps} GB/s)"},
+    {"tier": "Tier C", "reason": "Low Bandwidth ({measured_gbps} GB/s) - Mining Rig Detected"}
+]
+
+NUMERIC_COLUMNS = ("pcie_width_current", "pcie_gen_current", "pcie_gen_max", "memory_total", "h2d_gbps", "d2h_gbps")
+
+def pcie_bandwidth_gbps(gen, width) -> float:
+    """Theoretical one-direction link bandwidth; 0 for unknown links."""
+    if gen is None or width is None or width < 0:
+        return 0.0
+    return PCIE_LANE_GBPS.get(int(gen), 0.0) * width
+
+def fallback_gbps(gpu: Dict[str, Any]) -> float:
+    """
+    Theoretical bandwidth standing in for an unmeasured device. Uses the maximum
+    link generation: idle GPUs drop to a lower one to save power. Falls back to
+    the current generation when the maximum is unknown.
+    """
+    gen = gpu.get("pcie_gen_max", -1)
+    if gen is None or gen <= 0:
+        gen = gpu.get("pcie_gen_current", -1)
+    return pcie_bandwidth_gbps(gen, gpu.get("pcie_width_current", -1))
+
+def measured_gbps(gpu: Dict[str, Any]) -> Optional[float]:
+    """Slower direction of the benchmarked link, or None if the device was not measured."""
+    h2d, d2h = gpu.get("h2d_gbps", -1), gpu.get("d2h_gbps", -1)
+    if h2d is None or d2h is None or h2d < 0 or d2h < 0:
+        return None
+    return min(h2d, d2h)
+
+def rule_matches(rule: Dict[str, Any], gpu: Dict[str, Any]) -> bool:
+    """Evaluates one tier rule against a single GPU dict."""
+    bandwidth = pcie_bandwidth_gbps(gpu.get("pcie_gen_current", -1), gpu.get("pcie_width_current", -1))
+    measured = measured_gbps(gpu)
+    if "min_pcie_width" in rule and gpu.get("pcie_width_current", -1) < rule["min_pcie_width"]:
+        return False
+    if "min_bandwidth_gbps" in rule and bandwidth < rule["min_bandwidth_gbps"]:
+        return False
+    if "min_measured_gbps" in rule and (fallback_gbps(gpu) if measured is None else measured) < rule["min_measured_gbps"]:
+        return False
+    if "max_link_efficiency" in rule and (measured is None or bandwidth <= 0 or measured / bandwidth > rule["max_link_efficiency"]):
+        return False
+    if "min_memory_mb" in rule and gpu.get("memory_total", 0) < rule["min_memory_mb"]:
+        return False
+    if "models" in rule and not any(m in gpu.get("name", "") for m in rule["models"]):
+        return False
+    return True
+
+def classify_gpus(gpu_data: List[Dict[str, Any]], rules: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
     """
     Classifies GPUs into tiers based on hardware capabilities.
     
     Tiers:
     - Tier B (Inference): PCIe Width >= x8.
     - Tier C (Rendering/ZKP): PCIe Width < x8.
+
+    Pass rules (see DEFAULT_RULES) to classify with a custom rule set instead.
     """
+    if rules is not None:
+        return _classify_with_rules(gpu_data, rules)
+
     classified_data = []
     
     for gpu in gpu_data:
@@ -27,6 +104,159 @@ def classify_gpus(gpu_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         
     return classified_data
 
+
+def _classify_with_rules(gpu_data: List[Dict[str, Any]], rules: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    classified_data = []
+    for gpu in gpu_data:
+        gpu_info = gpu.copy()
+        rule = next((r for r in rules if rule_matches(r, gpu_info)), rules[-1])
+        fields = {name: gpu_info.get(name, -1) for name in NUMERIC_COLUMNS}
+        bandwidth = pcie_bandwidth_gbps(gpu_info.get("pcie_gen_current", -1), gpu_info.get("pcie_width_current", -1))
+        measured = measured_gbps(gpu_info)
+        fields["bandwidth_gbps"] = _display(bandwidth)
+        fields["measured_gbps"] = _display(fallback_gbps(gpu_info) if measured is None else measured)
+        gpu_info["tier"] = rule["tier"]
+        gpu_info["classification_reason"] = rule.get("reason", "").format(**fields)
+        classified_data.append(gpu_info)
+    return classified_data
+
+# --- Columnar (fleet-scale) path ---
+
+def to_columns(gpu_data: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """Converts a list of GPU dicts into {column: array} (lists when numpy is unavailable)."""
+    names = list(dict.fromkeys(key for gpu in gpu_data for key in gpu))
+    columns = {}
+    for key in names:
+        values = [gpu.get(key, -1 if key in NUMERIC_COLUMNS else "") for gpu in gpu_data]
+        columns[key] = np.asarray(values) if np is not None else values
+    return columns
+
+def from_columns(columns: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Converts {column: array} back into a list of GPU dicts."""
+    keys = list(columns)
+    values = [c.tolist() if hasattr(c, "tolist") else list(c) for c in columns.values()]
+    return [dict(zip(keys, row)) for row in zip(*values)]
+
+def _template_fields(template: str) -> List[str]:
+    return [field for _, field, _, _ in string.Formatter().parse(template) if field]
+
+def classify_columns(inventory, rules: Optional[List[Dict[str, Any]]] = None):
+    """
+    Assigns tiers in bulk to a columnar inventory.
+
+    Accepts {column: array} or a numpy structured array, with at least
+    pcie_width_current (and pcie_gen_current / memory_total / name for rules
+    that use them). Returns the same shape with "tier" and
+    "classification_reason" columns added. Tier labels come from the rules;
+    reasons are formatted once per distinct value combination, not per GPU.
+    """
+    rules = rules or DEFAULT_RULES
+    structured = np is not None and isinstance(inventory, np.ndarray) and inventory.dtype.names
+    columns = {name: inventory[name] for name in inventory.dtype.names} if structured else dict(inventory)
+
+    if np is None:
+        rows = _classify_with_rules(from_columns(columns), rules)
+        columns["tier"] = [r["tier"] for r in rows]
+        columns["classification_reason"] = [r["classification_reason"] for r in rows]
+        return columns
+
+    n = len(next(iter(columns.values()))) if columns else 0
+
+    def numeric(name, default):
+        if name in columns:
+            return np.asarray(columns[name], dtype=np.float64)
+        return np.full(n, default, dtype=np.float64)
+
+    width = numeric("pcie_width_current", -1)
+    gen = numeric("pcie_gen_current", -1)
+    gen_max = numeric("pcie_gen_max", -1)
+    memory = numeric("memory_total", 0)
+    lane_gbps = np.zeros(8, dtype=np.float64)
+    for g, gbps in PCIE_LANE_GBPS.items():
+        lane_gbps[g] = gbps
+    link = lambda g: np.where(width >= 0, lane_gbps[np.clip(g, 0, 7).astype(np.int64)] * width, 0.0)
+    bandwidth = link(gen)
+    h2d = numeric("h2d_gbps", -1)
+    d2h = numeric("d2h_gbps", -1)
+    benchmarked = (h2d >= 0) & (d2h >= 0)
+    # Unmeasured devices: theoretical bandwidth at the maximum link generation (see fallback_gbps)
+    measured = np.where(benchmarked, np.minimum(h2d, d2h), link(np.where(gen_max > 0, gen_max, gen)))
+    values = {"pcie_width_current": width, "pcie_gen_current": gen, "pcie_gen_max": gen_max, "memory_total": memory,
+              "h2d_gbps": h2d, "d2h_gbps": d2h, "bandwidth_gbps": bandwidth, "measured_gbps": measured}
+
+    # First matching rule per GPU; unmatched rows fall through to the last rule
+    assigned = np.full(n, len(rules) - 1, dtype=np.int64)
+    pending = np.ones(n, dtype=bool)
+    for index, rule in enumerate(rules):
+        mask = pending.copy()
+        if "min_pcie_width" in rule:
+            mask &= width >= rule["min_pcie_width"]
+        if "min_bandwidth_gbps" in rule:
+            mask &= bandwidth >= rule["min_bandwidth_gbps"]
+        if "min_memory_mb" in rule:
+            mask &= memory >= rule["min_memory_mb"]
+        if "min_measured_gbps" in rule:
+            mask &= measured >= rule["min_measured_gbps"]
+        if "max_link_efficiency" in rule:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                mask &= benchmarked & (bandwidth > 0) & (measured / bandwidth <= rule["max_link_efficiency"])
+        if "models" in rule:
+            names = np.asarray(columns.get("name", np.full(n, "")), dtype=str)
+            model_mask = np.zeros(n, dtype=bool)
+            for model in rule["models"]:
+                model_mask |= np.char.find(names, model) >= 0
+            mask &= model_mask
+        assigned[mask] = index
+        pending &= ~mask
+
+    tiers = np.asarray([rule["tier"] for rule in rules])[assigned]
+
+    # Format each reason once per distinct (rule, referenced values) combination,
+    # then expand with a single gather instead of building a string per GPU
+    reason_texts = []
+    codes = np.zeros(n, dtype=np.int64)
+    for index, rule in enumerate(rules):
+        selected = np.nonzero(assigned == index)[0]
+        if not len(selected):
+            continue
+        template = rule.get("reason", "")
+        fields = _template_fields(template)
+        if not fields:
+            codes[selected] = len(reason_texts)
+            reason_texts.append(template)
+            continue
+        # Combine per-field value codes into one integer key per GPU
+        key = np.zeros(len(selected), dtype=np.int64)
+        uniques = []
+        for field in fields:
+            field_values, field_codes = np.unique(values[field][selected], return_inverse=True)
+            key = key * len(field_values) + field_codes.reshape(-1)
+            uniques.append(field_values)
+        combo_keys, inverse = np.unique(key, return_inverse=True)
+        for combo_key in combo_keys.tolist():
+            parts = {}
+            for field, field_values in zip(reversed(fields), reversed(uniques)):
+                combo_key, code = divmod(combo_key, len(field_values))
+                parts[field] = _display(field_values[code])
+            reason_texts.append(template.format(**parts))
+        codes[selected] = len(reason_texts) - len(combo_keys) + inverse.reshape(-1)
+    reasons = np.asarray(reason_texts or [""])[codes]
+
+    if structured:
+        from numpy.lib import recfunctions
+        return recfunctions.append_fields(inventory, ["tier", "classification_reason"],
+                                          [tiers, reasons], usemask=False)
+
+    columns["tier"] = tiers
+    columns["classification_reason"] = reasons
+    return columns
+
+def _display(value: float):
+    """Renders whole numbers without a trailing .0, matching the dict path."""
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
 if __name__ == "__main__":
     import json
     
@@ -65,3 +295,18 @@ if __name__ == "__main__":
     print("\n--- Test Case 2: Ideal Data (Inference Node) ---")
     results_ideal = classify_gpus(ideal_data)
     print(json.dumps(results_ideal, indent=4))
+
+    # Test Case 3: Columnar path must agree with the list-of-dicts API
+    fleet = (mock_data + ideal_data) * 50000
+    columns = classify_columns(to_columns(fleet))
+    print("\n--- Test Case 3: Columnar Fleet (100k GPUs) ---")
+    print(from_columns(columns)[:2] == classify_gpus(fleet[:2]))
+
+    # Test Case 4: Benchmarked links - Gen4 x4 beats Gen1 x8, x16 riser delivering x1 speed
+    measured_data = [
+        dict(ideal_data[0], pcie_width_current=4, h2d_gbps=6.8, d2h_gbps=6.5),
+        dict(mock_data[0], pcie_width_current=8, h2d_gbps=1.4, d2h_gbps=1.3),
+        dict(ideal_data[0], h2d_gbps=1.6, d2h_gbps=1.5)
+    ]
+    print("\n--- Test Case 4: Measured Bandwidth ---")
+    print(json.dumps(classify_gpus(measured_data, MEASURED_RULES), indent=4))
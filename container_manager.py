@@ -1,28 +1,314 @@
+import asyncio
+import gzip
+import json
+import os
+import shlex
+import struct
 import time
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional
+from urllib.parse import quote
+
+import metrics
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - CONTAINER MGR - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def run_container(image: str, command: str, use_gpu: bool = False, timeout: int = 300) -> str:
+# Blocking Docker calls run here so the agent's event loop stays responsive
+MAX_CONCURRENT_CONTAINERS = 8
+HEALTH_CHECK_INTERVAL = 30 # Seconds between daemon pings on the shared clients
+PIN_TO_GPU_NUMA = True # Pin GPU jobs to the CPUs and memory node local to their devices
+
+_client = None
+_client_checked = 0.0
+_client_lock = threading.Lock()
+
+def get_client():
+    """
+    Shared docker.DockerClient for the whole agent. Created (and the API
+    version negotiated) once; pinged at most every HEALTH_CHECK_INTERVAL
+    seconds and rebuilt if the daemon connection has gone bad.
+    Raises docker.errors.DockerException when the engine is unreachable.
+    """
+    global _client, _client_checked
+    import docker
+    with _client_lock:
+        now = time.monotonic()
+        if _client is not None:
+            if now - _client_checked < HEALTH_CHECK_INTERVAL:
+                return _client
+            try:
+                _client.ping()
+                _client_checked = now
+                return _client
+            except Exception as e:
+                logger.warning(f"Docker client unhealthy ({e}). Reconnecting...")
+                try:
+                    _client.close()
+                except Exception:
+                    pass
+                _client = None
+        # Log streams and waits hold a connection each for the life of a job
+        _client = docker.from_env(max_pool_size=MAX_CONCURRENT_CONTAINERS * 3 + 2)
+        _client_checked = now
+        return _client
+
+class ContainerWatcher:
+    """
+    Supervises container exits for any number of containers from a single
+    Docker events stream, so an exit is noticed the moment the daemon reports it.
+    Falls back to a blocking container.wait() when the stream is unavailable.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters: Dict[str, threading.Event] = {}
+        self._stream = None
+
+    def _ensure_stream(self):
+        with self._lock:
+            if self._stream is not None:
+                return
+            # The request is issued here, so events after this point are never missed
+            self._stream = get_client().events(decode=True, filters={"type": "container", "event": "die"})
+            threading.Thread(target=self._pump, args=(self._stream,), name="container-events", daemon=True).start()
+
+    def _pump(self, stream):
+        try:
+            for event in stream:
+                with self._lock:
+                    waiter = self._waiters.get(event.get("id"))
+                if waiter:
+                    waiter.set()
+        except Exception as e:
+            logger.warning(f"Container event stream lost: {e}")
+        finally:
+            with self._lock:
+                if self._stream is stream:
+                    self._stream = None
+                # Wake everyone so they re-check status and resubscribe
+                for waiter in self._waiters.values():
+                    waiter.set()
+
+    def wait(self, container, timeout: float) -> bool:
+        """Blocks until the container exits (True) or the timeout passes (False)."""
+        deadline = time.time() + timeout
+        waiter = threading.Event()
+        with self._lock:
+            self._waiters[container.id] = waiter
+
+        try:
+            while True:
+                try:
+                    self._ensure_stream()
+                except Exception as e:
+                    logger.warning(f"Event stream unavailable ({e}). Waiting on container directly.")
+                    return self._wait_direct(container, deadline)
+
+                # The container may have exited before we subscribed
+                container.reload()
+                if container.status in ('exited', 'dead'):
+                    return True
+
+                remaining = deadline - time.time()
+                if remaining <= 0 or not waiter.wait(remaining):
+                    return False
+                waiter.clear()
+        finally:
+            with self._lock:
+                self._waiters.pop(container.id, None)
+
+    @staticmethod
+    def _wait_direct(container, deadline: float) -> bool:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        try:
+            container.wait(timeout=remaining)
+            return True
+        except Exception:
+            # requests raises ReadTimeout/ConnectionError when the wait times out
+            container.reload()
+            return container.status in ('exited', 'dead')
+
+_watcher = ContainerWatcher()
+
+class LogCapture:
+    """
+    Bounded capture of a container's output stream.
+    Keeps only the first head_bytes and last tail_bytes in memory, optionally spools
+    the full stream to a gzip file, and can be consumed live with `async for`.
+    The run paths set exit_code once the container (or exec) has exited; it
+    stays None when the job timed out or never ran.
+    """
+
+    def __init__(self, head_bytes: int = 64 * 1024, tail_bytes: int = 64 * 1024,
+                 spool_path: Optional[str] = None, live_chunks: int = 256):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.spool_path = spool_path
+        self.total_bytes = 0
+        self.dropped_chunks = 0 # Live chunks skipped because the consumer fell behind
+        self.exit_code: Optional[int] = None
+        self._head = bytearray()
+        self._tail = bytearray()
+        self._spool = gzip.open(spool_path, "wb") if spool_path else None
+        self._lock = threading.Lock()
+        self._closed = False
+        try:
+            self._loop = asyncio.get_running_loop()
+            self._live = asyncio.Queue(maxsize=live_chunks)
+        except RuntimeError:
+            # Created outside an event loop: no live consumers
+            self._loop = None
+            self._live = None
+
+    def feed(self, chunk: bytes):
+        """Adds a chunk of output. Safe to call from any thread."""
+        with self._lock:
+            self.total_bytes += len(chunk)
+            if self._spool:
+                self._spool.write(chunk)
+
+            rest = chunk
+            room = self.head_bytes - len(self._head)
+            if room > 0:
+                self._head += rest[:room]
+                rest = rest[room:]
+            if rest and self.tail_bytes:
+                self._tail += rest
+                # Trim lazily so trimming cost stays amortized
+                if len(self._tail) > 2 * self.tail_bytes:
+                    del self._tail[:-self.tail_bytes]
+
+        if chunk and self._loop:
+            self._loop.call_soon_threadsafe(self._offer, chunk)
+
+    def _offer(self, chunk):
+        try:
+            self._live.put_nowait(chunk)
+        except asyncio.QueueFull:
+            self.dropped_chunks += 1
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self._spool:
+                self._spool.close()
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._close_live)
+
+    def _close_live(self):
+        # The end marker must get through even if the queue is full
+        while self._live.full():
+            self._live.get_nowait()
+            self.dropped_chunks += 1
+        self._live.put_nowait(None)
+
+    def text(self) -> str:
+        """Returns head + tail, with a marker where output was elided."""
+        with self._lock:
+            tail = bytes(self._tail[-self.tail_bytes:]) if self.tail_bytes else b""
+            elided = self.total_bytes - len(self._head) - len(tail)
+            if elided > 0:
+                body = bytes(self._head) + f"\n... [{elided} bytes truncated] ...\n".encode() + tail
+            else:
+                body = bytes(self._head) + tail
+        return body.decode('utf-8', errors='replace').strip()
+
+    def __aiter__(self):
+        if self._live is None:
+            raise RuntimeError("LogCapture was created outside an event loop; live output is unavailable.")
+        return self
+
+    async def __anext__(self) -> str:
+        chunk = await self._live.get()
+        if chunk is None:
+            raise StopAsyncIteration
+        return chunk.decode('utf-8', errors='replace')
+
+def _stream_logs(container, capture: LogCapture):
+    try:
+        for chunk in container.logs(stream=True, follow=True):
+            capture.feed(chunk)
+    except Exception as e:
+        logger.warning(f"Log stream ended: {e}")
+
+def _gpu_requests(docker, use_gpu: bool, device_ids: Optional[List[str]] = None) -> list:
+    """Builds the Docker device requests for a job's GPUs."""
+    device_requests = []
+    if use_gpu:
+        try:
+            if device_ids:
+                device_requests.append(docker.types.DeviceRequest(device_ids=list(device_ids), capabilities=[['gpu']]))
+                logger.info(f"GPU Passthrough Enabled: {', '.join(device_ids)}")
+            else:
+                # Request all GPUs
+                device_requests.append(docker.types.DeviceRequest(count=-1, capabilities=[['gpu']]))
+                logger.info("GPU Passthrough Enabled.")
+        except Exception as e:
+            logger.warning(f"Failed to configure GPU request: {e}. Falling back to CPU.")
+    return device_requests
+
+def job_placement(use_gpu: bool, device_ids: Optional[List[str]],
+                  placement: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """
+    cpuset_cpus/cpuset_mems for a job. An explicit placement wins ({} disables
+    pinning); otherwise GPU jobs on specific devices are pinned to the CPUs
+    and memory of the NUMA nodes those devices hang off.
+    """
+    if placement is not None:
+        return placement
+    if not (PIN_TO_GPU_NUMA and use_gpu and device_ids):
+        return {}
+    try:
+        import hardware
+        placement = hardware.placement(device_ids)
+    except Exception as e:
+        logger.warning(f"Could not resolve GPU NUMA placement: {e}")
+        return {}
+    if placement:
+        logger.info(f"Pinning to CPUs {placement['cpuset_cpus']} / NUMA node(s) {placement['cpuset_mems']}")
+    return placement
+
+def run_container(image: str, command: str, use_gpu: bool = False, timeout: int = 300,
+                  device_ids: Optional[List[str]] = None, log_capture: Optional[LogCapture] = None,
+                  placement: Optional[Dict[str, str]] = None) -> str:
     """
     Runs a Docker container with optional GPU support and a strict timeout.
+    device_ids restricts the container to specific GPU UUIDs; by default all GPUs are attached.
+    The container is pinned per job_placement() unless placement is given.
+    Output is streamed into log_capture (a default bounded capture if not given);
+    the returned string is its head and tail, and log_capture.exit_code the
+    container's exit status.
     """
     # CRITICAL FIX: Import inside function to prevent crash if SDK is missing
     try:
         import docker
     except ImportError:
         logger.error("Docker SDK (python-docker) is not installed.")
+        if log_capture:
+            log_capture.close()
         return "ERROR: DOCKER_SDK_MISSING"
 
     client = None
     container = None
+    log_thread = None
+    run_started = None
+    outcome = "error"
+    capture = log_capture or LogCapture()
     
     try:
-        client = docker.from_env()
+        client = get_client()
     except docker.errors.DockerException:
         logger.error("Docker Engine is not running.")
+        metrics.inc("container_runs_total", outcome="offline")
+        capture.close()
         return "ERROR: DOCKER_ENGINE_OFFLINE"
 
     try:
@@ -31,17 +317,11 @@ def run_container(image: str, command: str, use_gpu: bool = False, timeout: int
             client.images.get(image)
         except docker.errors.ImageNotFound:
             logger.info(f"Pulling image: {image}...")
-            client.images.pull(image)
+            with metrics.timer("image_pull_seconds"):
+                client.images.pull(image)
 
         # 2. Configure GPU Request
-        device_requests = []
-        if use_gpu:
-            try:
-                # Request all GPUs
-                device_requests.append(docker.types.DeviceRequest(count=-1, capabilities=[['gpu']]))
-                logger.info("GPU Passthrough Enabled.")
-            except Exception as e:
-                logger.warning(f"Failed to configure GPU request: {e}. Falling back to CPU.")
+        device_requests = _gpu_requests(docker, use_gpu, device_ids)
 
         # 3. Run Container (Detached)
         logger.info(f"Starting container: {image} (Timeout: {timeout}s)")
@@ -49,34 +329,40 @@ def run_container(image: str, command: str, use_gpu: bool = False, timeout: int
             image,
             command,
             detach=True,
-            device_requests=device_requests
+            device_requests=device_requests,
+            **job_placement(use_gpu, device_ids, placement)
         )
+        run_started = time.perf_counter()
 
-        # 4. Watchdog (Timeout Logic)
-        start_time = time.time()
-        while True:
-            container.reload() # Refresh status
-            if container.status == 'exited':
-                break
-            
-            if time.time() - start_time > timeout:
-                logger.error(f"Container timed out after {timeout}s. Killing...")
-                container.kill()
-                raise TimeoutError(f"Container execution exceeded {timeout}s limit.")
-            
-            time.sleep(1) # Poll every second
+        # 4. Stream Logs while the job runs
+        log_thread = threading.Thread(target=_stream_logs, args=(container, capture), name="container-logs", daemon=True)
+        log_thread.start()
+
+        # 5. Watchdog (Timeout Logic) - event driven, no status polling
+        if not _watcher.wait(container, timeout):
+            logger.error(f"Container timed out after {timeout}s. Killing...")
+            container.kill()
+            raise TimeoutError(f"Container execution exceeded {timeout}s limit.")
 
-        # 5. Capture Logs
-        logs = container.logs().decode('utf-8').strip()
-        return logs
+        container.reload()
+        capture.exit_code = container.attrs.get("State", {}).get("ExitCode")
+        # The stream ends on its own once the container has exited
+        log_thread.join(timeout=10)
+        outcome = "done" if capture.exit_code == 0 else "exit_nonzero"
+        return capture.text()
 
     except TimeoutError as te:
+        outcome = "timeout"
         return f"TIMEOUT_ERROR: {str(te)}"
     except Exception as e:
         logger.error(f"Container Execution Failed: {e}")
+        outcome = "error"
         return f"EXECUTION_ERROR: {str(e)}"
         
     finally:
+        metrics.inc("container_runs_total", outcome=outcome)
+        if run_started is not None:
+            metrics.observe("container_run_seconds", time.perf_counter() - run_started, outcome=outcome)
         # 6. Cleanup
         if container:
             try:
@@ -84,6 +370,537 @@ def run_container(image: str, command: str, use_gpu: bool = False, timeout: int
                 logger.info("Container removed.")
             except Exception as e:
                 logger.warning(f"Failed to remove container: {e}")
+        if log_thread:
+            log_thread.join(timeout=1)
+        capture.close()
+
+_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_CONTAINERS, thread_name_prefix="container")
+
+# --- Asyncio-native Docker Engine API ---
+
+class DockerAPIError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"Docker API {status}: {message}")
+        self.status = status
+
+class AsyncDocker:
+    """
+    Minimal Docker Engine API client on aiohttp, for driving many container
+    lifecycles from the event loop without a thread per job.
+
+    Talks to DOCKER_HOST (unix:// or plain tcp://; TLS is not supported here,
+    use run_container() for that) or, when unset, the local socket on POSIX
+    hosts. The API version is negotiated once per connection. The connection is health-checked with /_ping at most every
+    HEALTH_CHECK_INTERVAL seconds and rebuilt after a connection error.
+    """
+
+    DEFAULT_SOCKET = "/var/run/docker.sock"
+
+    def __init__(self, host: Optional[str] = None):
+        host = host or os.environ.get("DOCKER_HOST")
+        if not host:
+            # Docker Desktop on Windows listens on a named pipe, which only docker-py speaks
+            if os.name != "posix" or not os.path.exists(self.DEFAULT_SOCKET):
+                raise ValueError(f"No Docker socket at {self.DEFAULT_SOCKET}")
+            host = "unix://" + self.DEFAULT_SOCKET
+        if os.environ.get("DOCKER_TLS_VERIFY") or not host.startswith(("unix://", "tcp://")):
+            raise ValueError(f"Unsupported Docker host for the async API: {host}")
+        self.host = host
+        self._auth_configs = None
+        self._session = None
+        self._base = None
+        self._checked = 0.0
+        self._lock = None
+
+    async def _connect(self):
+        import aiohttp
+        if self.host.startswith("unix://"):
+            connector = aiohttp.UnixConnector(path=self.host[len("unix://"):])
+            root = "http://docker"
+        else:
+            connector = aiohttp.TCPConnector()
+            root = "http://" + self.host[len("tcp://"):]
+        # No total timeout: log streams and waits last as long as the job
+        session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=None, connect=10))
+        try:
+            async with session.get(f"{root}/version") as response:
+                version = (await response.json())["ApiVersion"]
+        except Exception:
+            await session.close()
+            raise
+        self._session = session
+        self._base = f"{root}/v{version}"
+        self._checked = time.monotonic()
+
+    async def _ensure(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # One caller connects or health-checks; concurrent callers wait and reuse the result
+        async with self._lock:
+            if self._session is None or self._session.closed:
+                await self._connect()
+            elif time.monotonic() - self._checked > HEALTH_CHECK_INTERVAL:
+                try:
+                    await self.ping()
+                except Exception as e:
+                    logger.warning(f"Docker API unhealthy ({e}). Reconnecting...")
+                    await self.close()
+                    await self._connect()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def ping(self):
+        root = self._base.rsplit("/", 1)[0]
+        async with self._session.get(f"{root}/_ping") as response:
+            if response.status != 200:
+                raise DockerAPIError(response.status, "ping failed")
+        self._checked = time.monotonic()
+
+    async def _request(self, method: str, path: str, expect_json: bool = True, **kwargs) -> Any:
+        import aiohttp
+        await self._ensure()
+        try:
+            async with self._session.request(method, self._base + path, **kwargs) as response:
+                if response.status >= 400:
+                    raise DockerAPIError(response.status, (await response.text()).strip())
+                if expect_json and response.content_type == "application/json":
+                    return await response.json()
+                await response.read()
+                return None
+        except aiohttp.ClientConnectionError:
+            # Force a reconnect (and version negotiation) on the next call
+            await self.close()
+            raise
+
+    async def image_exists(self, image: str) -> bool:
+        try:
+            await self._request("GET", f"/images/{quote(image, safe='')}/json")
+            return True
+        except DockerAPIError as e:
+            if e.status == 404:
+                return False
+            raise
+
+    @staticmethod
+    def split_reference(image: str):
+        """(repository, tag or digest) of an image reference; the tag defaults to latest."""
+        if "@" in image:
+            return tuple(image.split("@", 1))
+        if ":" in image.rsplit("/", 1)[-1]:
+            name, _, tag = image.rpartition(":")
+            return name, tag
+        return image, "latest"
+
+    def _auth_header(self, name: str) -> Optional[str]:
+        """X-Registry-Auth for a repository, from the same Docker config docker-py pulls with."""
+        try:
+            from docker import auth
+        except ImportError:
+            return None
+        try:
+            if self._auth_configs is None:
+                self._auth_configs = auth.load_config()
+            registry, _ = auth.resolve_repository_name(name)
+            authcfg = auth.resolve_authconfig(self._auth_configs, registry)
+        except Exception as e:
+            logger.warning(f"Could not resolve registry credentials for {name}: {e}")
+            return None
+        return auth.encode_header(authcfg).decode() if authcfg else None
+
+    async def pull(self, image: str):
+        name, tag = self.split_reference(image)
+        # Credential helpers may run a subprocess
+        header = await asyncio.get_running_loop().run_in_executor(None, self._auth_header, name)
+        headers = {"X-Registry-Auth": header} if header else {}
+        await self._ensure()
+        async with self._session.post(f"{self._base}/images/create", params={"fromImage": name, "tag": tag},
+                                      headers=headers) as response:
+            if response.status >= 400:
+                raise DockerAPIError(response.status, (await response.text()).strip())
+            # Progress is streamed as JSON lines until the pull completes; failures arrive in-stream
+            async for line in response.content:
+                if line.strip():
+                    progress = json.loads(line)
+                    if "error" in progress:
+                        raise DockerAPIError(response.status, progress["error"])
+
+    async def create(self, image: str, command, use_gpu: bool = False, device_ids: Optional[List[str]] = None,
+                     host_config: Optional[Dict[str, Any]] = None, placement: Optional[Dict[str, str]] = None) -> str:
+        config: Dict[str, Any] = {"Image": image, "HostConfig": dict(host_config or {})}
+        if placement:
+            config["HostConfig"].update({"CpusetCpus": placement["cpuset_cpus"], "CpusetMems": placement["cpuset_mems"]})
+        if command:
+            config["Cmd"] = shlex.split(command) if isinstance(command, str) else list(command)
+        if use_gpu:
+            request = {"Driver": "", "Capabilities": [["gpu"]]}
+            request.update({"DeviceIDs": list(device_ids)} if device_ids else {"Count": -1})
+            config["HostConfig"]["DeviceRequests"] = [request]
+        return (await self._request("POST", "/containers/create", json=config))["Id"]
+
+    async def start(self, container_id: str):
+        await self._request("POST", f"/containers/{container_id}/start")
+
+    async def wait(self, container_id: str, timeout: Optional[float] = None) -> int:
+        """Waits for the container to exit and returns its exit code. Raises asyncio.TimeoutError."""
+        result = await asyncio.wait_for(self._request("POST", f"/containers/{container_id}/wait"), timeout)
+        return result.get("StatusCode", -1)
+
+    async def logs(self, container_id: str, follow: bool = True) -> AsyncIterator[bytes]:
+        """Yields output chunks (stdout and stderr), demultiplexed from the Docker stream format."""
+        import aiohttp
+        await self._ensure()
+        params = {"stdout": "1", "stderr": "1", "follow": "1" if follow else "0"}
+        try:
+            async with self._session.get(f"{self._base}/containers/{container_id}/logs", params=params) as response:
+                if response.status >= 400:
+                    raise DockerAPIError(response.status, (await response.text()).strip())
+                if response.content_type == "application/vnd.docker.raw-stream":
+                    # TTY containers: raw bytes
+                    async for chunk in response.content.iter_any():
+                        yield chunk
+                    return
+                while True:
+                    try:
+                        header = await response.content.readexactly(8)
+                    except asyncio.IncompleteReadError:
+                        return
+                    size = struct.unpack(">I", header[4:])[0]
+                    yield await response.content.readexactly(size)
+        except aiohttp.ClientConnectionError:
+            await self.close()
+            raise
+
+    async def kill(self, container_id: str):
+        await self._request("POST", f"/containers/{container_id}/kill")
+
+    async def remove(self, container_id: str, force: bool = True):
+        await self._request("DELETE", f"/containers/{container_id}", params={"force": "1" if force else "0"})
+
+    async def run(self, image: str, command, use_gpu: bool = False, timeout: int = 300,
+                  device_ids: Optional[List[str]] = None, log_capture: Optional[LogCapture] = None,
+                  placement: Optional[Dict[str, str]] = None) -> str:
+        """Same contract as run_container(), entirely on the event loop."""
+        import aiohttp
+        capture = log_capture or LogCapture()
+        container_id = None
+        pump = None
+        run_started = None
+        outcome = "error"
+        try:
+            if not await self.image_exists(image):
+                logger.info(f"Pulling image: {image}...")
+                with metrics.timer("image_pull_seconds"):
+                    await self.pull(image)
+
+            logger.info(f"Starting container: {image} (Timeout: {timeout}s)")
+            if placement is None and use_gpu and device_ids:
+                # May touch NVML, so keep it off the loop
+                placement = await asyncio.get_running_loop().run_in_executor(None, job_placement, use_gpu, device_ids)
+            container_id = await self.create(image, command, use_gpu=use_gpu, device_ids=device_ids, placement=placement)
+            await self.start(container_id)
+            run_started = time.perf_counter()
+
+            async def stream_logs():
+                try:
+                    async for chunk in self.logs(container_id):
+                        capture.feed(chunk)
+                except Exception as e:
+                    logger.warning(f"Log stream ended: {e}")
+
+            pump = asyncio.create_task(stream_logs())
+            try:
+                capture.exit_code = await self.wait(container_id, timeout)
+            except asyncio.TimeoutError:
+                logger.error(f"Container timed out after {timeout}s. Killing...")
+                await self.kill(container_id)
+                outcome = "timeout"
+                return f"TIMEOUT_ERROR: Container execution exceeded {timeout}s limit."
+
+            # The stream ends on its own once the container has exited
+            await asyncio.wait_for(pump, 10)
+            outcome = "done" if capture.exit_code == 0 else "exit_nonzero"
+            return capture.text()
+
+        except DockerAPIError as e:
+            logger.error(f"Container Execution Failed: {e}")
+            return f"EXECUTION_ERROR: {str(e)}"
+        except (OSError, asyncio.TimeoutError, aiohttp.ClientError) as e:
+            logger.error(f"Docker Engine unreachable: {e}")
+            if container_id is None:
+                outcome = "offline"
+                return "ERROR: DOCKER_ENGINE_OFFLINE"
+            return f"EXECUTION_ERROR: {str(e)}"
+        except Exception as e:
+            logger.error(f"Container Execution Failed: {e}")
+            return f"EXECUTION_ERROR: {str(e)}"
+
+        finally:
+            metrics.inc("container_runs_total", outcome=outcome)
+            if run_started is not None:
+                metrics.observe("container_run_seconds", time.perf_counter() - run_started, outcome=outcome)
+            if pump is not None and not pump.done():
+                pump.cancel()
+            if container_id:
+                try:
+                    await self.remove(container_id)
+                    logger.info("Container removed.")
+                except Exception as e:
+                    logger.warning(f"Failed to remove container: {e}")
+            capture.close()
+
+_async_docker: Optional[AsyncDocker] = None
+
+def async_client() -> Optional[AsyncDocker]:
+    """Shared AsyncDocker for the running loop, or None when the host is unsupported."""
+    global _async_docker
+    if _async_docker is None:
+        try:
+            _async_docker = AsyncDocker()
+        except ValueError as e:
+            logger.info(f"{e}. Using the threaded Docker client.")
+            return None
+    return _async_docker
+
+async def run_container_async(image: str, command: str, use_gpu: bool = False, timeout: int = 300,
+                              device_ids: Optional[List[str]] = None, log_capture: Optional[LogCapture] = None,
+                              placement: Optional[Dict[str, str]] = None) -> str:
+    """
+    Async run_container(). Uses the asyncio Docker API when the daemon is
+    reachable that way, otherwise runs run_container() on the container executor.
+    Pass a LogCapture created on the loop to consume output live with `async for`.
+    """
+    client = async_client()
+    if client is not None:
+        return await client.run(image, command, use_gpu=use_gpu, timeout=timeout,
+                                device_ids=device_ids, log_capture=log_capture, placement=placement)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, run_container, image, command, use_gpu, timeout,
+                                      device_ids, log_capture, placement)
+
+class WarmPool:
+    """
+    Optional pool of pre-created, GPU-attached containers per hot image.
+
+    Jobs are exec'd into an idle container instead of paying for a full
+    create/start/remove cycle. Pooled containers run keepalive_cmd as their
+    entrypoint; a job execs the image's own ENTRYPOINT plus its command (or
+    the image's CMD), as a cold run would. If a warm container cannot be
+    created or exec'd into, the job runs cold instead. Without a reset_cmd
+    every container serves a single job and is then recycled (removed, with a
+    fresh one pre-created in its place), so no state leaks between jobs. With
+    one, the container is reset after each job and returned, or discarded once
+    it has served max_uses jobs or failed its reset. Images that have served a job are kept topped
+    up to size_per_image idle containers, bounded by max_total overall.
+    Containers idle longer than idle_ttl are removed by reap().
+    """
+
+    def __init__(self, size_per_image: int = 2, max_total: int = 8, idle_ttl: float = 300,
+                 max_uses: int = 50, keepalive_cmd: str = "sleep infinity", reset_cmd: Optional[str] = None):
+        self.size_per_image = size_per_image
+        self.max_total = max_total
+        self.idle_ttl = idle_ttl
+        self.max_uses = max_uses
+        self.keepalive_cmd = keepalive_cmd
+        self.reset_cmd = reset_cmd
+        self._lock = threading.Lock()
+        self._idle: Dict[tuple, List[dict]] = {} # key -> idle entries, oldest first
+        self._total = 0 # Idle + busy containers owned by the pool
+        self._refill = ThreadPoolExecutor(max_workers=1, thread_name_prefix="warm-pool")
+
+    @staticmethod
+    def _docker():
+        return get_client()
+
+    @staticmethod
+    def _key(image: str, use_gpu: bool, device_ids: Optional[List[str]]) -> tuple:
+        return (image, use_gpu, tuple(sorted(device_ids or ())))
+
+    def _create(self, key: tuple) -> dict:
+        import docker
+        image, use_gpu, device_ids = key
+        # Override the image ENTRYPOINT, which would otherwise run (and exit) instead of idling
+        container = self._docker().containers.run(
+            image,
+            entrypoint=shlex.split(self.keepalive_cmd),
+            detach=True,
+            device_requests=_gpu_requests(docker, use_gpu, list(device_ids)),
+            **job_placement(use_gpu, list(device_ids))
+        )
+        try:
+            config = container.image.attrs.get("Config") or {}
+        except Exception:
+            container.remove(force=True)
+            raise
+        logger.info(f"Warm container created: {image} ({container.short_id})")
+        return {"container": container, "key": key, "uses": 0, "idle_since": time.time(),
+                "entrypoint": list(config.get("Entrypoint") or []), "cmd": list(config.get("Cmd") or [])}
+
+    @staticmethod
+    def _exec_command(entry: dict, command) -> List[str]:
+        """What a cold container of the image would run: its ENTRYPOINT plus command (or its CMD)."""
+        if command:
+            args = shlex.split(command) if isinstance(command, str) else list(command)
+        else:
+            args = entry["cmd"]
+        return entry["entrypoint"] + args
+
+    def _discard(self, entry: dict):
+        with self._lock:
+            self._total -= 1
+        try:
+            entry["container"].remove(force=True)
+        except Exception as e:
+            logger.warning(f"Failed to remove warm container: {e}")
+
+    def _checkout(self, key: tuple) -> Optional[dict]:
+        """Takes an idle container for key, creating one if the pool has room."""
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+            if self._total >= self.max_total:
+                return None
+            self._total += 1
+        try:
+            return self._create(key)
+        except Exception:
+            with self._lock:
+                self._total -= 1
+            raise
+
+    def _checkin(self, entry: dict):
+        entry["uses"] += 1
+        if not self.reset_cmd or entry["uses"] >= self.max_uses:
+            # Nothing to clear what the job left behind: recycle rather than reuse
+            self._discard(entry)
+            return
+        if self.reset_cmd:
+            result = entry["container"].exec_run(self.reset_cmd)
+            if result.exit_code != 0:
+                logger.warning(f"Warm container reset failed (exit {result.exit_code}). Discarding.")
+                self._discard(entry)
+                return
+        entry["idle_since"] = time.time()
+        with self._lock:
+            self._idle.setdefault(entry["key"], []).append(entry)
+
+    def _top_up(self, key: tuple):
+        while True:
+            with self._lock:
+                if len(self._idle.get(key, [])) >= self.size_per_image or self._total >= self.max_total:
+                    return
+                self._total += 1
+            try:
+                entry = self._create(key)
+            except Exception as e:
+                with self._lock:
+                    self._total -= 1
+                logger.warning(f"Failed to pre-create warm container: {e}")
+                return
+            with self._lock:
+                self._idle.setdefault(key, []).append(entry)
+
+    def warm(self, image: str, use_gpu: bool = True, device_ids: Optional[List[str]] = None):
+        """Pre-creates idle containers for an image in the background."""
+        self._refill.submit(self._top_up, self._key(image, use_gpu, device_ids))
+
+    def run(self, image: str, command: str, use_gpu: bool = False, timeout: int = 300,
+            device_ids: Optional[List[str]] = None, log_capture: Optional[LogCapture] = None) -> str:
+        """
+        Runs command in a warm container. Returns output like run_container();
+        falls back to run_container() when the pool is full or a warm
+        container cannot be created or exec'd into.
+        """
+        key = self._key(image, use_gpu, device_ids)
+        capture = log_capture or LogCapture()
+        cold = lambda: run_container(image, command, use_gpu=use_gpu, timeout=timeout,
+                                     device_ids=device_ids, log_capture=capture)
+        try:
+            entry = self._checkout(key)
+        except Exception as e:
+            logger.warning(f"Warm container unavailable ({e}). Running a cold container.")
+            return cold()
+        if entry is None:
+            logger.info("Warm pool full. Running a cold container.")
+            return cold()
+
+        container = entry["container"]
+        try:
+            api = self._docker().api
+            exec_id = api.exec_create(container.id, self._exec_command(entry, command))["Id"]
+            stream = api.exec_start(exec_id, stream=True)
+        except Exception as e:
+            # Nothing has run yet, so the job can still go cold
+            logger.warning(f"Warm exec failed ({e}). Running a cold container.")
+            self._discard(entry)
+            self._refill.submit(self._top_up, key)
+            return cold()
+
+        healthy = False
+        try:
+            def pump():
+                try:
+                    for chunk in stream:
+                        capture.feed(chunk)
+                except Exception as e:
+                    logger.warning(f"Exec stream ended: {e}")
+
+            reader = threading.Thread(target=pump, name="warm-exec", daemon=True)
+            reader.start()
+            reader.join(timeout)
+            if reader.is_alive():
+                logger.error(f"Container timed out after {timeout}s. Killing...")
+                container.kill()
+                raise TimeoutError(f"Container execution exceeded {timeout}s limit.")
+
+            capture.exit_code = api.exec_inspect(exec_id).get("ExitCode")
+            logger.info(f"Warm exec finished (exit {capture.exit_code}, container {container.short_id})")
+            healthy = True
+            return capture.text()
+
+        except TimeoutError as te:
+            return f"TIMEOUT_ERROR: {str(te)}"
+        except Exception as e:
+            logger.error(f"Container Execution Failed: {e}")
+            return f"EXECUTION_ERROR: {str(e)}"
+
+        finally:
+            capture.close()
+            if healthy:
+                self._checkin(entry)
+            else:
+                self._discard(entry)
+            self._refill.submit(self._top_up, key)
+
+    def reap(self):
+        """Removes containers that have been idle longer than idle_ttl."""
+        cutoff = time.time() - self.idle_ttl
+        expired = []
+        with self._lock:
+            for key, idle in self._idle.items():
+                expired.extend(e for e in idle if e["idle_since"] < cutoff)
+                idle[:] = [e for e in idle if e["idle_since"] >= cutoff]
+        for entry in expired:
+            logger.info(f"Reaping idle warm container ({entry['container'].short_id})")
+            self._discard(entry)
+
+    def shutdown(self):
+        """Removes every idle container."""
+        with self._lock:
+            entries = [e for idle in self._idle.values() for e in idle]
+            self._idle.clear()
+        for entry in entries:
+            self._discard(entry)
+
+    async def run_async(self, image: str, command: str, use_gpu: bool = False, timeout: int = 300,
+                        device_ids: Optional[List[str]] = None, log_capture: Optional[LogCapture] = None) -> str:
+        """Async facade for run(), on the container executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, self.run, image, command, use_gpu, timeout,
+                                          device_ids, log_capture)
 
 if __name__ == "__main__":
     # Verification Test
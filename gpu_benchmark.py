@@ -0,0 +1,217 @@
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from typing import List, Dict, Any, Optional
+
+import container_manager
+import hardware
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - BENCHMARK - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+BENCH_IMAGE_GPU = "pytorch/pytorch:2.1.0-cuda12.1-cudnn8-runtime"
+BENCH_IMAGE_CPU = "python:3.11-slim"
+CACHE_FILE = "bandwidth_cache.json"
+CACHE_MAX_AGE = 7 * 24 * 3600 # Re-measure weekly even if nothing changed
+RESULT_PREFIX = "BENCH_RESULT "
+
+# Runs inside the benchmark container (or locally for the CPU fallback).
+# Measures host<->device copy bandwidth and a compute throughput score.
+BENCH_SCRIPT = r'''
+import json, time
+
+SIZE = 256 * 1024 * 1024
+
+def timed(fn, sync, reps):
+    fn(); sync()
+    start = time.perf_counter()
+    for _ in range(reps):
+        fn()
+    sync()
+    return (time.perf_counter() - start) / reps
+
+try:
+    import torch
+    if not torch.cuda.is_available():
+        raise ImportError("CUDA unavailable")
+    dev = torch.device("cuda:0")
+    sync = torch.cuda.synchronize
+    host = torch.empty(SIZE, dtype=torch.uint8).pin_memory()
+    gpu = torch.empty(SIZE, dtype=torch.uint8, device=dev)
+    h2d = timed(lambda: gpu.copy_(host, non_blocking=True), sync, 10)
+    d2h = timed(lambda: host.copy_(gpu, non_blocking=True), sync, 10)
+    n = 4096
+    a = torch.randn(n, n, device=dev, dtype=torch.float16)
+    mm = timed(lambda: a @ a, sync, 20)
+    result = {"mode": "cuda", "h2d_gbps": SIZE / h2d / 1e9, "d2h_gbps": SIZE / d2h / 1e9,
+              "compute_score": 2 * n ** 3 / mm / 1e12}
+except ImportError:
+    # CPU-only fallback: host memory copy bandwidth and a matmul score
+    try:
+        import numpy as np
+        src = np.ones(SIZE, dtype=np.uint8)
+        dst = np.empty_like(src)
+        copy = timed(lambda: np.copyto(dst, src), lambda: None, 5)
+        n = 512
+        a = np.random.rand(n, n).astype(np.float32)
+        mm = timed(lambda: a @ a, lambda: None, 5)
+        score = 2 * n ** 3 / mm / 1e12
+    except ImportError:
+        src = bytearray(SIZE // 4)
+        copy = timed(lambda: bytes(src), lambda: None, 5) * 4
+        score = 0.0
+    result = {"mode": "cpu", "h2d_gbps": SIZE / copy / 1e9, "d2h_gbps": SIZE / copy / 1e9, "compute_score": score}
+
+print("BENCH_RESULT " + json.dumps({k: round(v, 3) if isinstance(v, float) else v for k, v in result.items()}))
+'''
+
+def parse_result(output: str) -> Optional[Dict[str, Any]]:
+    """Extracts the benchmark result line from container or process output."""
+    for line in reversed(output.splitlines()):
+        line = line.strip()
+        if line.startswith(RESULT_PREFIX):
+            try:
+                return json.loads(line[len(RESULT_PREFIX):])
+            except ValueError:
+                return None
+    return None
+
+def run_in_container(uuid: Optional[str] = None, timeout: int = 300,
+                     placement: Optional[Dict[str, str]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Runs the benchmark through container_manager. With a GPU UUID the container
+    is restricted to that device; without one the CPU fallback image is used.
+    placement overrides the default NUMA-local pinning ({} = unpinned).
+    """
+    image = BENCH_IMAGE_GPU if uuid else BENCH_IMAGE_CPU
+    output = container_manager.run_container(image, ["python", "-c", BENCH_SCRIPT], use_gpu=bool(uuid),
+                                             timeout=timeout, device_ids=[uuid] if uuid else None,
+                                             placement=placement)
+    result = parse_result(output)
+    if result is None:
+        logger.error(f"Benchmark produced no result: {output[:200]}")
+    return result
+
+def run_local(timeout: int = 120) -> Optional[Dict[str, Any]]:
+    """CPU-only fallback without Docker: runs the same script in a local interpreter."""
+    try:
+        proc = subprocess.run([sys.executable, "-c", BENCH_SCRIPT], capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        logger.error(f"Local benchmark exceeded {timeout}s")
+        return None
+    return parse_result(proc.stdout)
+
+class BenchmarkCache:
+    """Measurements per device UUID, invalidated by driver version change or age."""
+
+    def __init__(self, path: str = CACHE_FILE, max_age: float = CACHE_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable benchmark cache {path}: {e}")
+            self.entries = {}
+
+    def get(self, gpu: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get(gpu.get("uuid"))
+        if not entry:
+            return None
+        if entry.get("driver_version") != gpu.get("driver_version"):
+            return None
+        if time.time() - entry.get("measured_at", 0) > self.max_age:
+            return None
+        return entry
+
+    def put(self, gpu: Dict[str, Any], result: Dict[str, Any]):
+        self.entries[gpu.get("uuid")] = dict(result, driver_version=gpu.get("driver_version"), measured_at=time.time())
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp, self.path)
+
+def measure_all(gpus: List[Dict[str, Any]], cache: Optional[BenchmarkCache] = None,
+                use_docker: bool = True, force: bool = False) -> BenchmarkCache:
+    """
+    Benchmarks every device that has no valid cached result.
+    With Docker, only CUDA measurements are cached: a CPU fallback result says
+    nothing about the device, so it must not stop the next run re-measuring it.
+    """
+    cache = cache or BenchmarkCache()
+    for gpu in gpus:
+        cached = cache.get(gpu)
+        if not force and cached and (cached.get("mode") == "cuda" or not use_docker):
+            continue
+        logger.info(f"Benchmarking {gpu.get('name')} ({gpu.get('uuid')})...")
+        result = run_in_container(gpu.get("uuid")) if use_docker else run_local()
+        if result is None and use_docker:
+            logger.warning("Container benchmark failed. Falling back to local CPU benchmark.")
+            result = run_local()
+        if result is not None:
+            logger.info(f"Measured H2D {result['h2d_gbps']} GB/s, D2H {result['d2h_gbps']} GB/s, score {result['compute_score']} ({result['mode']})")
+            if use_docker and result.get("mode") != "cuda":
+                logger.warning(f"No CUDA measurement for {gpu.get('uuid')}; not caching the CPU result.")
+                continue
+            cache.put(gpu, result)
+    return cache
+
+def compare_placement(gpu: Dict[str, Any], sysfs_root: str = hardware.SYSFS_ROOT) -> Optional[Dict[str, Any]]:
+    """
+    Benchmarks one GPU pinned to its own NUMA node and to a remote one, to show
+    what cross-socket host memory costs the PCIe copies. Returns None on
+    hosts with a single node or no NUMA information for the device.
+    """
+    local = {"cpuset_cpus": gpu.get("local_cpus", ""), "cpuset_mems": str(gpu.get("numa_node", -1))}
+    remote_nodes = [n for n in hardware.online_nodes(sysfs_root) if n != gpu.get("numa_node")]
+    if gpu.get("numa_node", -1) < 0 or not local["cpuset_cpus"] or not remote_nodes:
+        logger.info(f"No NUMA placement to compare for {gpu.get('uuid')}")
+        return None
+    remote = {"cpuset_cpus": hardware.node_cpus(remote_nodes[0], sysfs_root), "cpuset_mems": str(remote_nodes[0])}
+
+    results = {}
+    for label, placement in (("local", local), ("remote", remote)):
+        results[label] = run_in_container(gpu.get("uuid"), placement=placement)
+        if results[label] is None:
+            return None
+    results["h2d_local_vs_remote"] = round(results["local"]["h2d_gbps"] / max(results["remote"]["h2d_gbps"], 1e-9), 3)
+    results["d2h_local_vs_remote"] = round(results["local"]["d2h_gbps"] / max(results["remote"]["d2h_gbps"], 1e-9), 3)
+    logger.info(f"{gpu.get('uuid')}: NUMA-local H2D is {results['h2d_local_vs_remote']}x remote, D2H {results['d2h_local_vs_remote']}x")
+    return results
+
+def annotate(gpus: List[Dict[str, Any]], cache: Optional[BenchmarkCache] = None,
+             include_cpu: bool = False) -> List[Dict[str, Any]]:
+    """
+    Returns copies of the GPU dicts with cached measurements merged in
+    (h2d_gbps, d2h_gbps, compute_score, benchmark_mode) for classification.
+    CPU fallback results measure host memory rather than the PCIe link, so they
+    are only merged with include_cpu=True (for testing the pipeline without a GPU).
+    """
+    cache = cache or BenchmarkCache()
+    annotated = []
+    for gpu in gpus:
+        gpu_info = gpu.copy()
+        entry = cache.get(gpu)
+        if entry and (include_cpu or entry.get("mode") == "cuda"):
+            gpu_info.update({
+                "h2d_gbps": entry["h2d_gbps"],
+                "d2h_gbps": entry["d2h_gbps"],
+                "compute_score": entry["compute_score"],
+                "benchmark_mode": entry.get("mode")
+            })
+        annotated.append(gpu_info)
+    return annotated
+
+if __name__ == "__main__":
+    if "--placement" in sys.argv:
+        # NUMA-local vs remote pinning on every GPU (needs Docker and a multi-socket host)
+        print(json.dumps({gpu["uuid"]: compare_placement(gpu) for gpu in hardware.audit_gpu()}, indent=4))
+    else:
+        # CPU-only verification, no GPU or Docker required
+        print(json.dumps(run_local(), indent=4))
@@ -1,14 +1,26 @@
+import asyncio
+import atexit
 import logging
-from typing import List, Dict, Any
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+
+import metrics
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-try:
-    import pynvml
-except ImportError:
-    pynvml = None
+SYSFS_ROOT = "/sys"
+
+def _load_pynvml():
+    """Imports pynvml on first use so importing this module stays cheap."""
+    try:
+        import pynvml
+        return pynvml
+    except ImportError:
+        return None
 
 class MockNVML:
     """
@@ -85,96 +97,324 @@ class MockNVML:
     def nvmlDeviceGetTemperature(handle, sensor_type):
         return 65 # Mock temperature
 
-def audit_gpu() -> List[Dict[str, Any]]:
+    @staticmethod
+    def nvmlDeviceGetComputeRunningProcesses(handle):
+        return []
+
+    @staticmethod
+    def nvmlDeviceGetGraphicsRunningProcesses(handle):
+        return []
+
+# 0 = NVML_TEMPERATURE_GPU
+NVML_TEMPERATURE_GPU = 0
+
+def _to_str(value):
+    # Handle bytes vs string return types which can vary by version
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return value
+
+def parse_cpulist(text: str) -> List[int]:
+    """Parses a sysfs CPU/node list such as "0-7,16-23" into sorted integers."""
+    result = set()
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        start, _, end = part.partition("-")
+        result.update(range(int(start), int(end or start) + 1))
+    return sorted(result)
+
+def format_cpulist(values) -> str:
+    """Inverse of parse_cpulist(): compresses integers into "0-7,16-23" form."""
+    ranges = []
+    for value in sorted(set(values)):
+        if ranges and value == ranges[-1][1] + 1:
+            ranges[-1][1] = value
+        else:
+            ranges.append([value, value])
+    return ",".join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+def _read_sysfs(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def pci_topology(bus_id: str, sysfs_root: str = SYSFS_ROOT) -> Dict[str, Any]:
     """
-    Audits the host machine's GPU capabilities.
-    Returns a list of dictionaries containing GPU metrics.
+    Resolves the NUMA node and local CPU list of a PCI device from sysfs.
+    NVML reports an 8-digit PCI domain ("00000000:01:00.0"); sysfs uses 4.
+    numa_node is -1 when the platform does not report one (single socket,
+    most VMs) and local_cpus is empty when the device is not in sysfs.
     """
-    nvml = pynvml
-    using_mock = False
-
-    if nvml is None:
-        logger.warning("pynvml not installed, falling back to MockNVML")
-        nvml = MockNVML
-        using_mock = True
-    else:
+    parts = bus_id.lower().split(":")
+    device = f"{parts[0][-4:]}:{parts[1]}:{parts[2]}" if len(parts) == 3 else bus_id.lower()
+    base = os.path.join(sysfs_root, "bus", "pci", "devices", device)
+    numa_node = _read_sysfs(os.path.join(base, "numa_node"))
+    local_cpus = _read_sysfs(os.path.join(base, "local_cpulist"))
+    return {
+        "numa_node": int(numa_node) if numa_node not in (None, "") else -1,
+        "local_cpus": format_cpulist(parse_cpulist(local_cpus)) if local_cpus else ""
+    }
+
+def online_nodes(sysfs_root: str = SYSFS_ROOT) -> List[int]:
+    """NUMA nodes currently online, or [0] when sysfs has no node information."""
+    return parse_cpulist(_read_sysfs(os.path.join(sysfs_root, "devices", "system", "node", "online")) or "0")
+
+def node_cpus(node: int, sysfs_root: str = SYSFS_ROOT) -> str:
+    """CPU list of a NUMA node, empty when unknown."""
+    return _read_sysfs(os.path.join(sysfs_root, "devices", "system", "node", f"node{node}", "cpulist")) or ""
+
+class NVMLSession:
+    """
+    Long-lived NVML session for telemetry polling.
+    Initializes NVML once and caches the static device inventory (name, UUID,
+    PCI bus ID, total memory, driver version, max PCIe link, and the NUMA node
+    and local CPUs resolved from sysfs_root). Each poll() only
+    re-reads the volatile fields: temperature, current PCIe gen/width and memory used.
+    A change in device count or driver version, or an NVML error on a cached
+    handle (hot-plug, driver reload), triggers a full re-inventory.
+    When nvmlInit fails the poll is answered from MockNVML, and real NVML is
+    tried again on the next poll.
+    """
+
+    def __init__(self, nvml=None, sysfs_root: str = SYSFS_ROOT):
+        self._nvml_override = nvml
+        self.sysfs_root = sysfs_root
+        self.nvml = None
+        self.using_mock = False
+        self.init_failed = False # Using MockNVML only because nvmlInit failed
+        self.driver_version = None
+        self.inventory: List[Dict[str, Any]] = []
+        self.generation = 0 # Bumped on every re-inventory
+        self._handles = []
+        self._lock = threading.RLock()
+
+    def open(self):
+        """Initializes NVML, falling back to MockNVML when unavailable."""
+        nvml = self._nvml_override or _load_pynvml()
+        self.using_mock = False
+        self.init_failed = False
+
+        if nvml is None:
+            logger.warning("pynvml not installed, falling back to MockNVML")
+            nvml = MockNVML
+            self.using_mock = True
+
         try:
             nvml.nvmlInit()
         except Exception as e: # Catching generic exception as pynvml might raise different errors
             logger.warning(f"Failed to initialize NVML: {e}. Falling back to MockNVML")
             nvml = MockNVML
-            using_mock = True
+            self.using_mock = True
+            self.init_failed = True
             nvml.nvmlInit()
 
-    gpu_data = []
-    try:
-        device_count = nvml.nvmlDeviceGetCount()
-        for i in range(device_count):
-            handle = nvml.nvmlDeviceGetHandleByIndex(i)
-            
-            name = nvml.nvmlDeviceGetName(handle)
-            # Handle bytes vs string return types which can vary by version
-            if isinstance(name, bytes):
-                name = name.decode('utf-8')
-                
-            uuid = nvml.nvmlDeviceGetUUID(handle)
-            if isinstance(uuid, bytes):
-                uuid = uuid.decode('utf-8')
-                
-            pci_info = nvml.nvmlDeviceGetPciInfo(handle)
-            pci_bus_id = pci_info.busId
-            if isinstance(pci_bus_id, bytes):
-                pci_bus_id = pci_bus_id.decode('utf-8')
-
-            memory_info = nvml.nvmlDeviceGetMemoryInfo(handle)
-            memory_total_mb = int(memory_info.total / 1024 / 1024)
-
-            # Critical PCIe Checks
-            try:
-                pcie_width_current = nvml.nvmlDeviceGetPcieLinkWidth(handle)
-                pcie_gen_current = nvml.nvmlDeviceGetCurrPcieLinkGeneration(handle)
-            except Exception:
-                 # Fallback for older drivers/cards or mock limitations if not fully implemented
-                pcie_width_current = -1
-                pcie_gen_current = -1
+        self.nvml = nvml
+
+    def close(self):
+        """Shuts NVML down and drops the cached inventory."""
+        with self._lock:
+            if self.nvml is not None:
+                try:
+                    self.nvml.nvmlShutdown()
+                except Exception:
+                    pass
+            self.nvml = None
+            self.inventory = []
+            self._handles = []
+            self.driver_version = None
+
+    def _build_inventory(self):
+        """Queries the static fields of every device once."""
+        with metrics.timer("nvml_inventory_seconds"):
+            self._query_inventory()
 
-            driver_version = nvml.nvmlSystemGetDriverVersion()
-            if isinstance(driver_version, bytes):
-                driver_version = driver_version.decode('utf-8')
+    def _query_inventory(self):
+        nvml = self.nvml
+        driver_version = _to_str(nvml.nvmlSystemGetDriverVersion())
+
+        inventory = []
+        handles = []
+        for i in range(nvml.nvmlDeviceGetCount()):
+            handle = nvml.nvmlDeviceGetHandleByIndex(i)
 
             try:
-                # 0 = NVML_TEMPERATURE_GPU
-                temperature = nvml.nvmlDeviceGetTemperature(handle, 0)
-            except:
-                temperature = 0
+                pcie_width_max = nvml.nvmlDeviceGetMaxPcieLinkWidth(handle)
+                pcie_gen_max = nvml.nvmlDeviceGetMaxPcieLinkGeneration(handle)
+            except Exception:
+                pcie_width_max = -1
+                pcie_gen_max = -1
 
-            gpu_info = {
+            pci_bus_id = _to_str(nvml.nvmlDeviceGetPciInfo(handle).busId)
+            inventory.append({
                 "index": i,
-                "name": name,
-                "uuid": uuid,
+                "name": _to_str(nvml.nvmlDeviceGetName(handle)),
+                "uuid": _to_str(nvml.nvmlDeviceGetUUID(handle)),
                 "pci_bus_id": pci_bus_id,
-                "memory_total": memory_total_mb,
-                "pcie_gen_current": pcie_gen_current,
-                "pcie_width_current": pcie_width_current,
-                "pcie_width_current": pcie_width_current,
+                "memory_total": int(nvml.nvmlDeviceGetMemoryInfo(handle).total / 1024 / 1024),
+                "pcie_gen_max": pcie_gen_max,
+                "pcie_width_max": pcie_width_max,
                 "driver_version": driver_version,
-                "temperature": temperature
-            }
-            gpu_data.append(gpu_info)
+                **pci_topology(pci_bus_id, self.sysfs_root)
+            })
+            handles.append(handle)
+
+        self.inventory = inventory
+        self._handles = handles
+        self.driver_version = driver_version
+        self.generation += 1
+        logger.info(f"GPU inventory refreshed: {len(inventory)} device(s), driver {driver_version}")
+
+    def _inventory_stale(self) -> bool:
+        """Cheap checks for hot-plug and driver reload."""
+        if self.nvml.nvmlDeviceGetCount() != len(self._handles):
+            return True
+        return _to_str(self.nvml.nvmlSystemGetDriverVersion()) != self.driver_version
+
+    def _read_device(self, handle, static: Dict[str, Any]) -> Dict[str, Any]:
+        nvml = self.nvml
+
+        # Raises on a lost handle, which triggers a re-inventory in poll()
+        memory_info = nvml.nvmlDeviceGetMemoryInfo(handle)
+
+        # Critical PCIe Checks
+        try:
+            pcie_width_current = nvml.nvmlDeviceGetPcieLinkWidth(handle)
+            pcie_gen_current = nvml.nvmlDeviceGetCurrPcieLinkGeneration(handle)
+        except Exception:
+            # Fallback for older drivers/cards or mock limitations if not fully implemented
+            pcie_width_current = -1
+            pcie_gen_current = -1
 
-    except Exception as e:
-        logger.error(f"Error during GPU audit: {e}")
-    finally:
         try:
-            nvml.nvmlShutdown()
-        except:
-            pass
+            temperature = nvml.nvmlDeviceGetTemperature(handle, NVML_TEMPERATURE_GPU)
+        except Exception:
+            temperature = 0
+
+        gpu_info = dict(static)
+        gpu_info.update({
+            "pcie_gen_current": pcie_gen_current,
+            "pcie_width_current": pcie_width_current,
+            "memory_used": int(memory_info.used / 1024 / 1024),
+            "temperature": temperature
+        })
+        return gpu_info
+
+    def poll(self) -> List[Dict[str, Any]]:
+        """
+        Returns the cached inventory merged with freshly read volatile fields.
+        """
+        with self._lock, metrics.timer("nvml_poll_seconds"):
+            for attempt in range(2):
+                try:
+                    if self.init_failed:
+                        # The mock stood in for one failed init; give real NVML another chance
+                        self.close()
+                    if self.nvml is None:
+                        self.open()
+                        self._build_inventory()
+                    elif self._inventory_stale():
+                        self._build_inventory()
+
+                    return [self._read_device(h, s) for h, s in zip(self._handles, self.inventory)]
+                except Exception as e:
+                    metrics.inc("nvml_errors_total")
+                    # Device lost or driver reloaded: start a fresh session once
+                    if attempt == 0:
+                        logger.warning(f"NVML poll failed: {e}. Re-initializing inventory.")
+                    else:
+                        logger.error(f"Error during GPU audit: {e}")
+                    self.close()
+
+            return []
+
+    def device_pids(self) -> Dict[str, set]:
+        """
+        Returns {uuid: {pid, ...}} for processes holding a context on each device.
+        """
+        with self._lock:
+            if self.nvml is None:
+                self.poll()
+
+            result = {}
+            for handle, static in zip(self._handles, self.inventory):
+                pids = set()
+                for query in ("nvmlDeviceGetComputeRunningProcesses", "nvmlDeviceGetGraphicsRunningProcesses"):
+                    try:
+                        pids.update(p.pid for p in getattr(self.nvml, query)(handle))
+                    except Exception:
+                        pass
+                result[static["uuid"]] = pids
+            return result
+
+    def placement(self, device_ids: Optional[List[str]]) -> Dict[str, str]:
+        """
+        Docker cpuset for a job on the given GPU UUIDs: the union of their
+        local CPUs and NUMA nodes. Empty (no pinning) when the devices are
+        unknown, have no NUMA affinity, or together span every online node.
+        """
+        with self._lock:
+            if self.nvml is None:
+                self.poll()
+            selected = [gpu for gpu in self.inventory if gpu["uuid"] in (device_ids or ())]
 
-    return gpu_data
+        nodes = {gpu["numa_node"] for gpu in selected}
+        if not selected or -1 in nodes or not all(gpu["local_cpus"] for gpu in selected):
+            return {}
+        if nodes >= set(online_nodes(self.sysfs_root)):
+            return {}
+        cpus = set()
+        for gpu in selected:
+            cpus.update(parse_cpulist(gpu["local_cpus"]))
+        return {"cpuset_cpus": format_cpulist(cpus), "cpuset_mems": format_cpulist(nodes)}
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session() -> NVMLSession:
+    """Returns the process-wide NVML session, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = NVMLSession()
+            atexit.register(_session.close)
+        return _session
+
+def audit_gpu() -> List[Dict[str, Any]]:
+    """
+    Audits the host machine's GPU capabilities.
+    Returns a list of dictionaries containing GPU metrics.
+    Backed by the shared NVMLSession, so repeated calls only re-read volatile fields.
+    """
+    return get_session().poll()
 
 # Alias for compatibility with Apex Node
 scan_system = audit_gpu
 
+def device_pids() -> Dict[str, set]:
+    """Returns {uuid: {pid, ...}} for processes running on each GPU."""
+    return get_session().device_pids()
+
+def placement(device_ids: Optional[List[str]]) -> Dict[str, str]:
+    """Returns the NUMA-local cpuset_cpus/cpuset_mems for a job on these GPUs."""
+    return get_session().placement(device_ids)
+
+def memory_used() -> Dict[str, int]:
+    """Returns {uuid: memory_used_mb}, read fresh from NVML."""
+    return {gpu["uuid"]: gpu["memory_used"] for gpu in get_session().poll()}
+
+# NVML calls are serialized on one dedicated thread so they never block the event loop
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="nvml")
+
+async def scan_system_async() -> List[Dict[str, Any]]:
+    """
+    Async facade for scan_system(). Runs the NVML poll on the hardware executor.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, scan_system)
+
 if __name__ == "__main__":
     import json
     # For local testing/verification
@@ -0,0 +1,217 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import List, Dict, Any, Iterable, Optional
+
+import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - IMAGE CACHE - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class ImageCache:
+    """
+    Keeps job images warm on local disk.
+
+    - Images are pre-pulled from server hints and local job history, so the pull
+      is no longer part of a job's latency (or of paused-miner time).
+    - Pulls run concurrently; concurrent requests for the same image share one pull.
+    - Images this agent pulled are evicted least-recently-used first once their
+      total size exceeds the disk budget. Images in use or not tracked here are never removed.
+    """
+
+    def __init__(self, state_file: str = "image_cache.json", disk_budget_gb: float = 50,
+                 max_parallel_pulls: int = 2):
+        self.state_file = state_file
+        self.disk_budget = int(disk_budget_gb * 1024 ** 3)
+        self._executor = ThreadPoolExecutor(max_workers=max_parallel_pulls, thread_name_prefix="image-pull")
+        self._lock = threading.RLock()
+        self._pulls: Dict[str, Future] = {}
+        self._in_use: Dict[str, int] = {}
+        self.state: Dict[str, Dict[str, Any]] = self._load()
+
+    # --- State ---
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.state_file) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable cache state {self.state_file}: {e}")
+            return {}
+
+    def _save(self):
+        tmp = f"{self.state_file}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(self.state, f)
+            os.replace(tmp, self.state_file)
+        except Exception as e:
+            logger.warning(f"Failed to save cache state: {e}")
+
+    def _touch(self, image: str, size: Optional[int] = None):
+        entry = self.state.setdefault(image, {"uses": 0, "size": 0})
+        entry["last_used"] = time.time()
+        if size is not None:
+            entry["size"] = size
+
+    def likely_images(self, limit: int = 5) -> List[str]:
+        """Most frequently used images from local job history, most recent first on ties."""
+        ranked = sorted(self.state.items(), key=lambda kv: (kv[1].get("uses", 0), kv[1].get("last_used", 0)), reverse=True)
+        return [image for image, entry in ranked[:limit] if entry.get("uses", 0) > 0]
+
+    # --- Docker ---
+
+    @staticmethod
+    def _docker():
+        # Shared, health-checked client; imports docker lazily
+        import container_manager
+        return container_manager.get_client()
+
+    def _local_size(self, image: str) -> Optional[int]:
+        """Returns the local image size in bytes, or None if it is not present."""
+        import docker
+        try:
+            return self._docker().images.get(image).attrs.get("Size", 0)
+        except docker.errors.ImageNotFound:
+            return None
+
+    def digest(self, image: str) -> Optional[str]:
+        """
+        Content identity of an image: the digest of a name@sha256:... reference,
+        otherwise the ID of the local image the tag resolves to. None if unknown.
+        """
+        if "@sha256:" in image:
+            return image.split("@", 1)[1]
+        try:
+            return self._docker().images.get(image).id
+        except Exception:
+            return None
+
+    def _pull(self, image: str) -> bool:
+        """Pulls an image if missing. Returns True if it was already present (cache hit)."""
+        size = self._local_size(image)
+        hit = size is not None
+        if not hit:
+            logger.info(f"Pulling image: {image}...")
+            started = time.time()
+            with metrics.timer("image_pull_seconds"):
+                self._docker().images.pull(image)
+            size = self._local_size(image) or 0
+            logger.info(f"Pulled {image} ({size / 1024 ** 2:.0f} MB) in {time.time() - started:.1f}s")
+        with self._lock:
+            self._touch(image, size)
+        metrics.inc("image_cache_lookups_total", result="hit" if hit else "miss")
+        return hit
+
+    def _pull_shared(self, image: str) -> Future:
+        """Starts a pull or joins the one already in flight for this image."""
+        with self._lock:
+            future = self._pulls.get(image)
+            if future is None:
+                future = self._executor.submit(self._pull, image)
+                self._pulls[image] = future
+                future.add_done_callback(lambda _: self._pull_done(image))
+            return future
+
+    def _pull_done(self, image: str):
+        with self._lock:
+            self._pulls.pop(image, None)
+        self.evict()
+
+    # --- Public API ---
+
+    def acquire(self, image: str) -> bool:
+        """
+        Makes sure an image is local and pins it against eviction until release().
+        Returns True on a cache hit (no pull needed).
+        """
+        with self._lock:
+            self._in_use[image] = self._in_use.get(image, 0) + 1
+        try:
+            hit = self._pull_shared(image).result()
+        except Exception:
+            self.release(image)
+            raise
+        with self._lock:
+            self.state[image]["uses"] = self.state[image].get("uses", 0) + 1
+            self._save()
+        return hit
+
+    def release(self, image: str):
+        with self._lock:
+            count = self._in_use.get(image, 0) - 1
+            if count > 0:
+                self._in_use[image] = count
+            else:
+                self._in_use.pop(image, None)
+
+    def prefetch(self, images: Iterable[str]) -> List[Future]:
+        """Starts background pulls for the given images."""
+        futures = []
+        for image in images:
+            if not image:
+                continue
+            try:
+                futures.append(self._pull_shared(image))
+            except Exception as e:
+                logger.warning(f"Prefetch of {image} failed: {e}")
+        return futures
+
+    def evict(self):
+        """Removes least-recently-used tracked images until the cache fits the disk budget."""
+        with self._lock:
+            total = sum(entry.get("size", 0) for entry in self.state.values())
+            if total <= self.disk_budget:
+                return
+            candidates = sorted(
+                (image for image, entry in self.state.items()
+                 if entry.get("size", 0) and image not in self._in_use and image not in self._pulls),
+                key=lambda image: self.state[image].get("last_used", 0)
+            )
+
+        for image in candidates:
+            if total <= self.disk_budget:
+                break
+            try:
+                self._docker().images.remove(image)
+                logger.info(f"Evicted image: {image}")
+            except Exception as e:
+                # Typically still referenced by a container
+                logger.warning(f"Could not evict {image}: {e}")
+                continue
+            with self._lock:
+                total -= self.state[image].get("size", 0)
+                # Keep the usage history so the image can still be prefetched later
+                self.state[image]["size"] = 0
+                self._save()
+
+    async def acquire_async(self, image: str) -> bool:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.acquire, image)
+
+    async def digest_async(self, image: str) -> Optional[str]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.digest, image)
+
+    async def prefetch_async(self, images: Iterable[str]):
+        """Pre-pulls images concurrently; failures are logged, not raised."""
+        futures = self.prefetch(images)
+        results = await asyncio.gather(*(asyncio.wrap_future(f) for f in futures), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning(f"Prefetch failed: {result}")
+
+if __name__ == "__main__":
+    cache = ImageCache(state_file="image_cache_test.json", disk_budget_gb=1)
+    print(f"Cache hit: {cache.acquire('alpine')}")
+    cache.release("alpine")
+    print(f"Cache hit: {cache.acquire('alpine')}")
+    cache.release("alpine")
+    print(f"Likely images: {cache.likely_images()}")
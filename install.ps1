@@ -59,7 +59,7 @@ Set-Location -Path $BaseDir
 Write-Host "[*] Fetching Protocols..." -ForegroundColor Yellow
 $BaseUrl = "https://raw.githubusercontent.com/$OrgName/$RepoName/$Branch"
 
-$Files = @("main.py", "container_manager.py", "process_controller.py", "requirements.txt", "hardware.py", "classifier.py", "reporter.py")
+$Files = @("main.py", "container_manager.py", "process_controller.py", "telemetry.py", "transport.py", "scheduler.py", "image_cache.py", "gpu_benchmark.py", "admission.py", "metrics.py", "result_cache.py", "requirements.txt", "hardware.py", "classifier.py", "reporter.py")
 
 foreach ($File in $Files) {
     try {
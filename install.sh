@@ -55,6 +55,14 @@ BASE_URL="https://raw.githubusercontent.com/$ORG_NAME/$REPO_NAME/$BRANCH"
 curl -sL "$BASE_URL/main.py" -o main.py
 curl -sL "$BASE_URL/container_manager.py" -o container_manager.py
 curl -sL "$BASE_URL/process_controller.py" -o process_controller.py
+curl -sL "$BASE_URL/telemetry.py" -o telemetry.py
+curl -sL "$BASE_URL/transport.py" -o transport.py
+curl -sL "$BASE_URL/scheduler.py" -o scheduler.py
+curl -sL "$BASE_URL/image_cache.py" -o image_cache.py
+curl -sL "$BASE_URL/gpu_benchmark.py" -o gpu_benchmark.py
+curl -sL "$BASE_URL/admission.py" -o admission.py
+curl -sL "$BASE_URL/metrics.py" -o metrics.py
+curl -sL "$BASE_URL/result_cache.py" -o result_cache.py
 curl -sL "$BASE_URL/requirements.txt" -o requirements.txt
 
 # Audit Modules
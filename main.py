@@ -1,75 +1,238 @@
 import asyncio
-import aiohttp
 import logging
-import sys
-import os
-import json
+import time
+
+import psutil
 
 # FLATTENED IMPORTS (Files sit next to each other in the Gist download)
 try:
     import hardware
-    import reporter
 except ImportError:
     logging.warning("Audit modules missing. Using Mocks.")
     class hardware:
         @staticmethod
         def scan_system(): return [{"uuid": "MOCK-UUID", "temperature": 65}]
-    class reporter:
         @staticmethod
-        def generate_report(nodes, filename): pass
+        async def scan_system_async(): return hardware.scan_system()
+        @staticmethod
+        def device_pids(): return {}
+        @staticmethod
+        def memory_used(): return {}
 
 import process_controller
 import container_manager
+import telemetry
+import transport
+import scheduler
+import image_cache
+import admission
+import metrics
+import result_cache
+# reporter, classifier and gpu_benchmark (fpdf, numpy) are imported by the background audit
+
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - RESERVE NODE - %(levelname)s - %(message)s')
 
 C2_URL = "https://apex-wp3u.onrender.com/heartbeat"
+C2_WS_URL = "wss://apex-wp3u.onrender.com/ws" # Push channel; polling is used when unavailable
 POLL_INTERVAL = 5
-miner_ctrl = process_controller.MinerController()
+SAMPLE_INTERVAL = 1 # Telemetry sampling rate (seconds), independent of the heartbeat
+IMAGE_DISK_BUDGET_GB = 50 # Disk space the image cache may use for job images
+JOB_LOG_DIR = None # Set to a directory to keep full gzip'd output of every job
+JOB_LOG_HEAD = 64 * 1024 # Bytes from the start of each job's output kept in memory (all of it goes to JOB_LOG_DIR)
+JOB_LOG_TAIL = 64 * 1024 # Bytes from the end of each job's output kept in memory
+MINER_THROTTLE = "suspend" # suspend | cgroup | restart (restart frees the miner's VRAM)
+WARM_POOL_SIZE = 0 # Idle containers kept per hot image for "warm" jobs (0 = disabled)
+WARM_POOL_MAX = 8 # Cap on pooled containers across all images
+WARM_POOL_IDLE_TTL = 300 # Seconds before an idle pooled container is removed
+ADMISSION_CONTROL = True # Delay or reject jobs on GPUs that are throttling or short on free memory
+RESULT_CACHE_MB = 256 # Disk budget for results of "deterministic" jobs (0 = no result caching)
+RESULT_CACHE_TTL = 24 * 3600 # Seconds a stored result may be served
+REPORT_FORMATS = ("pdf", "jsonl") # Any of pdf, jsonl, csv, parquet (parquet needs pyarrow)
+BENCHMARK_ON_START = False # Measure PCIe bandwidth of unmeasured devices before the audit (pauses the miner)
+STARTUP_BUDGET = 5.0 # Target seconds from process start to the first acknowledged heartbeat
+METRICS_PORT = 9464 # Prometheus endpoint on localhost (0 = disabled)
+METRICS_PROFILING = False # Also serve /debug/profile?seconds=N (sampling profiler, localhost only)
+
+# Startup timings in seconds since the process was created (so interpreter start counts too)
+process_started = psutil.Process().create_time()
+startup = {"imports": round(time.time() - process_started, 3)}
+startup_reported = set() # Startup timings the server has acknowledged
+startup_sent = set() # Startup timings carried by the latest beat
+beat_seq = 0 # Sequence number of the last heartbeat built; the server echoes it back as "ack"
+
+miner_ctrl = process_controller.MinerController(
+    device_pids=hardware.device_pids,
+    strategy=process_controller.make_strategy(MINER_THROTTLE, device_pids=hardware.device_pids),
+    gpu_memory=hardware.memory_used
+)
+sampler = telemetry.TelemetrySampler(hardware.scan_system_async, interval=SAMPLE_INTERVAL)
+devices = telemetry.DeviceReport()
+
+async def current_gpus():
+    return sampler.latest or await hardware.scan_system_async()
+
+images = image_cache.ImageCache(disk_budget_gb=IMAGE_DISK_BUDGET_GB)
+warm_pool = None
+if WARM_POOL_SIZE > 0:
+    warm_pool = container_manager.WarmPool(size_per_image=WARM_POOL_SIZE, max_total=WARM_POOL_MAX,
+                                           idle_ttl=WARM_POOL_IDLE_TTL)
+# Holds jobs back from hot or memory-starved GPUs; None admits everything that fits
+admission_ctrl = None
+if ADMISSION_CONTROL:
+    admission_ctrl = admission.AdmissionController(
+        trend=lambda uuid: sampler.trend(uuid, "temperature", admission.TREND_WINDOW),
+        frees_vram=miner_ctrl.strategy.frees_vram,
+        miner_gpus=miner_ctrl.occupied_gpus
+    )
+results = None
+if RESULT_CACHE_MB > 0:
+    results = result_cache.ResultCache(max_bytes=RESULT_CACHE_MB * 1024 * 1024, ttl=RESULT_CACHE_TTL)
+job_scheduler = scheduler.JobScheduler(current_gpus, miner_ctrl, image_cache=images, log_dir=JOB_LOG_DIR,
+                                       warm_pool=warm_pool, admission=admission_ctrl, result_cache=results,
+                                       log_head_bytes=JOB_LOG_HEAD, log_tail_bytes=JOB_LOG_TAIL)
+background_tasks = set()
+
+def queue_gauges():
+    return {
+        "jobs_pending": len(job_scheduler.pending),
+        "jobs_running": len(job_scheduler.running),
+        "jobs_delayed": len(job_scheduler.delayed)
+    }
+
+metrics.register_collector(queue_gauges)
+
+def spawn(coro):
+    """Runs a fire-and-forget coroutine, keeping a reference until it finishes."""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
 
-async def execute_job(job_data):
-    job_id = job_data.get("job_id")
-    logging.warning(f"[!] PRIORITY JOB RECEIVED: {job_id}")
-    miner_ctrl.pause()
+async def build_heartbeat():
+    global beat_seq, startup_sent
+    gpus = await current_gpus()
+    primary = gpus[0] if gpus else {}
+    beat_seq += 1
+    # Timings recorded later (first_heartbeat, audit) send the set again until acknowledged
+    startup_sent = set(startup) if startup.keys() - startup_reported else set()
+    return {
+        "seq": beat_seq,
+        "node_id": primary.get("uuid", "UNKNOWN"),
+        "status": "BUSY" if job_scheduler.busy else "IDLE",
+        "gpu_temp": primary.get("temperature", 0),
+        **devices.payload(gpus),
+        "telemetry": sampler.heartbeat_payload(),
+        "jobs": job_scheduler.report_payload(),
+        **({"admission": job_scheduler.admission_payload()} if job_scheduler.delayed else {}),
+        **({"startup": dict(startup)} if startup_sent else {})
+    }
+
+def record_first_heartbeat():
+    startup["first_heartbeat"] = round(time.time() - process_started, 3)
+    logging.info(f"[*] First heartbeat acknowledged {startup['first_heartbeat']}s after start (imports: {startup['imports']}s)")
+    if startup["first_heartbeat"] > STARTUP_BUDGET:
+        logging.warning(f"Startup exceeded budget of {STARTUP_BUDGET}s")
+
+def handle_command(data):
+    """
+    Handles a heartbeat response, whether it arrived by poll or push.
+    Delivered state is only acknowledged when the message echoes the latest
+    beat's seq: unsolicited pushes and answers to superseded beats ack nothing.
+    """
+    global startup_reported
+    if data.get("ack") == beat_seq:
+        if "first_heartbeat" not in startup:
+            record_first_heartbeat()
+        startup_reported = startup_reported | startup_sent
+        sampler.ack()
+        devices.ack(resend=bool(data.get("resend_inventory")))
+        job_scheduler.ack_reports()
+    if data.get("prefetch_images"): spawn(images.prefetch_async(data["prefetch_images"]))
+    if data.get("command") == "PAUSE": job_scheduler.submit(data)
+    else: logging.info(f"Heartbeat ACK. Status: {data.get('command')}")
+
+async def reap_warm_pool():
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(WARM_POOL_IDLE_TTL / 4)
+        await loop.run_in_executor(None, warm_pool.reap)
+
+async def benchmark_devices(gpus):
+    """
+    Runs the bandwidth benchmark on devices without a valid cached result.
+    The GPUs are reserved through the scheduler so no job is placed on them
+    meanwhile; the benchmark is skipped while jobs hold any of them.
+    """
+    import gpu_benchmark
+    uuids = [gpu["uuid"] for gpu in gpus]
+    if not uuids:
+        return # An empty list would pause every miner, for nothing to measure
+    if not job_scheduler.reserve(uuids, "benchmark"):
+        logging.warning("GPUs busy with jobs; skipping the bandwidth benchmark")
+        return
+    loop = asyncio.get_running_loop()
+    image = gpu_benchmark.BENCH_IMAGE_GPU
+    acquired = False
     try:
-        logging.info(f"[*] Pulling Container: {job_data.get('image')}...")
-        logs = container_manager.run_container(job_data.get("image"), job_data.get("cmd"), use_gpu=True)
-        logging.info(f"[$] Job Output: {logs[:50]}...")
-    except Exception as e:
-        logging.error(f"[X] Job Failed: {e}")
+        # Pull before pausing the miner so the download is not paid as miner downtime
+        try:
+            await images.acquire_async(image)
+            acquired = True
+        except Exception as e:
+            logging.warning(f"Benchmark image unavailable ({e}); measuring with the local fallback")
+        await loop.run_in_executor(None, miner_ctrl.pause, uuids)
+        try:
+            await loop.run_in_executor(None, gpu_benchmark.measure_all, gpus)
+        finally:
+            await loop.run_in_executor(None, miner_ctrl.resume, uuids)
     finally:
-        miner_ctrl.resume()
+        if acquired:
+            images.release(image)
+        job_scheduler.unreserve(uuids)
 
-async def send_heartbeat(session):
+def write_audit(gpus):
+    """Classifies the inventory and writes the audit certificate. Blocking; runs off the event loop."""
+    import classifier
+    import gpu_benchmark
+    import reporter
+    # Measured bandwidth where cached, theoretical link bandwidth otherwise
+    gpus = classifier.classify_gpus(gpu_benchmark.annotate(gpus), classifier.MEASURED_RULES)
+    # Skipped when the classified inventory matches the existing certificate
+    if reporter.generate_report(gpus, filename="Silicon_Reserve_Audit.pdf", formats=REPORT_FORMATS):
+        logging.info(f"[*] Audit Certificate Generated: Silicon_Reserve_Audit ({', '.join(REPORT_FORMATS)})")
+
+async def audit():
+    """Audit and certificate generation, in the background so it does not delay the first heartbeat."""
     try:
-        gpus = hardware.scan_system()
-        primary = gpus[0] if gpus else {}
-        payload = {
-            "node_id": primary.get("uuid", "UNKNOWN"),
-            "status": "IDLE",
-            "gpu_temp": primary.get("temperature", 0)
-        }
-        async with session.post(C2_URL, json=payload, timeout=5) as response:
-            if response.status == 200:
-                data = await response.json()
-                if data.get("command") == "PAUSE": await execute_job(data)
-                else: logging.info(f"Heartbeat ACK. Status: {data.get('command')}")
+        gpus = await hardware.scan_system_async()
+        if BENCHMARK_ON_START:
+            await benchmark_devices(gpus)
+        await asyncio.get_running_loop().run_in_executor(None, write_audit, gpus)
+        startup["audit"] = round(time.time() - process_started, 3)
     except Exception as e:
-        logging.error(f"Connection Lost: {e}")
+        logging.warning(f"Audit Gen Failed: {e}")
 
 async def main():
     logging.info("Initializing Silicon Reserve Node...")
-    try:
-        gpus = hardware.scan_system()
-        reporter.generate_report(gpus, filename="Silicon_Reserve_Audit.pdf")
-        logging.info("[*] Audit Certificate Generated: Silicon_Reserve_Audit.pdf")
-    except Exception as e:
-        logging.warning(f"Audit Gen Failed: {e}")
+    spawn(audit())
+    sampler.start()
 
-    async with aiohttp.ClientSession() as session:
-        while True:
-            await send_heartbeat(session)
-            await asyncio.sleep(POLL_INTERVAL)
+    spawn(job_scheduler.run())
+    # Warm the cache with what this node has run most
+    spawn(images.prefetch_async(images.likely_images()))
+    if warm_pool is not None:
+        spawn(reap_warm_pool())
+    if METRICS_PORT:
+        try:
+            await metrics.serve(port=METRICS_PORT, profiling=METRICS_PROFILING)
+        except OSError as e:
+            logging.warning(f"Metrics endpoint unavailable: {e}")
+    async with transport.create_session() as session:
+        channel = transport.JobChannel(session, C2_URL, build_heartbeat, handle_command,
+                                       ws_url=C2_WS_URL, beat_interval=POLL_INTERVAL)
+        metrics.register_collector(lambda: {f"transport_{name}": value for name, value in channel.transport.counters.items()})
+        await channel.run()
 
 if __name__ == "__main__":
     asyncio.run(main())
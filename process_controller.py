@@ -2,72 +2,583 @@ import psutil
 import time
 import logging
 import os
-import sys
+import re
+import subprocess
+import threading
+from collections import Counter, deque
+
+import metrics
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - CONTROLLER - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+class ThrottleStrategy:
+    """
+    How a miner is moved out of the way of a job.
+    engage() runs when the first hold on a miner is taken, release() when the last one is dropped.
+    frees_vram marks strategies after which the job may wait for the miner's GPU memory to be released.
+    """
+    name = "base"
+    frees_vram = False
+    settles = False # settle() has follow-up measurements to take after release()
+
+    def engage(self, pid: int, tree):
+        raise NotImplementedError
+
+    def release(self, pid: int, tree):
+        raise NotImplementedError
+
+    def settle(self, pid: int) -> dict:
+        """Timings that are only known some time after release(); may block, runs off the caller's thread."""
+        return {}
+
+class SuspendStrategy(ThrottleStrategy):
+    """SIGSTOP/SIGCONT. Fastest handover, but the miner keeps its GPU memory."""
+    name = "suspend"
+
+    def engage(self, pid: int, tree):
+        for member in reversed(tree): # Children first, so nothing keeps feeding a stopped parent
+            try:
+                psutil.Process(member).suspend()
+            except psutil.NoSuchProcess:
+                if member == pid:
+                    raise
+
+    def release(self, pid: int, tree):
+        for member in tree:
+            try:
+                psutil.Process(member).resume()
+            except psutil.NoSuchProcess:
+                if member == pid:
+                    raise
+
+class CgroupQuotaStrategy(ThrottleStrategy):
+    """
+    Caps the miner's cgroup (v2) CPU and optionally IO bandwidth instead of stopping it.
+    Applies to every process in the miner's cgroup, e.g. its whole systemd service.
+    Previous limits are restored on release.
+    """
+    name = "cgroup"
+
+    def __init__(self, cpu_max: str = "10000 100000", io_max: str = None, cgroup_root: str = "/sys/fs/cgroup"):
+        self.cpu_max = cpu_max # "<quota_us> <period_us>": 10% of one CPU by default
+        self.io_max = io_max   # e.g. "8:0 rbps=1048576 wbps=1048576"
+        self.cgroup_root = cgroup_root
+        self._saved = {}
+
+    def _cgroup_dir(self, pid: int) -> str:
+        with open(f"/proc/{pid}/cgroup") as f:
+            for line in f:
+                if line.startswith("0::"):
+                    return os.path.join(self.cgroup_root, line.strip()[3:].lstrip("/"))
+        raise RuntimeError(f"PID {pid} is not in a cgroup v2 hierarchy")
+
+    def engage(self, pid: int, tree):
+        cgroup = self._cgroup_dir(pid)
+        saved = {}
+        for control, value in (("cpu.max", self.cpu_max), ("io.max", self.io_max)):
+            if not value:
+                continue
+            path = os.path.join(cgroup, control)
+            with open(path) as f:
+                saved[path] = f.read().strip()
+            with open(path, "w") as f:
+                f.write(value)
+        self._saved[pid] = saved
+
+    def release(self, pid: int, tree):
+        for path, value in self._saved.pop(pid, {}).items():
+            if path.endswith("io.max"):
+                # io.max reads back as one line per device; limits are reset per device
+                device = (self.io_max or "").split(" ")[0]
+                value = next((line for line in value.splitlines() if line.startswith(device)),
+                             f"{device} rbps=max wbps=max riops=max wiops=max")
+            with open(path, "w") as f:
+                f.write(value)
+
+# Parent process names of supervisors that restart a miner on their own
+SUPERVISORS = ("supervisord", "runsv", "s6-supervise", "pm2", "pm2 god daemon")
+
+def supervisor(pid: int):
+    """
+    Name of whatever restarts the process on exit (a systemd service unit or a
+    supervisor parent), or None for a miner started by hand.
+    """
+    try:
+        with open(f"/proc/{pid}/cgroup") as f:
+            for line in f:
+                unit = line.strip().split(":", 2)[-1].rsplit("/", 1)[-1]
+                if unit.endswith(".service") and not unit.startswith("user@"):
+                    return unit
+    except OSError:
+        pass
+    try:
+        for parent in psutil.Process(pid).parents():
+            if parent.pid != 1 and parent.name().lower() in SUPERVISORS:
+                return parent.name()
+    except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+        pass
+    return None
+
+class StopRestartStrategy(ThrottleStrategy):
+    """
+    Stops the miner outright (freeing its GPU memory) and relaunches it with the
+    same command line, working directory and environment on release.
+    Refuses supervised miners (systemd unit, supervisord, ...): the supervisor
+    would restart the miner itself and the relaunch would start a duplicate.
+    restart_cost records how long the relaunched miner took to reappear on a GPU;
+    it is measured by settle(), not by release().
+    """
+    name = "restart"
+    frees_vram = True
+    settles = True
+
+    def __init__(self, grace: float = 10, device_pids=None, restart_probe_timeout: float = 30):
+        self.grace = grace
+        self.device_pids = device_pids
+        self.restart_probe_timeout = restart_probe_timeout
+        self.restart_cost = None
+        self._launch = {}
+        self._relaunched = {} # Old root pid -> (new pid, launch time), until settle() probes it
+
+    def engage(self, pid: int, tree):
+        managed_by = supervisor(pid)
+        if managed_by:
+            raise RuntimeError(f"miner is supervised by {managed_by}, which would restart it alongside our relaunch")
+        proc = psutil.Process(pid)
+        self._launch[pid] = {"cmdline": proc.cmdline(), "cwd": proc.cwd(), "env": proc.environ()}
+        procs = []
+        for member in tree:
+            try:
+                procs.append(psutil.Process(member))
+            except psutil.NoSuchProcess:
+                pass
+        for p in procs:
+            try:
+                p.terminate()
+            except psutil.NoSuchProcess:
+                pass
+        _, alive = psutil.wait_procs(procs, timeout=self.grace)
+        for p in alive:
+            p.kill()
+
+    def release(self, pid: int, tree):
+        launch = self._launch.pop(pid, None)
+        if launch is None:
+            return
+        started = time.time()
+        new = subprocess.Popen(launch["cmdline"], cwd=launch["cwd"], env=launch["env"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+        logger.info(f"Miner relaunched (PID: {new.pid})")
+        if self.device_pids is not None:
+            self._relaunched[pid] = (new.pid, started)
+
+    def settle(self, pid: int) -> dict:
+        relaunched = self._relaunched.pop(pid, None)
+        if relaunched is None:
+            return {}
+        new_pid, started = relaunched
+        # Restart cost = time until the new miner holds a GPU context again
+        deadline = started + self.restart_probe_timeout
+        while time.time() < deadline:
+            pids = set(MinerController.process_tree(new_pid))
+            if any(holders & pids for holders in self.device_pids().values()):
+                self.restart_cost = time.time() - started
+                logger.info(f"Miner back on GPU after {self.restart_cost:.1f}s")
+                return {"restart_cost_s": round(self.restart_cost, 3)}
+            time.sleep(0.5)
+        return {}
+
+STRATEGIES = {
+    "suspend": SuspendStrategy,
+    "cgroup": CgroupQuotaStrategy,
+    "restart": StopRestartStrategy
+}
+
+def make_strategy(name: str, device_pids=None) -> ThrottleStrategy:
+    """Builds a throttling strategy by name ("suspend", "cgroup" or "restart")."""
+    if name not in STRATEGIES:
+        raise ValueError(f"Unknown throttle strategy: {name}")
+    if name == "restart":
+        return StopRestartStrategy(device_pids=device_pids)
+    return STRATEGIES[name]()
+
 class MinerController:
-    def __init__(self):
-        self.miner_pid = None
+    # Full process-table rescan interval (catches PID reuse among already-seen PIDs)
+    FULL_SCAN_INTERVAL = 300
+
+    def __init__(self, device_pids=None, strategy: ThrottleStrategy = None, gpu_memory=None,
+                 vram_timeout: float = 30):
+        self.miner_pid = None # First tracked miner, kept for compatibility
         # List of common miner process names + our mock
         self.miner_names = ["mock_miner", "t-rex", "nbminer", "bminer", "gminer", "lolminer"]
+        # Optional callable returning {gpu_uuid: {pid, ...}} (e.g. NVMLSession.device_pids)
+        self.device_pids = device_pids
+        # Tracked miner roots: pid -> (create_time, matched miner name)
+        self.miners = {}
+        self._seen = {} # pid -> (create_time, name) of processes classified as "not a miner"
+        self._last_full_scan = 0
+        self._pattern = None
+        self._pattern_names = None
+        # Throttling: default strategy, optional per-miner-name overrides
+        self.strategy = strategy or SuspendStrategy()
+        self.strategies = {}
+        # Optional callable returning {gpu_uuid: memory_used_mb}, used to confirm VRAM release
+        self.gpu_memory = gpu_memory
+        self.vram_timeout = vram_timeout
+        # Handover timings per (miner name, strategy name), most recent last
+        self.metrics = {}
+        # Outstanding pause holds: GPU-set key -> stack of root-pid lists, one per pause() call
+        self._holds = {}
+        self._pause_counts = Counter() # Root pid -> number of holds
+        self._paused = {} # Root pid -> {"tree", "gpus", "miner", "strategy"} while throttled
+        self._transitions = {} # Root pid -> lock held while its strategy engages or releases
+        self._lock = threading.RLock() # Bookkeeping only; never held through strategy work
+
+    def _matcher(self):
+        """One precompiled alternation over all miner names, rebuilt if the list changes."""
+        names = tuple(self.miner_names)
+        if self._pattern is None or names != self._pattern_names:
+            self._pattern = re.compile("|".join(re.escape(n.lower()) for n in names))
+            self._pattern_names = names
+            self._seen.clear()
+        return self._pattern
+
+    def _classify(self, pid: int, pattern):
+        """Returns the matched miner name for a process, or None."""
+        proc = psutil.Process(pid)
+        with proc.oneshot():
+            name = proc.name().lower()
+            match = pattern.search(name)
+            # Cmdline is only read for candidates: named like a miner, or python scripts
+            if not match and "python" not in name:
+                return None, None
+            cmdline_str = " ".join(proc.cmdline() or []).lower()
+            if not match:
+                match = pattern.search(cmdline_str)
+            if not match:
+                return None, None
+            # Avoid killing self or unrelated python scripts
+            if "process_controller" in cmdline_str or "main.py" in cmdline_str:
+                return None, None
+            return match.group(0), proc.create_time()
+
+    @staticmethod
+    def _identity(pid: int):
+        """(create_time, name) of a process; PID reuse or an exec into another program changes it."""
+        proc = psutil.Process(pid)
+        with proc.oneshot():
+            return proc.create_time(), proc.name()
+
+    def refresh(self, full: bool = False):
+        """
+        Updates the tracked miner set and returns the miner root PIDs.
+        Incremental by default: a process is classified again only when its
+        PID is new or its create_time or name changed since it was last
+        classified (PID reuse, a wrapper exec'ing into a miner). Tracked
+        miners are re-validated by create_time to detect PID reuse.
+        """
+        with self._lock:
+            pattern = self._matcher()
+            now = time.time()
+            if now - self._last_full_scan > self.FULL_SCAN_INTERVAL:
+                full = True
+
+            pids = set(psutil.pids())
+            for pid in self._seen.keys() - pids:
+                del self._seen[pid]
+
+            for pid, (create_time, miner) in list(self.miners.items()):
+                try:
+                    proc = psutil.Process(pid)
+                    if proc.create_time() == create_time and proc.status() != psutil.STATUS_ZOMBIE:
+                        continue
+                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                    pass
+                logger.info(f"Miner process gone: {miner} (PID: {pid})")
+                del self.miners[pid]
+
+            if full:
+                self._seen.clear()
+                self._last_full_scan = now
+
+            for pid in pids - self.miners.keys():
+                try:
+                    identity = self._identity(pid)
+                    if self._seen.get(pid) == identity:
+                        continue
+                    miner, create_time = self._classify(pid, pattern)
+                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                    self._seen.pop(pid, None)
+                    continue
+                if miner is None:
+                    self._seen[pid] = identity
+                    continue
+                self._seen.pop(pid, None)
+                self.miners[pid] = (create_time, miner)
+                logger.info(f"Found Miner Process: {miner} (PID: {pid})")
+
+            # Children of a tracked miner are handled through its tree, not as separate roots
+            roots = sorted(pid for pid in self.miners if not self._has_tracked_parent(pid))
+            self.miner_pid = roots[0] if roots else None
+            return roots
+
+    def _has_tracked_parent(self, pid: int) -> bool:
+        try:
+            return any(p.pid in self.miners for p in psutil.Process(pid).parents())
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            return False
 
     def find_miner_pid(self):
         """Scans running processes for known miner names."""
-        for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-            try:
-                # Check name and cmdline (for python scripts)
-                name = proc.info['name'].lower()
-                cmdline = proc.info['cmdline'] or []
-                cmdline_str = " ".join(cmdline).lower()
-
-                for miner in self.miner_names:
-                    # Check if miner name is in process name or cmdline
-                    if miner in name or (("python" in name) and (miner in cmdline_str)):
-                         # Avoid killing self or unrelated python scripts
-                         if "process_controller" in cmdline_str or "main.py" in cmdline_str:
-                             continue
-                         
-                         self.miner_pid = proc.info['pid']
-                         logger.info(f"Found Miner Process: {miner} (PID: {self.miner_pid})")
-                         return self.miner_pid
-            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                pass
-        
+        roots = self.refresh()
+        if roots:
+            return roots[0]
+
         logger.warning("No active miner process found.")
         return None
 
+    @staticmethod
+    def process_tree(pid: int):
+        """Returns [pid] followed by all of its descendants."""
+        try:
+            return [pid] + [c.pid for c in psutil.Process(pid).children(recursive=True)]
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            return [pid]
+
+    def miner_gpus(self, pid=None):
+        """
+        Returns the set of GPU UUIDs a miner (default: the first one) holds a context on,
+        or None when that cannot be determined.
+        """
+        pid = pid or self.miner_pid
+        if not pid or self.device_pids is None:
+            return None
+        try:
+            pids = set(self.process_tree(pid))
+            gpus = {uuid for uuid, holders in self.device_pids().items() if holders & pids}
+        except Exception as e:
+            logger.warning(f"Could not map miner to GPUs: {e}")
+            return None
+        # Not visible on any GPU usually means NVML cannot see into its PID namespace
+        return gpus or None
+
+    def occupied_gpus(self):
+        """
+        GPU UUIDs that tracked miners (running or paused) hold a context on.
+        None when any miner's devices cannot be determined, as pause() then treats it as on every GPU.
+        """
+        with self._lock:
+            occupied = set()
+            for pid in sorted(set(self.refresh()) | set(self._paused)):
+                gpus = self._paused[pid]["gpus"] if pid in self._paused else self.miner_gpus(pid)
+                if gpus is None:
+                    return None
+                occupied |= gpus
+            return occupied
+
+    def strategy_for(self, pid: int) -> ThrottleStrategy:
+        _, miner = self.miners.get(pid, (None, None))
+        return self.strategies.get(miner, self.strategy)
+
+    def _record(self, miner: str, strategy: ThrottleStrategy, **timings) -> dict:
+        entry = {k: round(v, 3) for k, v in timings.items() if v is not None}
+        with self._lock:
+            self.metrics.setdefault((miner, strategy.name), deque(maxlen=50)).append(entry)
+        return entry
+
+    def _settle(self, pid: int, strategy: ThrottleStrategy, entry: dict):
+        """Adds the strategy's post-release timings to a recorded handover."""
+        try:
+            timings = strategy.settle(pid)
+        except Exception as e:
+            logger.warning(f"Could not measure {strategy.name} handover: {e}")
+            return
+        with self._lock:
+            entry.update(timings)
+
+    def handover_stats(self):
+        """Returns {(miner, strategy): mean timings} over the recorded handovers."""
+        stats = {}
+        with self._lock:
+            snapshot = {key: [dict(entry) for entry in history] for key, history in self.metrics.items()}
+        for key, history in snapshot.items():
+            fields = {field for entry in history for field in entry}
+            stats[key] = {
+                field: round(sum(e[field] for e in history if field in e) / sum(1 for e in history if field in e), 3)
+                for field in fields
+            }
+            stats[key]["samples"] = len(history)
+        return stats
+
+    def fastest_strategy(self, miner: str):
+        """Name of the strategy with the lowest mean pause-to-GPU-ready time for a miner, if any were measured."""
+        candidates = {
+            strategy: s.get("engage_s", 0) + s.get("vram_wait_s", 0)
+            for (name, strategy), s in self.handover_stats().items() if name == miner
+        }
+        return min(candidates, key=candidates.get) if candidates else None
+
+    def wait_for_vram(self, pids, gpu_uuids, timeout: float = None) -> bool:
+        """
+        Blocks until the miner no longer holds a context on gpu_uuids and NVML
+        memory use on them has stopped falling. Returns False on timeout.
+        """
+        if self.device_pids is None and self.gpu_memory is None:
+            return True
+        deadline = time.time() + (timeout if timeout is not None else self.vram_timeout)
+        pids = set(pids)
+        last = None
+        while time.time() < deadline:
+            held = False
+            if self.device_pids is not None:
+                held = any(self.device_pids().get(uuid, set()) & pids for uuid in gpu_uuids)
+            if not held:
+                if self.gpu_memory is None:
+                    return True
+                memory = self.gpu_memory()
+                used = [memory.get(uuid, 0) for uuid in gpu_uuids]
+                if used == last:
+                    return True
+                last = used
+            time.sleep(0.25)
+        logger.warning(f"Timed out waiting for miner VRAM release on {', '.join(gpu_uuids)}")
+        return False
+
+    def _suspend(self, pid: int):
+        with self._lock:
+            tree = self.process_tree(pid)
+            _, miner = self.miners.get(pid, (None, "unknown"))
+            strategy = self.strategy_for(pid)
+        gpus = self.miner_gpus(pid)
+        started = time.time()
+        try:
+            strategy.engage(pid, tree)
+        except psutil.NoSuchProcess:
+            logger.error(f"Miner process {pid} no longer exists.")
+            with self._lock:
+                self.miners.pop(pid, None)
+            return
+        except Exception as e:
+            logger.error(f"Failed to pause miner with {strategy.name}: {e}")
+            if isinstance(strategy, SuspendStrategy):
+                return
+            # Whatever else happens, the job must get the GPU
+            strategy = SuspendStrategy()
+            started = time.time()
+            strategy.engage(pid, tree)
+        engage_s = time.time() - started
+
+        vram_wait_s = None
+        if strategy.frees_vram and gpus:
+            waited = time.time()
+            self.wait_for_vram(tree, gpus)
+            vram_wait_s = time.time() - waited
+
+        with self._lock:
+            self._paused[pid] = {"tree": tree, "gpus": gpus, "miner": miner, "strategy": strategy,
+                                 "engage_s": engage_s, "vram_wait_s": vram_wait_s}
+        metrics.observe("miner_pause_seconds", engage_s + (vram_wait_s or 0), strategy=strategy.name)
+        logger.info(f"Miner PAUSED via {strategy.name} (PID: {pid}, {len(tree)} process(es), {engage_s:.2f}s)")
+
+    def _resume(self, pid: int):
+        with self._lock:
+            paused = self._paused.pop(pid, None)
+        if paused is None:
+            return
+        strategy = paused["strategy"]
+        started = time.time()
+        try:
+            strategy.release(pid, paused["tree"])
+        except psutil.NoSuchProcess:
+            logger.error(f"Miner process {pid} no longer exists.")
+            with self._lock:
+                self.miners.pop(pid, None)
+        except Exception as e:
+            logger.error(f"Failed to resume miner: {e}")
+        release_s = time.time() - started
+        metrics.observe("miner_resume_seconds", release_s, strategy=strategy.name)
+        entry = self._record(paused["miner"], strategy, engage_s=paused["engage_s"],
+                             vram_wait_s=paused["vram_wait_s"], release_s=release_s)
+        if strategy.settles:
+            # e.g. the restart probe: up to restart_probe_timeout, and the job's GPUs are free already
+            threading.Thread(target=self._settle, args=(pid, strategy, entry), daemon=True).start()
+        logger.info(f"Miner RESUMED via {strategy.name} (PID: {pid}, {release_s:.2f}s)")
+
+    def _reconcile(self, pid: int):
+        """
+        Brings one miner to the state its hold count asks for: throttled while
+        any hold is outstanding, running otherwise. The slow strategy work runs
+        under a per-miner lock only, so other miners and the bookkeeping in
+        pause()/resume() are not blocked by it. Calls that race on one miner
+        converge, whichever order they take the per-miner lock in.
+        """
+        with self._lock:
+            transition = self._transitions.setdefault(pid, threading.Lock())
+        with transition:
+            while True:
+                with self._lock:
+                    wanted = self._pause_counts.get(pid, 0) > 0
+                    throttled = pid in self._paused
+                if wanted == throttled:
+                    return
+                if wanted:
+                    self._suspend(pid)
+                else:
+                    self._resume(pid)
+                with self._lock:
+                    if (pid in self._paused) == throttled:
+                        return # The strategy failed (e.g. the miner exited); nothing more to do
+
     # RENAMED from pause_miner to pause to match main.py
-    def pause(self):
-        """Pauses the miner process (SIGSTOP)."""
-        if not self.miner_pid:
-            self.find_miner_pid()
-        
-        if self.miner_pid:
-            try:
-                proc = psutil.Process(self.miner_pid)
-                proc.suspend()
-                logger.info(f"Miner PAUSED (PID: {self.miner_pid})")
-            except psutil.NoSuchProcess:
-                logger.error(f"Miner process {self.miner_pid} no longer exists.")
-                self.miner_pid = None
-            except Exception as e:
-                logger.error(f"Failed to pause miner: {e}")
+    def pause(self, gpu_uuids=None):
+        """
+        Throttles miner processes and their children (SIGSTOP by default, see ThrottleStrategy).
+        With gpu_uuids, only miners running on one of those GPUs are paused.
+        Pauses are reference counted: a miner stays paused until every hold on it is released.
+        Returns once every targeted miner is throttled.
+        """
+        with self._lock:
+            targets = []
+            # Miners already throttled count too: a stopped miner no longer shows up in the process table
+            for pid in sorted(set(self.refresh()) | set(self._paused)):
+                if gpu_uuids:
+                    miner_gpus = self._paused[pid]["gpus"] if pid in self._paused else self.miner_gpus(pid)
+                    if miner_gpus is not None and not miner_gpus & set(gpu_uuids):
+                        logger.info(f"Miner not on requested GPUs, leaving it running (PID: {pid})")
+                        continue
+                targets.append(pid)
+
+            key = frozenset(gpu_uuids or ())
+            self._holds.setdefault(key, []).append(targets)
+            for pid in targets:
+                self._pause_counts[pid] += 1
+
+        # Also waits out an engage another caller already started on the same miner
+        for pid in targets:
+            self._reconcile(pid)
 
     # RENAMED from resume_miner to resume to match main.py
-    def resume(self):
-        """Resumes the miner process (SIGCONT)."""
-        if self.miner_pid:
-            try:
-                proc = psutil.Process(self.miner_pid)
-                proc.resume()
-                logger.info(f"Miner RESUMED (PID: {self.miner_pid})")
-            except psutil.NoSuchProcess:
-                logger.error(f"Miner process {self.miner_pid} no longer exists.")
-                self.miner_pid = None
-            except Exception as e:
-                logger.error(f"Failed to resume miner: {e}")
+    def resume(self, gpu_uuids=None):
+        """Releases a pause hold and resumes miners that no longer have any."""
+        with self._lock:
+            key = frozenset(gpu_uuids or ())
+            stack = self._holds.get(key)
+            if not stack:
+                return
+            targets = stack.pop()
+            if not stack:
+                del self._holds[key]
+
+            released = []
+            for pid in targets:
+                self._pause_counts[pid] -= 1
+                if self._pause_counts[pid] <= 0:
+                    del self._pause_counts[pid]
+                    released.append(pid)
+
+        for pid in released:
+            self._reconcile(pid)
 
 if __name__ == "__main__":
     controller = MinerController()
@@ -1,35 +1,169 @@
-from fpdf import FPDF
-from datetime import datetime
-from typing import List, Dict, Any
+import csv
+import hashlib
+import json
 import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Optional, Sequence
+
+import metrics
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-class ApexReport(FPDF):
-    def header(self):
-        # BRANDING UPDATE: Silicon Reserve Eurasia
-        self.set_font('Courier', 'B', 14)
-        self.cell(0, 10, 'SILICON RESERVE EURASIA | INFRASTRUCTURE AUDIT', align='C', new_x="LMARGIN", new_y="NEXT")
-        self.ln(5)
+# Bump when the layout changes so cached reports are regenerated
+REPORT_VERSION = 2
+# Live readings that do not change what the report certifies. The current PCIe
+# link drops to a lower generation (and sometimes width) at idle to save power.
+VOLATILE_FIELDS = ("temperature", "memory_used", "pcie_gen_current", "pcie_width_current")
+# Rows per PDF part in fleet reports; bounds memory for arbitrarily large fleets
+FLEET_ROWS_PER_PART = 5000
+
+# Columns of the shared report model, in output order, with their types
+REPORT_COLUMNS = [
+    ("name", str),
+    ("uuid", str),
+    ("pci_bus_id", str),
+    ("memory_total", int),
+    ("pcie_gen_current", int),
+    ("pcie_width_current", int),
+    ("driver_version", str),
+    ("h2d_gbps", float),
+    ("d2h_gbps", float),
+    ("tier", str),
+    ("classification_reason", str)
+]
+
+# Output format -> file extension
+FORMATS = {"pdf": ".pdf", "jsonl": ".jsonl", "csv": ".csv", "parquet": ".parquet"}
 
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('Courier', 'I', 8)
-        self.cell(0, 10, 'This document acts as a preliminary technical assessment for the Reserve Hashrate Swap Agreement.', align='C')
+# --- Report model ---
 
-def generate_report(nodes: List[Dict[str, Any]], filename: str = "Silicon_Reserve_Audit.pdf"):
+def inventory_hash(nodes: List[Dict[str, Any]]) -> str:
+    """Stable hash of the classified inventory, ignoring live readings."""
+    digest = hashlib.sha256(f"v{REPORT_VERSION}".encode())
+    for node in nodes:
+        stable = {k: v for k, v in node.items() if k not in VOLATILE_FIELDS}
+        digest.update(json.dumps(stable, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+def build_model(nodes: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
     """
-    Generates a PDF report for the audited GPUs.
+    One pass over nodes producing everything the output formats need:
+    rows restricted to REPORT_COLUMNS (missing values as None) and a tier summary.
     """
-    pdf = ApexReport()
+    rows = []
+    tier_counts: Dict[str, int] = {}
+    for node in nodes:
+        row = {column: node.get(column) for column, _ in REPORT_COLUMNS}
+        rows.append(row)
+        tier = row["tier"] or "Unknown"
+        tier_counts[tier] = tier_counts.get(tier, 0) + 1
+    return {
+        "generated_at": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "rows": rows,
+        "summary": {"gpus": len(rows), "tiers": tier_counts, "restricted": "Tier C" in tier_counts}
+    }
+
+def _hash_file(filename: str) -> str:
+    return f"{filename}.sha256"
+
+def _is_current(digest: str, filename: str) -> bool:
+    try:
+        with open(_hash_file(filename)) as f:
+            cached = f.read().strip()
+    except FileNotFoundError:
+        return False
+    return os.path.exists(filename) and cached == digest
+
+def is_current(nodes: List[Dict[str, Any]], filename: str) -> bool:
+    """True if filename exists and was rendered from this inventory."""
+    return _is_current(inventory_hash(nodes), filename)
+
+def output_paths(filename: str, formats: Sequence[str]) -> Dict[str, str]:
+    """Maps each format to its file: the extension of filename is swapped per format."""
+    base = os.path.splitext(filename)[0]
+    unknown = [fmt for fmt in formats if fmt not in FORMATS]
+    if unknown:
+        raise ValueError(f"Unknown report format(s): {unknown}")
+    return {fmt: base + FORMATS[fmt] for fmt in formats}
+
+# --- Tabular writers (streamable, so fleet reports can append chunk by chunk) ---
+
+class JsonlWriter:
+    def __init__(self, filename: str):
+        self.file = open(filename, "w")
+
+    def write(self, rows: List[Dict[str, Any]]):
+        self.file.writelines(json.dumps(row) + "\n" for row in rows)
+
+    def close(self):
+        self.file.close()
+
+class CsvWriter:
+    def __init__(self, filename: str):
+        self.file = open(filename, "w", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=[column for column, _ in REPORT_COLUMNS])
+        self.writer.writeheader()
+
+    def write(self, rows: List[Dict[str, Any]]):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+class ParquetWriter:
+    """Requires pyarrow; the schema is fixed so chunks with all-missing columns still line up."""
+
+    def __init__(self, filename: str):
+        # Import inside class to keep pyarrow optional
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        types = {str: pa.string(), int: pa.int64(), float: pa.float64()}
+        self.pa = pa
+        self.schema = pa.schema([(column, types[kind]) for column, kind in REPORT_COLUMNS])
+        self.writer = pq.ParquetWriter(filename, self.schema)
+
+    def write(self, rows: List[Dict[str, Any]]):
+        self.writer.write_table(self.pa.Table.from_pylist(rows, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+TABLE_WRITERS = {"jsonl": JsonlWriter, "csv": CsvWriter, "parquet": ParquetWriter}
+
+# --- PDF (fpdf is only imported when a PDF is requested) ---
+
+_report_class = None
+
+def _pdf_class():
+    global _report_class
+    if _report_class is None:
+        from fpdf import FPDF
+
+        class ApexReport(FPDF):
+            def header(self):
+                # BRANDING UPDATE: Silicon Reserve Eurasia
+                self.set_font('Courier', 'B', 14)
+                self.cell(0, 10, 'SILICON RESERVE EURASIA | INFRASTRUCTURE AUDIT', align='C', new_x="LMARGIN", new_y="NEXT")
+                self.ln(5)
+
+            def footer(self):
+                self.set_y(-15)
+                self.set_font('Courier', 'I', 8)
+                self.cell(0, 10, 'This document acts as a preliminary technical assessment for the Reserve Hashrate Swap Agreement.', align='C')
+
+        _report_class = ApexReport
+    return _report_class
+
+def _start_table(pdf, timestamp: str):
     pdf.add_page()
-    pdf.set_auto_page_break(auto=True, margin=15)
 
     # Timestamp
     pdf.set_font('Courier', '', 10)
-    timestamp = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
     pdf.cell(0, 10, f"Timestamp: {timestamp}", new_x="LMARGIN", new_y="NEXT")
     pdf.ln(5)
 
@@ -43,37 +177,36 @@ def generate_report(nodes: List[Dict[str, Any]], filename: str = "Silicon_Reserv
 
     # Table Rows
     pdf.set_font('Courier', '', 10)
-    
-    for node in nodes:
-        name = node.get("name", "Unknown")
-        uuid = node.get("uuid", "Unknown")[-8:] # Truncate UUID
-        pcie_width = node.get("pcie_width_current", -1)
-        tier = node.get("tier", "Unknown")
-        
-        pdf.cell(60, 10, name, border=1)
-        pdf.cell(50, 10, uuid, border=1)
-        
-        # PCIe Status Color Coding
-        if pcie_width >= 8:
-            pdf.set_text_color(0, 128, 0) # Green
-            status_text = f"x{pcie_width} (OK)"
-        else:
-            pdf.set_text_color(255, 0, 0) # Red
-            status_text = f"x{pcie_width} (FAIL)"
-            
-        pdf.cell(30, 10, status_text, border=1)
-        pdf.set_text_color(0, 0, 0) # Reset to black
-        
-        # Tier Font Size
-        pdf.set_font('Courier', 'B', 12)
-        pdf.cell(50, 10, tier, border=1, new_x="LMARGIN", new_y="NEXT")
-        pdf.set_font('Courier', '', 10) # Reset font
 
+def _add_row(pdf, row: Dict[str, Any]):
+    name = row["name"] or "Unknown"
+    uuid = (row["uuid"] or "Unknown")[-8:] # Truncate UUID
+    pcie_width = row["pcie_width_current"] if row["pcie_width_current"] is not None else -1
+    tier = row["tier"] or "Unknown"
+
+    pdf.cell(60, 10, name, border=1)
+    pdf.cell(50, 10, uuid, border=1)
+
+    # PCIe Status Color Coding, from the tier so it agrees with whichever rules classified the device
+    if tier != "Tier C":
+        pdf.set_text_color(0, 128, 0) # Green
+        status_text = f"x{pcie_width} (OK)"
+    else:
+        pdf.set_text_color(255, 0, 0) # Red
+        status_text = f"x{pcie_width} (FAIL)"
+
+    pdf.cell(30, 10, status_text, border=1)
+    pdf.set_text_color(0, 0, 0) # Reset to black
+
+    # Tier Font Size
+    pdf.set_font('Courier', 'B', 12)
+    pdf.cell(50, 10, tier, border=1, new_x="LMARGIN", new_y="NEXT")
+    pdf.set_font('Courier', '', 10) # Reset font
+
+def _add_hook(pdf, is_tier_c: bool):
     pdf.ln(10)
 
     # Financial Hook Logic
-    is_tier_c = any(n.get("tier") == "Tier C" for n in nodes)
-    
     pdf.set_font('Courier', 'B', 12)
     if not is_tier_c:
         # Tier B Hook
@@ -84,11 +217,138 @@ def generate_report(nodes: List[Dict[str, Any]], filename: str = "Silicon_Reserv
         pdf.set_fill_color(255, 220, 220) # Light Red
         pdf.multi_cell(0, 15, "SILICON RESERVE SUBSIDY: RESTRICTED. EST. CREDIT: $0.35/hr\nACTION REQUIRED: Upgrade PCIe risers to x8 or higher.", border=1, align='C', fill=True)
 
+def render_pdf(model: Dict[str, Any], filename: str, hook: Optional[bool] = True):
+    """
+    Renders a report model as PDF. hook=None omits the subsidy summary
+    (used for all but the last part of a fleet report).
+    """
+    pdf = _pdf_class()()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    _start_table(pdf, model["generated_at"])
+    for row in model["rows"]:
+        _add_row(pdf, row)
+    if hook is not None:
+        _add_hook(pdf, model["summary"]["restricted"])
+    pdf.output(filename)
+
+def write_table(model: Dict[str, Any], filename: str, fmt: str):
+    """Writes a report model in one of the tabular formats (jsonl, csv, parquet)."""
+    writer = TABLE_WRITERS[fmt](filename)
+    try:
+        writer.write(model["rows"])
+    finally:
+        writer.close()
+
+def _write(model: Dict[str, Any], filename: str, fmt: str) -> bool:
     try:
-        pdf.output(filename)
+        if fmt == "pdf":
+            render_pdf(model, filename)
+        else:
+            write_table(model, filename, fmt)
         logger.info(f"Report generated successfully: {filename}")
+        return True
     except Exception as e:
-        logger.error(f"Failed to generate report: {e}")
+        logger.error(f"Failed to generate {fmt} report: {e}")
+        return False
+
+# --- Entry points ---
+
+def generate_report(nodes: List[Dict[str, Any]], filename: str = "Silicon_Reserve_Audit.pdf", force: bool = False,
+                    formats: Sequence[str] = ("pdf",)) -> bool:
+    """
+    Generates reports for the audited GPUs in the requested formats
+    (pdf, jsonl, csv, parquet), all from one report model. Each file is named
+    after filename with the format's extension.
+    The inventory hash is stored next to each file (<file>.sha256); files whose
+    hash matches are kept and not rendered again unless force=True.
+    Returns True if any file was written.
+    """
+    digest = inventory_hash(nodes)
+    stale = {fmt: path for fmt, path in output_paths(filename, formats).items()
+             if force or not _is_current(digest, path)}
+    if not stale:
+        logger.info(f"Inventory unchanged; keeping {filename}")
+        return False
+
+    with metrics.timer("report_generation_seconds"):
+        model = build_model(nodes)
+        written = False
+        for fmt, path in stale.items():
+            if _write(model, path, fmt):
+                with open(_hash_file(path), "w") as f:
+                    f.write(digest)
+                written = True
+    return written
+
+def generate_fleet_report(nodes: Iterable[Dict[str, Any]], filename_prefix: str = "Silicon_Reserve_Fleet",
+                          rows_per_part: int = FLEET_ROWS_PER_PART, formats: Sequence[str] = ("pdf",)) -> List[str]:
+    """
+    Renders a fleet table from any iterable (e.g. a generator over a fleet
+    export), holding only rows_per_part rows in memory at a time. PDF output
+    is split into numbered parts with the subsidy summary on the last part;
+    tabular formats are streamed into a single file each.
+    Returns the written filenames.
+    """
+    tables = {fmt: path for fmt, path in output_paths(filename_prefix, formats).items() if fmt != "pdf"}
+    writers = {fmt: TABLE_WRITERS[fmt](path) for fmt, path in tables.items()}
+    written = []
+    is_tier_c = False
+    nodes = iter(nodes)
+    try:
+        chunk = list(islice(nodes, rows_per_part))
+        part = 1
+        while chunk:
+            next_chunk = list(islice(nodes, rows_per_part))
+            model = build_model(chunk)
+            is_tier_c = is_tier_c or model["summary"]["restricted"]
+            for writer in writers.values():
+                writer.write(model["rows"])
+            if "pdf" in formats:
+                filename = f"{filename_prefix}_part{part:04d}.pdf"
+                model["summary"]["restricted"] = is_tier_c
+                try:
+                    render_pdf(model, filename, hook=None if next_chunk else True)
+                    written.append(filename)
+                except Exception as e:
+                    logger.error(f"Failed to generate report part {filename}: {e}")
+            chunk = next_chunk
+            part += 1
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return written + list(tables.values())
+
+def _render_host(args) -> Optional[str]:
+    nodes, filename, formats = args
+    return filename if generate_report(nodes, filename, force=True, formats=formats) else None
+
+def generate_reports(hosts: Dict[str, List[Dict[str, Any]]], output_dir: str = ".",
+                     max_workers: Optional[int] = None, force: bool = False,
+                     formats: Sequence[str] = ("pdf",)) -> Dict[str, str]:
+    """
+    Multi-host batch mode: renders one report per host (<output_dir>/<host>.<ext>)
+    across a process pool. Hosts whose inventory hash matches all of their
+    existing outputs are skipped before any work is sent to the pool.
+    Returns {host: base filename} for every host with current reports.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    results = {}
+    jobs = {}
+    for host, nodes in hosts.items():
+        filename = os.path.join(output_dir, host)
+        digest = inventory_hash(nodes)
+        if not force and all(_is_current(digest, path) for path in output_paths(filename, formats).values()):
+            results[host] = filename
+        else:
+            jobs[host] = (nodes, filename, tuple(formats))
+
+    if jobs:
+        logger.info(f"Rendering {len(jobs)} host report(s), {len(results)} unchanged")
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for host, filename in zip(jobs, pool.map(_render_host, jobs.values())):
+                if filename:
+                    results[host] = filename
+    return results
 
 if __name__ == "__main__":
     # Mock Data for Verification
@@ -123,4 +383,4 @@ if __name__ == "__main__":
             "classification_reason": "High Bandwidth (x16)"
         }
     ]
-    generate_report(ideal_nodes, "Apex_Audit_Cert_Ideal.pdf")
+    generate_report(ideal_nodes, "Apex_Audit_Cert_Ideal.pdf", formats=("pdf", "jsonl", "csv"))
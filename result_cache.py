@@ -0,0 +1,133 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import List, Dict, Any, Optional
+
+import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - RESULT CACHE - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = "result_cache"
+MAX_BYTES = 256 * 1024 * 1024 # On-disk budget (compressed)
+TTL = 24 * 3600 # Results older than this are never served
+
+def result_key(image_digest: str, command) -> str:
+    """Content address of a job: the image it ran and its exact command line."""
+    cmd = command if isinstance(command, (list, tuple)) else [command]
+    return hashlib.sha256(json.dumps([image_digest, list(cmd)]).encode()).hexdigest()
+
+class ResultCache:
+    """
+    On-disk store of deterministic job results, keyed by result_key().
+
+    One gzip'd JSON file per entry under directory. Entries expire ttl seconds
+    after they were stored. The file mtime records the last hit, and once the
+    store exceeds max_bytes the least recently used entries are evicted.
+    The index is rebuilt from the directory at start, so hits survive restarts.
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = MAX_BYTES, ttl: float = TTL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._index: Dict[str, List[float]] = {} # key -> [size, last_used]
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            if name.endswith(".json.gz"):
+                stat = os.stat(os.path.join(directory, name))
+                self._index[name[:-len(".json.gz")]] = [stat.st_size, stat.st_mtime]
+        self.bytes = sum(size for size, _ in self._index.values())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json.gz")
+
+    def _drop(self, key: str):
+        """Removes an entry. Caller holds the lock."""
+        entry = self._index.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[0]
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """The stored result ({"output", "stored_at", ...}), or None on a miss or expiry."""
+        with self._lock:
+            if key not in self._index:
+                metrics.inc("result_cache_lookups_total", result="miss")
+                return None
+            try:
+                with gzip.open(self._path(key), "rt") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Dropping unreadable result {key[:12]}: {e}")
+                entry = None
+            if entry is None or time.time() - entry.get("stored_at", 0) > self.ttl:
+                self._drop(key)
+                metrics.inc("result_cache_lookups_total", result="expired" if entry else "miss")
+                return None
+            now = time.time()
+            self._index[key][1] = now
+            os.utime(self._path(key), (now, now))
+        metrics.inc("result_cache_lookups_total", result="hit")
+        return entry
+
+    def put(self, key: str, output: str, **meta):
+        """Stores a result, then evicts least recently used entries beyond max_bytes."""
+        entry = dict(meta, output=output, stored_at=time.time())
+        path = self._path(key)
+        tmp = f"{path}.tmp"
+        with gzip.open(tmp, "wt") as f:
+            json.dump(entry, f)
+        size = os.path.getsize(tmp)
+        if size > self.max_bytes:
+            os.remove(tmp)
+            return
+        with self._lock:
+            os.replace(tmp, path)
+            if key in self._index:
+                self.bytes -= self._index[key][0]
+            self._index[key] = [size, time.time()]
+            self.bytes += size
+            self._evict()
+
+    def _evict(self):
+        """Expired first, then least recently used, until under budget. Caller holds the lock."""
+        now = time.time()
+        # A file untouched for ttl holds a result stored at least ttl ago
+        for key in [k for k, (_, last_used) in self._index.items() if now - last_used > self.ttl]:
+            self._drop(key)
+        if self.bytes <= self.max_bytes:
+            return
+        for key, _ in sorted(self._index.items(), key=lambda kv: kv[1][1]):
+            if self.bytes <= self.max_bytes:
+                break
+            logger.info(f"Evicting result {key[:12]} ({self._index[key][0] / 1024:.0f} KB)")
+            self._drop(key)
+
+    async def get_async(self, key: str) -> Optional[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.get, key)
+
+    async def put_async(self, key: str, output: str, **meta):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, lambda: self.put(key, output, **meta))
+
+if __name__ == "__main__":
+    import tempfile
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ResultCache(directory, max_bytes=4096)
+        for i in range(20):
+            cache.put(result_key("sha256:demo", ["echo", str(i)]), os.urandom(300).hex())
+        print(f"{len(cache._index)} entries, {cache.bytes} bytes after 20 puts into a 4 KB store")
+        print("latest hit:", cache.get(result_key("sha256:demo", ["echo", "19"])) is not None)
+        print("oldest evicted:", cache.get(result_key("sha256:demo", ["echo", "0"])) is None)
@@ -0,0 +1,377 @@
+import asyncio
+import gzip
+import logging
+import os
+import time
+from collections import deque
+from typing import List, Dict, Any, Callable, Awaitable, Optional
+
+import container_manager
+import metrics
+from result_cache import result_key
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - SCHEDULER - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# GPUs a job gets when the server does not say otherwise (-1 = whole machine, 0 = CPU only)
+DEFAULT_GPU_COUNT = 1
+# Seconds before GPU jobs are re-planned after the inventory came back empty (e.g. a failed NVML poll)
+INVENTORY_RETRY = 5
+
+def job_requirements(job_data: Dict[str, Any]):
+    """Returns (gpu_count, min_memory_mb) for a job."""
+    gpu_count = int(job_data.get("gpu_count", DEFAULT_GPU_COUNT))
+    min_memory_mb = int(job_data.get("min_memory_mb", 0))
+    return gpu_count, min_memory_mb
+
+def place(gpus: List[Dict[str, Any]], allocated, gpu_count: int, min_memory_mb: int = 0) -> Optional[List[str]]:
+    """
+    Picks device UUIDs for a job.
+    Returns the chosen UUIDs ([] for CPU-only jobs), or None if the job does not fit right now.
+    Best fit: the smallest devices that satisfy the memory requirement are preferred,
+    keeping large devices free for large jobs.
+    """
+    if gpu_count == 0:
+        return []
+
+    eligible = [g for g in gpus if g.get("memory_total", 0) >= min_memory_mb]
+    if gpu_count < 0:
+        # Whole machine: every device must be free and large enough
+        if not gpus or len(eligible) != len(gpus) or any(g["uuid"] in allocated for g in gpus):
+            return None
+        return [g["uuid"] for g in gpus]
+
+    free = [g for g in eligible if g["uuid"] not in allocated]
+    if len(free) < gpu_count:
+        return None
+
+    free.sort(key=lambda g: (g.get("memory_total", 0), g.get("memory_used", 0), g.get("index", 0)))
+    return [g["uuid"] for g in free[:gpu_count]]
+
+class JobScheduler:
+    """
+    Local job queue that places each job on specific GPUs.
+    Independent jobs run in parallel on disjoint devices; a job waits in the
+    queue until enough free GPUs meet its memory requirement. Later jobs that
+    fit may run ahead of a waiting one.
+    With an admission controller, devices it holds back (hot, short on free
+    memory) are avoided; a job that only fits on those is delayed or rejected.
+
+    A job re-sent while the same job_id is still queued or running is ignored.
+    With a result cache (and an image cache to resolve image digests), jobs
+    marked "deterministic" are answered from a stored result of the same image
+    digest and command when there is one; otherwise, if an identical job is
+    already in flight, they wait for its result instead of starting another
+    container, and run themselves only if it fails.
+    """
+
+    def __init__(self, inventory: Callable[[], Awaitable[List[Dict[str, Any]]]], miner_ctrl,
+                 run=None, image_cache=None, log_dir: Optional[str] = None, warm_pool=None,
+                 admission=None, result_cache=None, log_head_bytes: int = 64 * 1024,
+                 log_tail_bytes: int = 64 * 1024):
+        self.inventory = inventory
+        self.miner_ctrl = miner_ctrl
+        self.run_container = run # Defaults to container_manager.run_container_async
+        self.image_cache = image_cache
+        self.log_dir = log_dir # When set, full job output is spooled here as <job_id>.log.gz
+        self.log_head_bytes = log_head_bytes # Output kept in memory per job: first and last bytes
+        self.log_tail_bytes = log_tail_bytes
+        self.warm_pool = warm_pool # Used for jobs that set "warm": true
+        self.admission = admission # admission.AdmissionController, optional
+        self.result_cache = result_cache # result_cache.ResultCache, optional
+        self.active = set() # job_ids queued, awaiting a cache lookup, or running
+        self._result_keys: Dict[str, str] = {} # job_id -> result key of a cacheable job
+        self._in_flight: Dict[str, asyncio.Future] = {} # result key -> final report of the job computing it
+        self._tasks = set()
+        self.delayed: Dict[str, Dict[str, Any]] = {} # job_id -> latest delay decision
+        self._retry = None
+        self.captures: Dict[str, container_manager.LogCapture] = {} # Live output of running jobs
+        self.reports: List[Dict[str, Any]] = [] # Finished-job reports awaiting a heartbeat ACK
+        self._reports_sent = 0
+        self.pending = deque()
+        self.allocated: Dict[str, str] = {} # gpu uuid -> job_id
+        self.running: Dict[str, asyncio.Task] = {}
+        self._wakeup = None
+
+    @property
+    def busy(self) -> bool:
+        return bool(self.running)
+
+    def report_payload(self) -> List[Dict[str, Any]]:
+        """Job reports for the next heartbeat; they are kept until ack_reports()."""
+        self._reports_sent = len(self.reports)
+        return list(self.reports)
+
+    def admission_payload(self) -> Dict[str, Dict[str, Any]]:
+        """Current decisions for jobs held back by admission control."""
+        return dict(self.delayed)
+
+    def ack_reports(self):
+        del self.reports[:self._reports_sent]
+        self._reports_sent = 0
+
+    def reserve(self, uuids: List[str], owner: str) -> bool:
+        """Claims GPUs for work outside the job queue (e.g. the benchmark); False if any is allocated."""
+        if any(uuid in self.allocated for uuid in uuids):
+            return False
+        for uuid in uuids:
+            self.allocated[uuid] = owner
+        return True
+
+    def unreserve(self, uuids: List[str]):
+        for uuid in uuids:
+            self.allocated.pop(uuid, None)
+        self._wake()
+
+    def _wake(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._wakeup.set()
+
+    def _schedule_retry(self, delay: float):
+        """Re-runs dispatch after delay, once, however many jobs are waiting on it."""
+        if self._retry is None:
+            def retry():
+                self._retry = None
+                self._wake()
+            self._retry = asyncio.get_running_loop().call_later(delay, retry)
+
+    def submit(self, job_data: Dict[str, Any]):
+        """Queues a job for placement (after a result cache lookup for deterministic jobs)."""
+        job_id = str(job_data.get("job_id"))
+        if job_id in self.active:
+            logger.info(f"Job {job_id} is already queued or running. Ignoring the duplicate.")
+            return
+        self.active.add(job_id)
+        if self.result_cache is not None and self.image_cache is not None and job_data.get("deterministic"):
+            task = asyncio.create_task(self._submit_cacheable(job_data))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            self._enqueue(job_data)
+
+    def _enqueue(self, job_data: Dict[str, Any]):
+        logger.info(f"Job queued: {job_data.get('job_id')} (GPUs: {job_data.get('gpu_count', DEFAULT_GPU_COUNT)})")
+        self.pending.append(job_data)
+        self._wake()
+
+    async def _submit_cacheable(self, job_data: Dict[str, Any]):
+        job_id = str(job_data.get("job_id"))
+        started = time.time()
+        image = job_data.get("image")
+        try:
+            digest = await self.image_cache.digest_async(image)
+            if digest is None:
+                # A tag that is not local yet has no digest: pull it now (the run would anyway)
+                await self.image_cache.acquire_async(image)
+                try:
+                    digest = await self.image_cache.digest_async(image)
+                finally:
+                    self.image_cache.release(image)
+            if digest is None:
+                self._enqueue(job_data)
+                return
+            key = result_key(digest, job_data.get("cmd"))
+
+            while True:
+                cached = await self.result_cache.get_async(key)
+                if cached is not None:
+                    self._report_cached(job_data, cached, "hit", started)
+                    return
+                original = self._in_flight.get(key)
+                if original is None:
+                    break
+                logger.info(f"Job {job_id} duplicates a job in flight. Waiting for its result.")
+                report = await asyncio.shield(original)
+                if report is None or report["status"] != "DONE":
+                    continue # It failed; run this one unless another duplicate already is
+                cached = await self.result_cache.get_async(key)
+                if cached is not None:
+                    self._report_cached(job_data, cached, "coalesced", started)
+                    return
+
+            self._in_flight[key] = asyncio.get_running_loop().create_future()
+            self._result_keys[job_id] = key
+        except Exception as e:
+            logger.warning(f"Result cache lookup failed for job {job_id}: {e}")
+        self._enqueue(job_data)
+
+    def _report_cached(self, job_data: Dict[str, Any], cached: Dict[str, Any], how: str, started: float):
+        """Reports a job answered from the result cache, without placing it."""
+        job_id = str(job_data.get("job_id"))
+        output = cached.get("output", "")
+        logger.info(f"[$] Job {job_id} served from result cache ({how}): {output[:50]}...")
+        report = {"job_id": job_data.get("job_id"), "gpus": [], "status": "DONE", "result_cache": how,
+                  "output_bytes": len(output.encode())}
+        if self.log_dir:
+            os.makedirs(self.log_dir, exist_ok=True)
+            report["log_file"] = os.path.join(self.log_dir, f"{job_id}.log.gz")
+            with gzip.open(report["log_file"], "wt") as f:
+                f.write(output)
+        report["duration"] = round(time.time() - started, 2)
+        self._finish(job_id, report)
+
+    def _finish(self, job_id: str, report: Optional[Dict[str, Any]]):
+        """Records a job's final report and releases duplicates waiting on it."""
+        if report is not None:
+            self.reports.append(report)
+        self.active.discard(job_id)
+        if self.admission is not None:
+            self.admission.forget(job_id)
+        key = self._result_keys.pop(job_id, None)
+        if key is not None:
+            original = self._in_flight.pop(key, None)
+            if original is not None and not original.done():
+                original.set_result(report)
+
+    async def dispatch(self):
+        """Starts every queued job that can be placed on the current inventory."""
+        if not self.pending:
+            return
+        gpus = await self.inventory()
+        if self.admission is not None:
+            # Locating the miner walks the process table, so keep it off the event loop
+            await asyncio.get_running_loop().run_in_executor(None, self.admission.refresh)
+
+        for job_data in list(self.pending):
+            job_id = str(job_data.get("job_id"))
+            gpu_count, min_memory_mb = job_requirements(job_data)
+
+            if gpu_count != 0 and not gpus:
+                # An empty inventory is more likely a failed poll than a node without GPUs
+                self._schedule_retry(INVENTORY_RETRY)
+                continue
+            if gpu_count > len(gpus) or min_memory_mb > max(g.get("memory_total", 0) for g in gpus or [{}]):
+                reason = f"needs {gpu_count} GPU(s) with {min_memory_mb} MB; node has {len(gpus)}"
+                logger.error(f"Job {job_id} can never fit on this node ({reason}). Rejecting.")
+                self.pending.remove(job_data)
+                self.delayed.pop(job_id, None)
+                self._finish(job_id, {"job_id": job_data.get("job_id"), "gpus": [], "status": "REJECTED",
+                                      "reason": reason})
+                continue
+
+            decision = None
+            if self.admission is None:
+                uuids = place(gpus, self.allocated, gpu_count, min_memory_mb)
+                if uuids is None:
+                    continue
+            else:
+                by_uuid = {g["uuid"]: g for g in gpus}
+                blocked = self.admission.unready(job_data, [g for g in gpus if g["uuid"] not in self.allocated])
+                uuids = place(gpus, {**self.allocated, **blocked}, gpu_count, min_memory_mb)
+                if uuids is None:
+                    # Only the admission controller's business if the job would otherwise fit
+                    held = place(gpus, self.allocated, gpu_count, min_memory_mb)
+                    if held is None:
+                        # Waiting for capacity, not for admission
+                        self.delayed.pop(job_id, None)
+                        self.admission.forget(job_id)
+                        continue
+                    decision = self.admission.decide(job_data, [by_uuid[u] for u in held],
+                                                     {u: blocked[u] for u in held if u in blocked})
+                else:
+                    decision = self.admission.decide(job_data, [by_uuid[u] for u in uuids])
+
+                if decision["decision"] == "delay":
+                    if job_id not in self.delayed:
+                        logger.info(f"Job {job_id} delayed: {decision['reason']}")
+                    self.delayed[job_id] = decision
+                    self._schedule_retry(decision["retry_after"])
+                    continue
+                self.delayed.pop(job_id, None)
+                if decision["decision"] == "reject":
+                    logger.warning(f"Job {job_id} rejected: {decision['reason']}")
+                    self.pending.remove(job_data)
+                    self._finish(job_id, {"job_id": job_data.get("job_id"), "gpus": [], "status": "REJECTED",
+                                          "admission": decision})
+                    continue
+
+            self.pending.remove(job_data)
+            for uuid in uuids:
+                self.allocated[uuid] = job_id
+            task = asyncio.create_task(self._execute(job_data, uuids, decision))
+            self.running[job_id] = task
+
+    async def _execute(self, job_data: Dict[str, Any], uuids: List[str], decision: Optional[Dict[str, Any]] = None):
+        job_id = str(job_data.get("job_id"))
+        image = job_data.get("image")
+        logger.warning(f"[!] PRIORITY JOB RECEIVED: {job_id} -> {uuids or 'CPU'}")
+        report = {"job_id": job_data.get("job_id"), "gpus": uuids, "cache_hit": None, "status": "FAILED"}
+        if decision is not None:
+            report["admission"] = decision
+        started = time.time()
+        loop = asyncio.get_running_loop()
+
+        # Pull before pausing the miner so image download is not paid for in paused time
+        acquired = False
+        if self.image_cache is not None:
+            try:
+                report["cache_hit"] = await self.image_cache.acquire_async(image)
+                acquired = True
+            except Exception as e:
+                logger.warning(f"Image cache unavailable for {image}: {e}")
+
+        spool_path = None
+        if self.log_dir:
+            os.makedirs(self.log_dir, exist_ok=True)
+            spool_path = os.path.join(self.log_dir, f"{job_id}.log.gz")
+            report["log_file"] = spool_path
+        capture = container_manager.LogCapture(head_bytes=self.log_head_bytes, tail_bytes=self.log_tail_bytes,
+                                               spool_path=spool_path)
+        self.captures[job_id] = capture
+
+        try:
+            # CPU-only jobs leave the miner alone (an empty list would mean every miner).
+            # Miner discovery walks the process table, so keep it off the event loop
+            if uuids:
+                await loop.run_in_executor(None, self.miner_ctrl.pause, uuids)
+            logger.info(f"[*] Starting Container: {image}...")
+            if self.warm_pool is not None and job_data.get("warm"):
+                run = self.warm_pool.run_async
+                report["warm"] = True
+            else:
+                run = self.run_container or container_manager.run_container_async
+            logs = await run(image, job_data.get("cmd"), use_gpu=bool(uuids), device_ids=uuids, log_capture=capture)
+            logger.info(f"[$] Job Output: {logs[:50]}...")
+            report["exit_code"] = capture.exit_code
+            if capture.exit_code != 0:
+                logger.warning(f"[X] Job {job_id} failed (exit code {capture.exit_code})")
+            elif not logs.startswith(("ERROR:", "TIMEOUT_ERROR:", "EXECUTION_ERROR:")):
+                # Only a clean exit is a result worth caching
+                report["status"] = "DONE"
+                if job_id in self._result_keys:
+                    try:
+                        await self.result_cache.put_async(self._result_keys[job_id], logs, image=image, cmd=job_data.get("cmd"))
+                        report["result_cache"] = "stored"
+                    except Exception as e:
+                        logger.warning(f"Could not store the result of job {job_id}: {e}")
+        except Exception as e:
+            logger.error(f"[X] Job Failed: {e}")
+        finally:
+            if uuids:
+                await loop.run_in_executor(None, self.miner_ctrl.resume, uuids)
+            if acquired:
+                self.image_cache.release(image)
+            for uuid in uuids:
+                self.allocated.pop(uuid, None)
+            self.running.pop(job_id, None)
+            capture.close()
+            self.captures.pop(job_id, None)
+            report["output_bytes"] = capture.total_bytes
+            report["duration"] = round(time.time() - started, 2)
+            metrics.observe("job_duration_seconds", time.time() - started, status=report["status"])
+            self._finish(job_id, report)
+            self._wake()
+
+    async def run(self):
+        """Dispatch loop: re-plans whenever a job is queued or finishes."""
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                await self.dispatch()
+            except Exception as e:
+                logger.error(f"Dispatch failed: {e}")
@@ -0,0 +1,519 @@
+"""
+Fleet simulator for load testing the node agent without GPUs.
+
+    python simulator.py --nodes 500 --devices 8 --duration 30
+    python simulator.py --profiles profiles.json --latency-ms 2 --failure-rate 0.01
+
+Spins up many in-process agents (NVML session + telemetry sampler + heartbeat
+channel) against a local heartbeat stand-in and reports agent CPU and memory per node.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+
+import hardware
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - SIMULATOR - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Matches the MockNVML defaults: RTX 3090 on a x1 mining riser
+DEFAULT_PROFILE = {
+    "name": "NVIDIA GeForce RTX 3090",
+    "memory_total_mb": 24576,
+    "memory_used_mb": 4576,
+    "pcie_gen": 1,
+    "pcie_width": 1,
+    "pcie_gen_max": 4,
+    "pcie_width_max": 16,
+    "temp_idle": 45,
+    "temp_load": 78,
+    "count": 1
+}
+
+class SimulatedNVMLError(Exception):
+    """Injected NVML failure."""
+
+def load_profiles(path: str) -> List[Dict[str, Any]]:
+    """
+    Loads device profiles from a JSON file: a list of objects using the keys of
+    DEFAULT_PROFILE (missing keys take the defaults). "count" repeats a profile.
+    """
+    with open(path) as f:
+        raw = json.load(f)
+    return [dict(DEFAULT_PROFILE, **profile) for profile in raw]
+
+class FleetNVML(hardware.MockNVML):
+    """
+    Configurable MockNVML: any number of devices built from profiles, with
+    time-varying temperature and memory use, plus optional per-call latency
+    and failure injection. Pass an instance to hardware.NVMLSession(nvml=...).
+    With static=True values are constant, for deterministic benchmarks.
+    """
+
+    def __init__(self, device_count: Optional[int] = None, profiles: Optional[List[Dict[str, Any]]] = None,
+                 latency_ms: float = 0, failure_rate: float = 0, static: bool = False,
+                 period: float = 60, seed: Optional[int] = None, driver_version: str = "535.104"):
+        profiles = profiles or [DEFAULT_PROFILE]
+        devices = [p for p in profiles for _ in range(p.get("count", 1))]
+        if device_count is not None:
+            # Cycle the profiles to reach the requested count
+            devices = [devices[i % len(devices)] for i in range(device_count)]
+        self.devices = devices
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.static = static
+        self.period = period
+        self.driver_version = driver_version
+        self._rng = random.Random(seed)
+        self._phase = [self._rng.uniform(0, 2 * math.pi) for _ in devices]
+        self._memory = [float(p["memory_used_mb"]) for p in devices]
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _call(self):
+        """Applies injected latency and failures to an NVML call."""
+        if self.latency_ms:
+            time.sleep(self._rng.expovariate(1 / self.latency_ms) / 1000)
+        if self.failure_rate and self._rng.random() < self.failure_rate:
+            raise SimulatedNVMLError("Simulated NVML failure")
+
+    def _device(self, handle) -> int:
+        index = int(str(handle).rsplit("_", 1)[-1])
+        if not 0 <= index < len(self.devices):
+            raise Exception("Invalid device index")
+        return index
+
+    def nvmlInit(self):
+        self._call()
+
+    def nvmlShutdown(self):
+        return
+
+    def nvmlDeviceGetCount(self):
+        self._call()
+        return len(self.devices)
+
+    def nvmlDeviceGetHandleByIndex(self, index):
+        self._call()
+        if not 0 <= index < len(self.devices):
+            raise Exception("Invalid device index")
+        return f"SimHandle_{index}"
+
+    def nvmlDeviceGetName(self, handle):
+        self._call()
+        return self.devices[self._device(handle)]["name"]
+
+    def nvmlDeviceGetUUID(self, handle):
+        self._call()
+        return f"GPU-SIM-{id(self) & 0xffffff:06x}-{self._device(handle):04d}"
+
+    def nvmlDeviceGetPciInfo(self, handle):
+        self._call()
+        bus_id = f"0000:{self._device(handle) + 1:02x}:00.0".encode()
+
+        class SimPciInfo:
+            busId = bus_id
+        return SimPciInfo()
+
+    def nvmlDeviceGetMemoryInfo(self, handle):
+        self._call()
+        index = self._device(handle)
+        total_mb = self.devices[index]["memory_total_mb"]
+        if not self.static:
+            with self._lock:
+                # Bounded random walk
+                step = self._rng.gauss(0, total_mb * 0.01)
+                self._memory[index] = min(max(self._memory[index] + step, 0), total_mb)
+        used_mb = self._memory[index]
+
+        class SimMemory:
+            total = total_mb * 1024 * 1024
+            used = int(used_mb * 1024 * 1024)
+            free = total - used
+        return SimMemory()
+
+    def nvmlDeviceGetPcieLinkWidth(self, handle):
+        self._call()
+        return self.devices[self._device(handle)]["pcie_width"]
+
+    def nvmlDeviceGetMaxPcieLinkWidth(self, handle):
+        self._call()
+        return self.devices[self._device(handle)]["pcie_width_max"]
+
+    def nvmlDeviceGetCurrPcieLinkGeneration(self, handle):
+        self._call()
+        return self.devices[self._device(handle)]["pcie_gen"]
+
+    def nvmlDeviceGetMaxPcieLinkGeneration(self, handle):
+        self._call()
+        return self.devices[self._device(handle)]["pcie_gen_max"]
+
+    def nvmlSystemGetDriverVersion(self):
+        self._call()
+        return self.driver_version
+
+    def nvmlDeviceGetTemperature(self, handle, sensor_type):
+        self._call()
+        index = self._device(handle)
+        profile = self.devices[index]
+        if self.static:
+            return profile["temp_idle"]
+        # Slow load cycle plus sensor noise
+        t = time.monotonic() - self._started
+        load = 0.5 + 0.5 * math.sin(2 * math.pi * t / self.period + self._phase[index])
+        noise = self._rng.gauss(0, 0.5)
+        return int(profile["temp_idle"] + (profile["temp_load"] - profile["temp_idle"]) * load + noise)
+
+def build_sysfs(root: str, bus_ids: List[str], nodes: int = 2, cpus_per_node: int = 8) -> str:
+    """
+    Writes a minimal sysfs tree under root for hardware.NVMLSession(sysfs_root=root):
+    node online/cpulist files plus numa_node and local_cpulist for each PCI
+    device. Devices are split across nodes in order, like GPUs on a dual-socket
+    board (first half on node 0). Returns root.
+    """
+    node_dir = os.path.join(root, "devices", "system", "node")
+    os.makedirs(node_dir, exist_ok=True)
+    with open(os.path.join(node_dir, "online"), "w") as f:
+        f.write(hardware.format_cpulist(range(nodes)) + "\n")
+    for node in range(nodes):
+        os.makedirs(os.path.join(node_dir, f"node{node}"), exist_ok=True)
+        with open(os.path.join(node_dir, f"node{node}", "cpulist"), "w") as f:
+            f.write(f"{node * cpus_per_node}-{(node + 1) * cpus_per_node - 1}\n")
+
+    per_node = max(1, math.ceil(len(bus_ids) / nodes))
+    for i, bus_id in enumerate(bus_ids):
+        node = min(i // per_node, nodes - 1)
+        device_dir = os.path.join(root, "bus", "pci", "devices", bus_id.lower())
+        os.makedirs(device_dir, exist_ok=True)
+        with open(os.path.join(device_dir, "numa_node"), "w") as f:
+            f.write(f"{node}\n")
+        with open(os.path.join(device_dir, "local_cpulist"), "w") as f:
+            f.write(f"{node * cpus_per_node}-{(node + 1) * cpus_per_node - 1}\n")
+    return root
+
+# --- Fake Docker Engine API ---
+
+class FakeDockerAPI:
+    """
+    In-process stand-in for the Docker Engine API on a unix socket, covering
+    what container_manager.AsyncDocker uses. Every image is present; each
+    container prints its command line output_lines times over run_seconds and
+    exits with code 0 (or as soon as it is killed).
+
+        fake = FakeDockerAPI(run_seconds=0.05)
+        host = await fake.start(path)   # "unix://<path>"
+        ...
+        await fake.stop()
+    """
+
+    API_VERSION = "1.43"
+
+    def __init__(self, run_seconds: float = 0.05, output_lines: int = 3):
+        self.run_seconds = run_seconds
+        self.output_lines = output_lines
+        self.containers: Dict[str, Dict[str, Any]] = {}
+        self.counters = {"created": 0, "removed": 0, "killed": 0, "requests": 0}
+        self._runner = None
+
+    async def start(self, path: str) -> str:
+        from aiohttp import web
+
+        @web.middleware
+        async def count(request, handler):
+            self.counters["requests"] += 1
+            return await handler(request)
+
+        app = web.Application(middlewares=[count])
+        app.router.add_get("/_ping", self._ping)
+        app.router.add_get("/version", self._version)
+        app.router.add_get("/{version}/_ping", self._ping)
+        app.router.add_get("/{version}/images/{name:.+}/json", self._image)
+        app.router.add_post("/{version}/images/create", self._pull)
+        app.router.add_post("/{version}/containers/create", self._create)
+        app.router.add_post("/{version}/containers/{id}/start", self._start)
+        app.router.add_post("/{version}/containers/{id}/wait", self._wait)
+        app.router.add_get("/{version}/containers/{id}/logs", self._logs)
+        app.router.add_post("/{version}/containers/{id}/kill", self._kill)
+        app.router.add_delete("/{version}/containers/{id}", self._remove)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.UnixSite(self._runner, path).start()
+        return f"unix://{path}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def _container(self, request):
+        from aiohttp import web
+        container = self.containers.get(request.match_info["id"])
+        if container is None:
+            raise web.HTTPNotFound(text="No such container")
+        return container
+
+    async def _ping(self, request):
+        from aiohttp import web
+        return web.Response(text="OK")
+
+    async def _version(self, request):
+        from aiohttp import web
+        return web.json_response({"ApiVersion": self.API_VERSION})
+
+    async def _image(self, request):
+        from aiohttp import web
+        return web.json_response({"Id": "sha256:fake", "Size": 0})
+
+    async def _pull(self, request):
+        from aiohttp import web
+        return web.Response(text=json.dumps({"status": "Downloaded"}) + "\n", content_type="application/json")
+
+    async def _create(self, request):
+        from aiohttp import web
+        config = await request.json()
+        container_id = f"{random.getrandbits(64):016x}"
+        self.containers[container_id] = {"config": config, "exited": asyncio.Event(), "output": asyncio.Queue()}
+        self.counters["created"] += 1
+        return web.json_response({"Id": container_id}, status=201)
+
+    async def _start(self, request):
+        from aiohttp import web
+        container = self._container(request)
+        container["task"] = asyncio.create_task(self._execute(container))
+        return web.Response(status=204)
+
+    async def _execute(self, container):
+        line = (" ".join(container["config"].get("Cmd") or []) + "\n").encode()
+        try:
+            for _ in range(self.output_lines):
+                container["output"].put_nowait(line)
+                await asyncio.sleep(self.run_seconds / max(self.output_lines, 1))
+        finally:
+            container["exited"].set()
+            container["output"].put_nowait(None)
+
+    async def _wait(self, request):
+        from aiohttp import web
+        container = self._container(request)
+        await container["exited"].wait()
+        return web.json_response({"StatusCode": 137 if container.get("killed") else 0})
+
+    async def _logs(self, request):
+        from aiohttp import web
+        container = self._container(request)
+        response = web.StreamResponse(headers={"Content-Type": "application/vnd.docker.multiplexed-stream"})
+        await response.prepare(request)
+        while True:
+            chunk = await container["output"].get()
+            if chunk is None:
+                break
+            # Multiplexed frame: stream type 1 (stdout), 3 pad bytes, big-endian length
+            await response.write(bytes([1, 0, 0, 0]) + len(chunk).to_bytes(4, "big") + chunk)
+        await response.write_eof()
+        return response
+
+    async def _kill(self, request):
+        from aiohttp import web
+        container = self._container(request)
+        container["killed"] = True
+        if "task" in container:
+            container["task"].cancel()
+        self.counters["killed"] += 1
+        return web.Response(status=204)
+
+    async def _remove(self, request):
+        from aiohttp import web
+        container = self._container(request)
+        if "task" in container:
+            container["task"].cancel()
+        del self.containers[request.match_info["id"]]
+        self.counters["removed"] += 1
+        return web.Response(status=204)
+
+# --- Fleet driver ---
+
+async def _start_standin(push: bool, fault_rate: float = 0, delay_ms: float = 0, encoding: str = "json"):
+    """
+    Local heartbeat stand-in. Returns (runner, base_url, counters).
+    fault_rate is the fraction of heartbeat requests answered with HTTP 503;
+    delay_ms adds mean (exponential) server latency to every request.
+    encoding (json, msgpack or cbor) is the server's preferred response type,
+    used when the agent advertises it.
+    """
+    from aiohttp import web
+    import transport
+
+    content_type = {"json": transport.JSON, "msgpack": "application/msgpack", "cbor": "application/cbor"}[encoding]
+    encode = transport.available_codecs()[content_type][0]
+
+    counters = {"beats": 0, "bytes": 0, "requests": 0, "faults": 0}
+
+    async def heartbeat(request):
+        body = await request.read()
+        counters["requests"] += 1
+        if delay_ms:
+            await asyncio.sleep(random.expovariate(1 / delay_ms) / 1000)
+        if fault_rate and random.random() < fault_rate:
+            counters["faults"] += 1
+            return web.Response(status=503, text="Injected fault")
+        counters["beats"] += 1
+        counters["bytes"] += len(body)
+        if content_type in request.headers.get("Accept", ""):
+            return web.Response(body=encode({"command": "IDLE"}), content_type=content_type)
+        return web.json_response({"command": "IDLE"})
+
+    async def ws_handler(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        async for msg in ws:
+            counters["beats"] += 1
+            counters["bytes"] += len(msg.data)
+            await ws.send_json({"command": "IDLE"})
+        return ws
+
+    app = web.Application()
+    app.router.add_post("/heartbeat", heartbeat)
+    if push:
+        app.router.add_get("/ws", ws_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}", counters
+
+async def run_fleet(nodes: int, duration: float, devices: int = 8, profiles=None, latency_ms: float = 0,
+                    failure_rate: float = 0, beat_interval: float = 5, sample_interval: float = 1,
+                    push: bool = False, url: Optional[str] = None, nvml_threads: int = 4,
+                    server_fault_rate: float = 0, server_delay_ms: float = 0,
+                    server_encoding: str = "json") -> Dict[str, Any]:
+    """
+    Runs `nodes` simulated agents for `duration` seconds and returns resource usage.
+    Each agent has its own NVML session, telemetry sampler and heartbeat channel;
+    all of them share one aiohttp session, event loop and NVML thread pool.
+    server_fault_rate / server_delay_ms inject faults into the local stand-in;
+    server_encoding picks the body encoding it negotiates.
+    """
+    import aiohttp
+    import telemetry
+    import transport
+
+    runner, counters = None, {"beats": 0, "bytes": 0, "requests": 0, "faults": 0}
+    if url is None:
+        runner, url, counters = await _start_standin(push, server_fault_rate, server_delay_ms, server_encoding)
+    ws_url = url.replace("http", "ws", 1) + "/ws" if push else None
+
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=nvml_threads, thread_name_prefix="sim-nvml")
+
+    tracemalloc.start()
+    cpu_started = time.process_time()
+    wall_started = time.monotonic()
+
+    tasks = []
+    samplers = []
+    channels = []
+    try:
+        connector = aiohttp.TCPConnector(limit=0)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            for n in range(nodes):
+                nvml_session = hardware.NVMLSession(nvml=FleetNVML(devices, profiles, latency_ms, failure_rate))
+
+                async def scan(s=nvml_session):
+                    return await loop.run_in_executor(executor, s.poll)
+
+                sampler = telemetry.TelemetrySampler(scan, interval=sample_interval, history=120)
+                report = telemetry.DeviceReport()
+
+                # Same shape as main.build_heartbeat
+                async def build_payload(sampler=sampler, scan=scan, report=report):
+                    gpus = sampler.latest or await scan()
+                    primary = gpus[0] if gpus else {}
+                    return {"node_id": primary.get("uuid", "UNKNOWN"), "status": "IDLE",
+                            "gpu_temp": primary.get("temperature", 0), **report.payload(gpus),
+                            "telemetry": sampler.heartbeat_payload()}
+
+                def on_command(data, sampler=sampler, report=report):
+                    sampler.ack()
+                    report.ack(resend=bool(data.get("resend_inventory")))
+
+                channel = transport.JobChannel(session, f"{url}/heartbeat", build_payload, on_command,
+                                               ws_url=ws_url, beat_interval=beat_interval)
+                samplers.append(sampler)
+                channels.append(channel)
+                sampler.start()
+                tasks.append(asyncio.create_task(channel.run()))
+                # Stagger starts like a real fleet
+                await asyncio.sleep(beat_interval / max(nodes, 1) / 10)
+
+            await asyncio.sleep(duration)
+    finally:
+        for task in tasks:
+            task.cancel()
+        for sampler in samplers:
+            sampler.stop()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        cpu_used = time.process_time() - cpu_started
+        wall = time.monotonic() - wall_started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        executor.shutdown(wait=False)
+        if runner is not None:
+            await runner.cleanup()
+
+    transport_totals = {key: sum(c.transport.counters[key] for c in channels)
+                        for key in ("retries", "failures", "rejected_by_breaker", "budget_exhausted")}
+    # The stand-in shares this process, so its cost is included in the totals
+    return {
+        "nodes": nodes,
+        "devices_per_node": devices,
+        "duration_s": round(wall, 2),
+        "cpu_s": round(cpu_used, 3),
+        "cpu_ms_per_node_per_s": round(cpu_used * 1000 / nodes / wall, 4),
+        "peak_mem_kb_per_node": round(peak / 1024 / nodes, 2),
+        "beats": counters["beats"],
+        "server_requests": counters["requests"],
+        "server_faults": counters["faults"],
+        "breaker_trips": sum(c.transport.breaker.trips for c in channels),
+        **transport_totals,
+        "mean_beat_bytes": round(counters["bytes"] / counters["beats"], 1) if counters["beats"] else 0
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulated GPU fleet load test")
+    parser.add_argument("--nodes", type=int, default=100)
+    parser.add_argument("--devices", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--profiles", help="JSON file of device profiles")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Mean injected latency per NVML call")
+    parser.add_argument("--failure-rate", type=float, default=0, help="Probability an NVML call fails")
+    parser.add_argument("--beat-interval", type=float, default=5)
+    parser.add_argument("--sample-interval", type=float, default=1)
+    parser.add_argument("--push", action="store_true", help="Use the WebSocket push channel")
+    parser.add_argument("--url", help="Existing heartbeat server base URL (default: local stand-in)")
+    parser.add_argument("--server-fault-rate", type=float, default=0, help="Fraction of stand-in responses that are HTTP 503")
+    parser.add_argument("--server-delay-ms", type=float, default=0, help="Mean injected stand-in latency")
+    parser.add_argument("--server-encoding", choices=("json", "msgpack", "cbor"), default="json",
+                        help="Body encoding the stand-in negotiates")
+    args = parser.parse_args(argv)
+
+    # Per-agent logging would dominate the measurement
+    logging.disable(logging.WARNING)
+    profiles = load_profiles(args.profiles) if args.profiles else None
+    result = asyncio.run(run_fleet(args.nodes, args.duration, args.devices, profiles, args.latency_ms,
+                                   args.failure_rate, args.beat_interval, args.sample_interval, args.push, args.url,
+                                   server_fault_rate=args.server_fault_rate, server_delay_ms=args.server_delay_ms,
+                                   server_encoding=args.server_encoding))
+    print(json.dumps(result, indent=4))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import asyncio
+import hashlib
+import json
+import logging
+import math
+from array import array
+from typing import List, Dict, Any, Callable, Awaitable, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - TELEMETRY - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Per-device fields recorded on every sample
+SAMPLED_FIELDS = ("temperature", "memory_used", "pcie_width_current", "pcie_gen_current")
+# Per-device fields that only change with the inventory (hot-plug, driver reload)
+STATIC_FIELDS = ("index", "name", "uuid", "pci_bus_id", "memory_total", "pcie_gen_max", "pcie_width_max", "driver_version",
+                 "numa_node", "local_cpus")
+
+def inventory_hash(gpus: List[Dict[str, Any]]) -> str:
+    """Short stable hash of the static fields of every device."""
+    static = [[gpu.get(field) for field in STATIC_FIELDS] for gpu in gpus]
+    return hashlib.sha1(json.dumps(static, default=str).encode()).hexdigest()[:16]
+
+class DeviceReport:
+    """
+    Heartbeat section covering every device.
+
+    Each beat carries the current readings of all devices as rows (in inventory
+    order, columns as in SAMPLED_FIELDS) plus the inventory hash. The static
+    inventory itself is only included until a beat carrying the current hash
+    has been acknowledged, or when the server asks for it again.
+    """
+
+    def __init__(self):
+        self._acked_hash: Optional[str] = None
+        self._pending_hash: Optional[str] = None
+
+    def payload(self, gpus: List[Dict[str, Any]]) -> Dict[str, Any]:
+        digest = inventory_hash(gpus)
+        self._pending_hash = digest
+        payload = {
+            "inventory_hash": digest,
+            "devices": [[gpu.get(field, -1) for field in SAMPLED_FIELDS] for gpu in gpus]
+        }
+        if digest != self._acked_hash:
+            payload["inventory"] = [{field: gpu.get(field) for field in STATIC_FIELDS} for gpu in gpus]
+            payload["device_fields"] = list(SAMPLED_FIELDS)
+        return payload
+
+    def ack(self, resend: bool = False):
+        """Marks the last payload as delivered; resend=True forces the inventory into the next beat."""
+        self._acked_hash = None if resend else self._pending_hash
+
+class RingBuffer:
+    """
+    Fixed-size, array-backed ring buffer of floats.
+    Memory use is constant regardless of how long the sampler runs.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._data = array('d', bytes(8 * size))
+        self._head = 0 # Next write position
+        self.count = 0
+
+    def append(self, value: float):
+        self._data[self._head] = value
+        self._head = (self._head + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+
+    def values(self) -> List[float]:
+        """Returns the buffered samples, oldest first."""
+        if self.count < self.size:
+            return self._data[:self.count].tolist()
+        return self._data[self._head:].tolist() + self._data[:self._head].tolist()
+
+    def last(self) -> Optional[float]:
+        if not self.count:
+            return None
+        return self._data[self._head - 1]
+
+    def aggregate(self) -> Dict[str, float]:
+        """Returns min/max/mean/p95 over the buffered window."""
+        values = sorted(self.values())
+        if not values:
+            return {}
+        # Nearest-rank percentile
+        p95 = values[max(0, math.ceil(0.95 * len(values)) - 1)]
+        return {
+            "min": round(values[0], 1),
+            "max": round(values[-1], 1),
+            "mean": round(sum(values) / len(values), 1),
+            "p95": round(p95, 1)
+        }
+
+class TelemetrySampler:
+    """
+    Background sampler that records per-device time series into ring buffers.
+
+    Heartbeats carry per-device aggregates, delta-encoded against the last
+    acknowledged beat: call heartbeat_payload() when building a beat and ack()
+    once the server has accepted it. Unacknowledged changes are resent.
+    """
+
+    def __init__(self, scan: Callable[[], Awaitable[List[Dict[str, Any]]]],
+                 interval: float = 1.0, history: int = 300):
+        self.scan = scan
+        self.interval = interval
+        self.history = history
+        self.latest: List[Dict[str, Any]] = []
+        self._series: Dict[str, Dict[str, RingBuffer]] = {}
+        self._acked: Dict[str, Dict[str, Any]] = {}
+        self._pending: Optional[Dict[str, Dict[str, Any]]] = None
+        self._task = None
+
+    def record(self, gpus: List[Dict[str, Any]]):
+        """Appends one sample per device."""
+        self.latest = gpus
+        for gpu in gpus:
+            uuid = gpu.get("uuid", "UNKNOWN")
+            series = self._series.get(uuid)
+            if series is None:
+                series = {field: RingBuffer(self.history) for field in SAMPLED_FIELDS}
+                self._series[uuid] = series
+            for field in SAMPLED_FIELDS:
+                series[field].append(gpu.get(field, -1))
+
+    def aggregates(self) -> Dict[str, Dict[str, Any]]:
+        """Returns {uuid: {field: {min, max, mean, p95}}} for every tracked device."""
+        return {
+            uuid: {field: buf.aggregate() for field, buf in series.items() if buf.count}
+            for uuid, series in self._series.items()
+        }
+
+    def trend(self, uuid: str, field: str = "temperature", window: float = 60) -> float:
+        """
+        Least-squares slope of a field over the last `window` seconds of samples,
+        in units per second. 0 when there are fewer than two samples.
+        """
+        series = self._series.get(uuid)
+        if series is None:
+            return 0.0
+        values = series[field].values()[-max(2, int(window / self.interval)):]
+        n = len(values)
+        if n < 2:
+            return 0.0
+        mean_x = (n - 1) / 2
+        mean_y = sum(values) / n
+        covariance = sum((x - mean_x) * (y - mean_y) for x, y in enumerate(values))
+        variance = sum((x - mean_x) ** 2 for x in range(n))
+        return covariance / variance / self.interval
+
+    def heartbeat_payload(self) -> Dict[str, Dict[str, Any]]:
+        """Returns only the per-device fields that changed since the last acknowledged beat."""
+        current = self.aggregates()
+        self._pending = current
+
+        delta = {}
+        for uuid, fields in current.items():
+            acked = self._acked.get(uuid, {})
+            changed = {field: agg for field, agg in fields.items() if acked.get(field) != agg}
+            if changed:
+                delta[uuid] = changed
+        return delta
+
+    def ack(self):
+        """Marks the last payload as delivered."""
+        if self._pending is not None:
+            self._acked = self._pending
+            self._pending = None
+
+    async def run(self):
+        """Samples forever at the configured interval."""
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            try:
+                self.record(await self.scan())
+            except Exception as e:
+                logger.warning(f"Telemetry sample failed: {e}")
+            await asyncio.sleep(max(0, self.interval - (loop.time() - started)))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+if __name__ == "__main__":
+    import hardware
+
+    async def _demo():
+        sampler = TelemetrySampler(hardware.scan_system_async, interval=0.1, history=16)
+        sampler.start()
+        await asyncio.sleep(1)
+        print("--- First Beat (full) ---")
+        print(json.dumps(sampler.heartbeat_payload(), indent=4))
+        sampler.ack()
+        print("--- Second Beat (delta) ---")
+        print(json.dumps(sampler.heartbeat_payload(), indent=4))
+        sampler.stop()
+
+    asyncio.run(_demo())
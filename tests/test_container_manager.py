@@ -0,0 +1,66 @@
+import asyncio
+import os
+
+import aiohttp
+
+import container_manager
+import simulator
+
+def test_split_reference():
+    split = container_manager.AsyncDocker.split_reference
+    assert split("alpine") == ("alpine", "latest")
+    assert split("alpine:3.19") == ("alpine", "3.19")
+    assert split("localhost:5000/team/job") == ("localhost:5000/team/job", "latest")
+    assert split("localhost:5000/team/job:v2") == ("localhost:5000/team/job", "v2")
+    assert split("team/job@sha256:" + "ab" * 32) == ("team/job", "sha256:" + "ab" * 32)
+
+def test_async_run_reports_client_errors(tmp_path):
+    async def scenario():
+        fake = simulator.FakeDockerAPI(run_seconds=0.01)
+        client = container_manager.AsyncDocker(await fake.start(os.path.join(tmp_path, "docker.sock")))
+        try:
+            capture = container_manager.LogCapture()
+            assert "echo ok" in await client.run("alpine", "echo ok", log_capture=capture)
+            assert capture.exit_code == 0
+
+            async def disconnected(*args, **kwargs):
+                raise aiohttp.ServerDisconnectedError()
+            client.create = disconnected
+            assert (await client.run("alpine", "echo ok")).startswith("ERROR: DOCKER_ENGINE_OFFLINE")
+        finally:
+            await client.close()
+            await fake.stop()
+    asyncio.run(scenario())
+
+class FakeContainer:
+    def __init__(self, reset_exit_code=0):
+        self.removed = False
+        self.reset_exit_code = reset_exit_code
+        self.execs = []
+
+    def exec_run(self, cmd):
+        self.execs.append(cmd)
+        return type("ExecResult", (), {"exit_code": self.reset_exit_code})()
+
+    def remove(self, force=False):
+        self.removed = True
+
+def checked_in(pool, container):
+    key = ("job:latest", True, ())
+    pool._total += 1
+    pool._checkin({"container": container, "key": key, "uses": 0, "idle_since": 0})
+    return pool._idle.get(key, [])
+
+def test_warm_pool_recycles_containers_without_reset_cmd():
+    container = FakeContainer()
+    assert checked_in(container_manager.WarmPool(), container) == []
+    assert container.removed and container.execs == []
+
+def test_warm_pool_reuses_containers_after_reset():
+    container = FakeContainer()
+    pool = container_manager.WarmPool(reset_cmd="rm -rf /tmp/job")
+    [entry] = checked_in(pool, container)
+    assert entry["container"] is container and not container.removed and container.execs == ["rm -rf /tmp/job"]
+
+    failing = FakeContainer(reset_exit_code=1)
+    assert len(checked_in(pool, failing)) == 1 and failing.removed
@@ -0,0 +1,19 @@
+import classifier
+import gpu_benchmark
+
+def test_cpu_only_benchmark_path(tmp_path):
+    gpu = {"uuid": "GPU-CPU-ONLY", "name": "none", "driver_version": "0", "pcie_width_current": 16,
+           "pcie_gen_current": 1, "pcie_gen_max": 4}
+    cache = gpu_benchmark.BenchmarkCache(path=str(tmp_path / "bandwidth_cache.json"))
+    gpu_benchmark.measure_all([gpu], cache=cache, use_docker=False)
+
+    entry = gpu_benchmark.BenchmarkCache(path=cache.path).get(gpu)
+    assert entry["mode"] == "cpu" and entry["h2d_gbps"] > 0 and entry["d2h_gbps"] > 0
+
+    # CPU results say nothing about the PCIe link: classification falls back to the link's max generation
+    [plain] = gpu_benchmark.annotate([gpu], cache=cache)
+    assert "h2d_gbps" not in plain
+    [row] = classifier.classify_gpus([plain], classifier.MEASURED_RULES)
+    assert row["classification_reason"] == "High Bandwidth (31.504 GB/s)"
+    [merged] = gpu_benchmark.annotate([gpu], cache=cache, include_cpu=True)
+    assert merged["benchmark_mode"] == "cpu" and merged["h2d_gbps"] == entry["h2d_gbps"]
@@ -0,0 +1,63 @@
+import hardware
+import simulator
+
+class FlakyInitNVML(simulator.FleetNVML):
+    """FleetNVML whose first nvmlInit fails."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.init_calls = 0
+
+    def nvmlInit(self):
+        self.init_calls += 1
+        if self.init_calls == 1:
+            raise simulator.SimulatedNVMLError("Driver not loaded")
+
+def test_transient_init_failure_retries_real_nvml(tmp_path):
+    nvml = FlakyInitNVML(4, static=True)
+    session = hardware.NVMLSession(nvml=nvml, sysfs_root=str(tmp_path))
+
+    first = session.poll()
+    assert session.using_mock and [gpu["uuid"] for gpu in first] == ["GPU-MOCK-UUID-1234-5678"]
+
+    second = session.poll()
+    assert not session.using_mock and nvml.init_calls == 2
+    assert len(second) == 4 and all(gpu["uuid"].startswith("GPU-SIM-") for gpu in second)
+    # Healthy sessions are kept, not re-initialized on every poll
+    session.poll()
+    assert nvml.init_calls == 2
+
+def numa_session(root, devices=4, nodes=2):
+    """Session over FleetNVML with a sysfs tree of `nodes` NUMA nodes (None = no sysfs NUMA data)."""
+    nvml = simulator.FleetNVML(devices, static=True)
+    bus_ids = [f"0000:{i + 1:02x}:00.0" for i in range(devices)]
+    if nodes is not None:
+        simulator.build_sysfs(root, bus_ids, nodes=nodes)
+    session = hardware.NVMLSession(nvml=nvml, sysfs_root=root)
+    return session, [gpu["uuid"] for gpu in session.poll()]
+
+def test_placement_single_node(tmp_path):
+    session, uuids = numa_session(str(tmp_path), nodes=1)
+    assert hardware.pci_topology("00000000:01:00.0", str(tmp_path)) == {"numa_node": 0, "local_cpus": "0-7"}
+    # Pinning to the only node restricts nothing
+    assert session.placement(uuids[:1]) == {}
+
+def test_placement_cross_node(tmp_path):
+    session, uuids = numa_session(str(tmp_path), devices=4, nodes=2)
+    assert [gpu["numa_node"] for gpu in session.inventory] == [0, 0, 1, 1]
+    assert hardware.pci_topology("00000000:04:00.0", str(tmp_path)) == {"numa_node": 1, "local_cpus": "8-15"}
+    assert session.placement(uuids[:2]) == {"cpuset_cpus": "0-7", "cpuset_mems": "0"}
+    assert session.placement(uuids[3:]) == {"cpuset_cpus": "8-15", "cpuset_mems": "1"}
+    # A job spanning both sockets is left unpinned
+    assert session.placement([uuids[0], uuids[3]]) == {}
+
+def test_placement_cross_node_subset_of_nodes(tmp_path):
+    session, uuids = numa_session(str(tmp_path), devices=4, nodes=4)
+    assert session.placement(uuids[:2]) == {"cpuset_cpus": "0-15", "cpuset_mems": "0-1"}
+
+def test_placement_without_numa(tmp_path):
+    session, uuids = numa_session(str(tmp_path), nodes=None)
+    assert hardware.pci_topology("00000000:01:00.0", str(tmp_path)) == {"numa_node": -1, "local_cpus": ""}
+    assert hardware.online_nodes(str(tmp_path)) == [0]
+    assert session.placement(uuids[:1]) == {}
+    assert session.placement(["GPU-UNKNOWN"]) == {}
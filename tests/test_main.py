@@ -0,0 +1,34 @@
+import asyncio
+
+import main
+
+class Acks:
+    """Counts acknowledgements in place of the sampler, device report and scheduler."""
+
+    def __init__(self):
+        self.count = 0
+
+    def ack(self, resend=False):
+        self.count += 1
+
+    ack_reports = ack
+
+def test_only_the_echo_of_the_latest_beat_acks(monkeypatch):
+    acks = Acks()
+    for name in ("sampler", "devices", "job_scheduler"):
+        monkeypatch.setattr(main, name, acks)
+    monkeypatch.setattr(main, "beat_seq", 5)
+    monkeypatch.setattr(main, "startup", dict(main.startup))
+
+    main.handle_command({"command": "IDLE"}) # Unsolicited push
+    main.handle_command({"command": "IDLE", "ack": 4}) # Answer to a superseded beat
+    assert acks.count == 0 and "first_heartbeat" not in main.startup
+    main.handle_command({"command": "IDLE", "ack": 5})
+    assert acks.count == 3 and "first_heartbeat" in main.startup
+
+def test_benchmark_skips_gpus_held_by_jobs(monkeypatch):
+    paused = []
+    monkeypatch.setattr(main.miner_ctrl, "pause", paused.append)
+    monkeypatch.setattr(main.job_scheduler, "allocated", {"GPU-0": "job-1"})
+    asyncio.run(main.benchmark_devices([{"uuid": "GPU-0"}, {"uuid": "GPU-1"}]))
+    assert paused == [] and main.job_scheduler.allocated == {"GPU-0": "job-1"}
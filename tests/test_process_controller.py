@@ -0,0 +1,80 @@
+import threading
+import time
+
+import pytest
+
+import bench
+import process_controller
+
+def test_refresh_notices_exec_and_pid_reuse(monkeypatch):
+    fake = bench.FakePsutil(50)
+    monkeypatch.setattr(process_controller, "psutil", fake)
+    miner_pid = max(fake.table)
+    del fake.table[miner_pid]
+    fake.table[100] = {"name": "bash", "cmdline": ["bash", "run.sh"], "create_time": 2000.0}
+    fake.table[101] = {"name": "sleep", "cmdline": ["sleep", "60"], "create_time": 2001.0}
+
+    controller = process_controller.MinerController()
+    assert controller.refresh(full=True) == []
+
+    # The wrapper exec's into the miner: same PID and create_time, new name
+    fake.table[100] = {"name": "t-rex", "cmdline": ["t-rex", "-a", "kawpow"], "create_time": 2000.0}
+    # PID 101 exits and is reused by another miner
+    fake.table[101] = {"name": "lolminer", "cmdline": ["lolminer"], "create_time": 2100.0}
+    assert controller.refresh() == [100, 101]
+    assert controller.miners[100][1] == "t-rex" and controller.miners[101][1] == "lolminer"
+
+class SlowStrategy(process_controller.ThrottleStrategy):
+    """Engage and settle block until the test lets them go."""
+    name = "slow"
+    settles = True
+
+    def __init__(self):
+        self.engaging = threading.Event()
+        self.proceed = threading.Event()
+        self.settled = threading.Event()
+
+    def engage(self, pid, tree):
+        self.engaging.set()
+        assert self.proceed.wait(5)
+
+    def release(self, pid, tree):
+        pass
+
+    def settle(self, pid):
+        assert self.proceed.wait(5)
+        self.settled.set()
+        return {"restart_cost_s": 1.0}
+
+def test_strategy_work_runs_outside_the_controller_lock(monkeypatch):
+    fake = bench.FakePsutil(10)
+    monkeypatch.setattr(process_controller, "psutil", fake)
+    strategy = SlowStrategy()
+    controller = process_controller.MinerController(strategy=strategy)
+
+    pausing = threading.Thread(target=controller.pause)
+    pausing.start()
+    assert strategy.engaging.wait(5)
+    # The controller stays usable while the miner is being throttled
+    assert controller._lock.acquire(timeout=1)
+    controller._lock.release()
+    assert controller.handover_stats() == {}
+    strategy.proceed.set()
+    pausing.join(5)
+    assert controller._paused
+
+    strategy.proceed.clear()
+    controller.resume() # Returns without waiting for settle()
+    assert not controller._paused and not strategy.settled.is_set()
+    strategy.proceed.set()
+    assert strategy.settled.wait(5)
+    deadline = time.time() + 5
+    while "restart_cost_s" not in list(controller.handover_stats().values())[0] and time.time() < deadline:
+        time.sleep(0.01)
+    [stats] = controller.handover_stats().values()
+    assert stats["restart_cost_s"] == 1.0
+
+def test_restart_strategy_refuses_supervised_miner(monkeypatch):
+    monkeypatch.setattr(process_controller, "supervisor", lambda pid: "miner.service")
+    with pytest.raises(RuntimeError, match="miner.service"):
+        process_controller.StopRestartStrategy().engage(1234, [1234])
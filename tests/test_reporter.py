@@ -0,0 +1,9 @@
+import reporter
+
+def test_inventory_hash_ignores_link_power_states():
+    gpu = {"uuid": "GPU-0", "pcie_gen_current": 4, "pcie_width_current": 16, "pcie_gen_max": 4,
+           "pcie_width_max": 16, "temperature": 40, "memory_used": 100, "tier": "Tier B"}
+    idle = dict(gpu, pcie_gen_current=1, pcie_width_current=8, temperature=35, memory_used=0)
+    assert reporter.inventory_hash([gpu]) == reporter.inventory_hash([idle])
+    assert reporter.inventory_hash([gpu]) != reporter.inventory_hash([dict(gpu, pcie_width_max=8)])
+    assert reporter.inventory_hash([gpu]) != reporter.inventory_hash([dict(gpu, tier="Tier C")])
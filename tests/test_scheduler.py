@@ -0,0 +1,156 @@
+import asyncio
+import time
+
+from aiohttp import web
+
+import result_cache
+
+import container_manager
+import hardware
+import scheduler
+import transport
+
+GPUS = [{"uuid": "GPU-0", "index": 0, "memory_total": 8192, "memory_used": 0, "temperature": 60}]
+JOB_SECONDS = 1.0
+
+class BlockingMiner:
+    """Miner controller whose pause and resume block like a real process-table walk."""
+
+    def __init__(self):
+        self.calls = []
+
+    def pause(self, uuids):
+        time.sleep(0.1)
+        self.calls.append(("pause", uuids))
+
+    def resume(self, uuids):
+        time.sleep(0.1)
+        self.calls.append(("resume", uuids))
+
+def test_heartbeat_cadence_holds_while_a_job_runs(monkeypatch):
+    def blocking_scan():
+        time.sleep(0.01)
+        return [dict(gpu) for gpu in GPUS]
+
+    def blocking_run(image, command, use_gpu=False, timeout=300, device_ids=None, log_capture=None, placement=None):
+        time.sleep(JOB_SECONDS)
+        if log_capture:
+            log_capture.exit_code = 0
+            log_capture.close()
+        return "done"
+
+    monkeypatch.setattr(hardware, "scan_system", blocking_scan)
+    monkeypatch.setattr(container_manager, "run_container", blocking_run)
+    monkeypatch.setattr(container_manager, "async_client", lambda: None)
+
+    async def scenario():
+        beats = []
+        job = {"command": "PAUSE", "job_id": "long", "image": "alpine", "cmd": "sleep 1", "gpu_count": 1}
+
+        async def heartbeat(request):
+            await request.json()
+            beats.append(time.monotonic())
+            return web.json_response(job if len(beats) == 1 else {"command": "IDLE"})
+
+        app = web.Application()
+        app.router.add_post("/heartbeat", heartbeat)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/heartbeat"
+
+        miner = BlockingMiner()
+        jobs = scheduler.JobScheduler(hardware.scan_system_async, miner)
+
+        def on_command(data):
+            if data.get("command") == "PAUSE":
+                jobs.submit(data)
+
+        async def payload():
+            gpus = await hardware.scan_system_async()
+            return {"node_id": gpus[0]["uuid"], "status": "BUSY" if jobs.busy else "IDLE"}
+
+        interval = 0.05
+        poller = transport.AdaptivePoller(base_interval=interval, min_interval=interval, max_interval=interval)
+        tasks = []
+        try:
+            async with transport.create_session() as session:
+                channel = transport.JobChannel(session, url, payload, on_command, poller=poller)
+                tasks = [asyncio.create_task(jobs.run()), asyncio.create_task(channel.run_poll())]
+                while not jobs.reports:
+                    await asyncio.sleep(0.01)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await runner.cleanup()
+        return beats, jobs.reports, miner.calls
+
+    beats, reports, calls = asyncio.run(scenario())
+    assert reports[0]["status"] == "DONE" and reports[0]["duration"] >= JOB_SECONDS
+    assert calls == [("pause", ["GPU-0"]), ("resume", ["GPU-0"])]
+    # The job ran between the first beat and the last; beats kept coming throughout
+    gaps = [later - earlier for earlier, later in zip(beats, beats[1:])]
+    assert beats[-1] - beats[0] >= JOB_SECONDS
+    assert len(beats) >= JOB_SECONDS / 0.05 / 2
+    assert max(gaps) < 0.3
+
+class FixedImages:
+    """Image cache stand-in that knows every image's digest."""
+
+    async def digest_async(self, image):
+        return "sha256:" + "0" * 64
+
+    async def acquire_async(self, image):
+        return True
+
+    def release(self, image):
+        pass
+
+def test_nonzero_exit_is_failed_and_not_cached(tmp_path):
+    exit_codes = [3, 0]
+
+    async def run(image, command, use_gpu=False, device_ids=None, log_capture=None):
+        log_capture.feed(b"partial output\n")
+        log_capture.exit_code = exit_codes.pop(0)
+        return log_capture.text()
+
+    async def scenario():
+        results = result_cache.ResultCache(str(tmp_path))
+        jobs = scheduler.JobScheduler(lambda: asyncio.sleep(0, GPUS), BlockingMiner(), run=run,
+                                      image_cache=FixedImages(), result_cache=results)
+        dispatcher = asyncio.create_task(jobs.run())
+        try:
+            for job_id in ("first", "retry", "third"):
+                jobs.submit({"job_id": job_id, "image": "alpine", "cmd": "work", "gpu_count": 0, "deterministic": True})
+                while job_id in jobs.active:
+                    await asyncio.sleep(0.01)
+        finally:
+            dispatcher.cancel()
+        return jobs.reports
+
+    first, retry, third = asyncio.run(scenario())
+    assert first["status"] == "FAILED" and first["exit_code"] == 3 and "result_cache" not in first
+    assert retry["status"] == "DONE" and retry["result_cache"] == "stored"
+    assert third["result_cache"] == "hit"
+
+def test_log_capture_limits_come_from_the_scheduler():
+    seen = []
+
+    async def run(image, command, use_gpu=False, device_ids=None, log_capture=None):
+        seen.append((log_capture.head_bytes, log_capture.tail_bytes))
+        log_capture.feed(b"x" * 100)
+        log_capture.exit_code = 0
+        return log_capture.text()
+
+    async def inventory():
+        return []
+
+    async def scenario():
+        jobs = scheduler.JobScheduler(inventory, BlockingMiner(), run=run, log_head_bytes=8, log_tail_bytes=4)
+        await jobs._execute({"job_id": "cpu", "image": "alpine", "cmd": "yes"}, [])
+        [report] = jobs.reports
+        assert report["status"] == "DONE" and report["output_bytes"] == 100
+    asyncio.run(scenario())
+    assert seen == [(8, 4)]
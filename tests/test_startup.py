@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+import hardware
+import main
+import scheduler
+import simulator
+import telemetry
+from test_transport import StandIn, serve
+
+def test_first_heartbeat_within_startup_budget(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path) # Audit certificate and caches
+    monkeypatch.setattr(hardware, "_session",
+                        hardware.NVMLSession(nvml=simulator.FleetNVML(8, static=True), sysfs_root=str(tmp_path)))
+    monkeypatch.setattr(main, "METRICS_PORT", 0)
+    monkeypatch.setattr(main, "POLL_INTERVAL", 0.05)
+    monkeypatch.setattr(main, "sampler", telemetry.TelemetrySampler(hardware.scan_system_async, interval=0.05))
+    monkeypatch.setattr(main, "job_scheduler", scheduler.JobScheduler(main.current_gpus, main.miner_ctrl))
+    monkeypatch.setattr(main, "startup", {"imports": 0.0})
+    monkeypatch.setattr(main, "startup_reported", set())
+    monkeypatch.setattr(main, "beat_seq", 0)
+    write_audit = main.write_audit
+
+    def slow_audit(gpus):
+        time.sleep(0.5) # Finishes after the first beats have been acknowledged
+        write_audit(gpus)
+    monkeypatch.setattr(main, "write_audit", slow_audit)
+
+    async def scenario():
+        server = StandIn()
+        runner, base = await serve(server.app)
+        monkeypatch.setattr(main, "C2_URL", base + "/heartbeat")
+        monkeypatch.setattr(main, "C2_WS_URL", None)
+        monkeypatch.setattr(main, "process_started", time.time())
+        node = asyncio.create_task(main.main())
+        try:
+            while not server.beats:
+                await asyncio.sleep(0.01)
+            assert time.time() - main.process_started < main.STARTUP_BUDGET
+            first = server.beats[0][1]
+            assert first["startup"] == {"imports": 0.0} and first["inventory"]
+            # Timings recorded after the first beat (first_heartbeat, audit) are sent on a later one
+            deadline = time.time() + 10
+            while time.time() < deadline and not any("audit" in beat.get("startup", {}) for _, beat in server.beats):
+                await asyncio.sleep(0.05)
+            timings = [beat["startup"] for _, beat in server.beats if "startup" in beat]
+            assert any("first_heartbeat" in t for t in timings) and any("audit" in t for t in timings)
+            assert main.startup["first_heartbeat"] <= main.STARTUP_BUDGET
+        finally:
+            node.cancel()
+            await asyncio.gather(node, return_exceptions=True)
+            await runner.cleanup()
+    asyncio.run(scenario())
@@ -0,0 +1,290 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+import transport
+
+async def serve(app):
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+def test_half_open_probe_answered_with_4xx_closes_breaker():
+    async def scenario():
+        async def not_found(request):
+            return web.Response(status=404)
+        app = web.Application()
+        app.router.add_post("/heartbeat", not_found)
+        runner, base = await serve(app)
+        try:
+            async with transport.create_session() as session:
+                breaker = transport.CircuitBreaker(failure_threshold=1, reset_timeout=0)
+                client = transport.Transport(session, max_retries=0, breaker=breaker)
+                breaker.record_failure()
+                assert breaker.state == "open"
+                for _ in range(3):
+                    # Probe (and every later call) reaches the server instead of failing fast
+                    with pytest.raises(Exception) as raised:
+                        await client.post_json(base + "/heartbeat", {})
+                    assert not isinstance(raised.value, transport.CircuitOpenError)
+                    assert breaker.state == "closed"
+                assert client.counters["rejected_by_breaker"] == 0
+        finally:
+            await runner.cleanup()
+    asyncio.run(scenario())
+
+class StandIn:
+    """Local C2 stand-in: HTTP heartbeats on /heartbeat, push on /ws."""
+
+    def __init__(self, command=None):
+        self.command = command or {"command": "IDLE"}
+        self.beats = []
+        self.ws_closed = asyncio.Event()
+        self.app = web.Application()
+        self.app.router.add_post("/heartbeat", self.heartbeat)
+        self.app.router.add_get("/ws", self.ws)
+
+    def reply(self, beat):
+        # Echoes the beat's sequence number, as the C2 server does
+        return {**self.command, "ack": beat["seq"]} if "seq" in beat else self.command
+
+    async def heartbeat(self, request):
+        beat = await request.json()
+        self.beats.append(("poll", beat))
+        return web.json_response(self.reply(beat))
+
+    async def ws(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        async for msg in ws:
+            self.beats.append(("push", msg.json()))
+            await ws.send_json(self.reply(msg.json()))
+        self.ws_closed.set()
+        return ws
+
+async def counter_payload():
+    counter_payload.n += 1
+    return {"node_id": "GPU-TEST", "beat": counter_payload.n}
+counter_payload.n = 0
+
+def test_push_delivers_commands():
+    async def scenario():
+        server = StandIn({"command": "PAUSE", "job_id": 7})
+        runner, base = await serve(server.app)
+        received = []
+        try:
+            async with transport.create_session() as session:
+                channel = transport.JobChannel(session, base + "/heartbeat", counter_payload, received.append,
+                                               ws_url=base.replace("http", "ws") + "/ws", beat_interval=0.05)
+                task = asyncio.create_task(channel.run())
+                while len(received) < 3:
+                    await asyncio.sleep(0.01)
+                assert channel.mode == "push"
+                task.cancel()
+        finally:
+            await runner.cleanup()
+        assert all(kind == "push" for kind, _ in server.beats)
+        assert received[0] == {"command": "PAUSE", "job_id": 7}
+    asyncio.run(scenario())
+
+def test_falls_back_to_polling_without_push():
+    async def scenario():
+        server = StandIn()
+        runner, base = await serve(server.app)
+        received = []
+        try:
+            async with transport.create_session() as session:
+                poller = transport.AdaptivePoller(base_interval=0.05, min_interval=0.01, max_interval=0.1)
+                channel = transport.JobChannel(session, base + "/heartbeat", counter_payload, received.append,
+                                               ws_url=base.replace("http", "ws") + "/missing", poller=poller)
+                task = asyncio.create_task(channel.run())
+                while len(received) < 3:
+                    await asyncio.sleep(0.01)
+                assert channel.mode == "poll"
+                task.cancel()
+        finally:
+            await runner.cleanup()
+        assert [kind for kind, _ in server.beats][:3] == ["poll"] * 3
+    asyncio.run(scenario())
+
+def test_push_sender_failure_closes_the_socket():
+    async def scenario():
+        server = StandIn()
+        runner, base = await serve(server.app)
+        beats = 0
+
+        async def failing_payload():
+            nonlocal beats
+            beats += 1
+            if beats > 2:
+                raise RuntimeError("payload broken")
+            return {"beat": beats}
+
+        try:
+            async with transport.create_session() as session:
+                channel = transport.JobChannel(session, base + "/heartbeat", failing_payload, lambda data: None,
+                                               ws_url=base.replace("http", "ws") + "/ws", beat_interval=0.02)
+                with pytest.raises(RuntimeError):
+                    await asyncio.wait_for(channel.run_push(), 5)
+                await asyncio.wait_for(server.ws_closed.wait(), 5)
+                assert channel.mode == "poll"
+        finally:
+            await runner.cleanup()
+    asyncio.run(scenario())
+
+def test_poller_snaps_only_on_dispatch():
+    poller = transport.AdaptivePoller(base_interval=5, min_interval=1, max_interval=30, growth=2)
+    poller.on_response({"command": "Nominal"})
+    assert poller.interval == 10
+    poller.on_response({"command": "IDLE"})
+    assert poller.interval == 20
+    poller.on_response({"command": "PAUSE", "job_id": 1})
+    assert poller.interval == 1
+    poller.on_response({"command": "IDLE", "next_poll": 7})
+    assert poller.interval == 7
+    poller.on_failure()
+    assert poller.failures == 1
+    poller.on_response({})
+    assert poller.failures == 0 and poller.interval == 14
+
+def test_latency_snapshot_in_milliseconds():
+    histogram = transport.metrics.Histogram(transport.LATENCY_BUCKETS)
+    for seconds in (0.004, 0.02, 0.02, 0.3):
+        histogram.observe(seconds)
+    snapshot = transport.latency_snapshot(histogram)
+    assert snapshot["count"] == 4 and snapshot["sum_ms"] == 344.0
+    assert snapshot["p50_ms"] == 25.0 and snapshot["p99_ms"] == 500.0
+    assert snapshot["buckets_ms"][0] == 5.0 and sum(snapshot["counts"]) == 4
+
+def test_poll_response_acks_the_beat_it_answers():
+    async def scenario():
+        server = StandIn()
+        runner, base = await serve(server.app)
+        received = []
+
+        async def payload():
+            return {"seq": 42}
+
+        try:
+            async with transport.create_session() as session:
+                channel = transport.JobChannel(session, base + "/heartbeat", payload, received.append)
+                await channel.poll_once()
+        finally:
+            await runner.cleanup()
+        assert received == [{"command": "IDLE", "ack": 42}]
+    asyncio.run(scenario())
+
+def test_socket_closed_right_after_connect_falls_back_to_polling():
+    async def scenario():
+        server = StandIn()
+        connects = 0
+
+        async def slam(request):
+            nonlocal connects
+            connects += 1
+            ws = web.WebSocketResponse()
+            await ws.prepare(request)
+            await ws.close()
+            return ws
+        server.app.router.add_get("/slam", slam)
+        runner, base = await serve(server.app)
+        try:
+            async with transport.create_session() as session:
+                poller = transport.AdaptivePoller(base_interval=0.05, min_interval=0.01, max_interval=0.1)
+                channel = transport.JobChannel(session, base + "/heartbeat", counter_payload, lambda data: None,
+                                               ws_url=base.replace("http", "ws") + "/slam", poller=poller)
+                task = asyncio.create_task(channel.run())
+                await asyncio.sleep(1.5)
+                task.cancel()
+        finally:
+            await runner.cleanup()
+        # One connect, then polling for push_retry rather than a reconnect every second
+        assert connects == 1
+        assert [kind for kind, _ in server.beats][:3] == ["poll"] * 3
+    asyncio.run(scenario())
+
+class FaultyServer:
+    """Heartbeat endpoint answering the first `failures` requests with `status`, then 200."""
+
+    def __init__(self, failures: int, status: int = 503):
+        self.failures = failures
+        self.status = status
+        self.hits = 0
+        self.app = web.Application()
+        self.app.router.add_post("/heartbeat", self.heartbeat)
+
+    async def heartbeat(self, request):
+        self.hits += 1
+        if self.hits <= self.failures:
+            return web.Response(status=self.status)
+        return web.json_response({"command": "IDLE"})
+
+def run_faulty(server, scenario):
+    async def wrapped():
+        runner, base = await serve(server.app)
+        try:
+            async with transport.create_session() as session:
+                await scenario(session, base + "/heartbeat")
+        finally:
+            await runner.cleanup()
+    asyncio.run(wrapped())
+
+def test_retries_then_succeeds():
+    server = FaultyServer(failures=2)
+
+    async def scenario(session, url):
+        client = transport.Transport(session, max_retries=2, retry_base=0.001, retry_cap=0.01,
+                                     budget=transport.RetryBudget(ratio=0, min_retries=5))
+        assert await client.post_json(url, {}) == {"command": "IDLE"}
+        assert client.counters["retries"] == 2 and client.counters["failures"] == 0
+        assert client.breaker.state == "closed" and client.breaker.failures == 0
+    run_faulty(server, scenario)
+    assert server.hits == 3
+
+def test_retry_budget_exhaustion_stops_retrying():
+    server = FaultyServer(failures=100, status=502)
+
+    async def scenario(session, url):
+        client = transport.Transport(session, max_retries=3, retry_base=0.001, retry_cap=0.01,
+                                     breaker=transport.CircuitBreaker(failure_threshold=10),
+                                     budget=transport.RetryBudget(ratio=0, min_retries=1))
+        with pytest.raises(transport.TransientHTTPError):
+            await client.post_json(url, {})
+        assert server.hits == 2 # One retry, then the budget is spent
+        with pytest.raises(transport.TransientHTTPError):
+            await client.post_json(url, {})
+        assert server.hits == 3 # No retry at all
+        assert client.counters["retries"] == 1 and client.counters["budget_exhausted"] == 2
+    run_faulty(server, scenario)
+
+def test_breaker_half_open_probe_recovers():
+    server = FaultyServer(failures=2)
+
+    async def scenario(session, url):
+        breaker = transport.CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        client = transport.Transport(session, max_retries=0, breaker=breaker)
+        with pytest.raises(transport.TransientHTTPError):
+            await client.post_json(url, {})
+        assert breaker.state == "open"
+        with pytest.raises(transport.CircuitOpenError):
+            await client.post_json(url, {})
+        assert server.hits == 1 # Failed fast without sending
+
+        # A failed probe reopens the breaker with a longer wait
+        await asyncio.sleep(breaker.retry_in() + 0.01)
+        with pytest.raises(transport.TransientHTTPError):
+            await client.post_json(url, {})
+        assert breaker.state == "open" and breaker.reset_timeout == 0.1
+
+        # The next probe succeeds and closes it
+        await asyncio.sleep(breaker.retry_in() + 0.01)
+        assert await client.post_json(url, {}) == {"command": "IDLE"}
+        assert breaker.state == "closed" and breaker.reset_timeout == 0.05
+        assert await client.post_json(url, {}) == {"command": "IDLE"}
+        assert client.counters["rejected_by_breaker"] == 1 and breaker.trips == 2
+    run_faulty(server, scenario)
+    assert server.hits == 4
@@ -0,0 +1,419 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import deque
+from typing import Dict, Any, Callable, Awaitable, Optional
+
+import aiohttp
+
+import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - TRANSPORT - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def jittered(delay: float, jitter: float = 0.2) -> float:
+    """Spreads a delay by +/- jitter so the fleet does not beat in lockstep."""
+    return delay * random.uniform(1 - jitter, 1 + jitter)
+
+def backoff(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter: uniform in [0, min(cap, base * 2^attempt)]."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+JSON = "application/json"
+
+def available_codecs() -> Dict[str, tuple]:
+    """
+    {content type: (encode, decode)} in order of preference. msgpack and CBOR
+    are used when their packages are installed; JSON is always available.
+    """
+    codecs = {}
+    try:
+        import msgpack
+        codecs["application/msgpack"] = (msgpack.packb, lambda body: msgpack.unpackb(body, raw=False))
+    except ImportError:
+        pass
+    try:
+        import cbor2
+        codecs["application/cbor"] = (cbor2.dumps, cbor2.loads)
+    except ImportError:
+        pass
+    codecs[JSON] = (lambda obj: json.dumps(obj, separators=(",", ":")).encode(), json.loads)
+    return codecs
+
+def create_session(limit: int = 8, keepalive: float = 60, dns_ttl: int = 300) -> aiohttp.ClientSession:
+    """
+    Shared client session tuned for a long-lived agent: pooled keep-alive
+    connections (no TLS handshake per heartbeat) and cached DNS lookups.
+    """
+    connector = aiohttp.TCPConnector(limit=limit, keepalive_timeout=keepalive,
+                                     use_dns_cache=True, ttl_dns_cache=dns_ttl)
+    return aiohttp.ClientSession(connector=connector)
+
+# --- Resilience ---
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending while the circuit breaker is open."""
+
+class TransientHTTPError(Exception):
+    """A response worth retrying (5xx or 429)."""
+
+# Request latency buckets (seconds) for the per-transport histograms shipped in stats()
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def latency_snapshot(histogram: metrics.Histogram) -> Dict[str, Any]:
+    """A request latency histogram in milliseconds, compact enough to ship."""
+    ms = lambda seconds: None if seconds is None else round(seconds * 1000, 3)
+    return {
+        "buckets_ms": [ms(bound) for bound in histogram.buckets],
+        "counts": list(histogram.counts),
+        "count": histogram.count,
+        "sum_ms": round(histogram.sum * 1000, 2),
+        "p50_ms": ms(histogram.quantile(0.5)),
+        "p99_ms": ms(histogram.quantile(0.99))
+    }
+
+class CircuitBreaker:
+    """
+    Stops sending after failure_threshold consecutive failures.
+    While open, calls fail fast; after reset_timeout (doubled on every failed
+    probe, up to max_reset_timeout, jittered) one probe is let through.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 10, max_reset_timeout: float = 300):
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.wait = 0.0 # Jittered reset_timeout for the current open period
+        self.trips = 0
+
+    def retry_in(self) -> float:
+        """Seconds until the breaker lets a probe through (0 when closed or half-open)."""
+        if self.state != "open":
+            return 0.0
+        return max(0.0, self.opened_at + self.wait - time.monotonic())
+
+    def allow(self) -> bool:
+        if self.state == "open" and self.retry_in() == 0:
+            self.state = "half_open"
+            return True
+        return self.state == "closed"
+
+    def record_success(self):
+        if self.state != "closed":
+            logger.info("Circuit closed: server reachable again.")
+        self.state = "closed"
+        self.failures = 0
+        self.reset_timeout = self.base_reset_timeout
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open":
+            self.reset_timeout = min(self.reset_timeout * 2, self.max_reset_timeout)
+            self._open()
+        elif self.state == "closed" and self.failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.wait = jittered(self.reset_timeout)
+        self.trips += 1
+        logger.warning(f"Circuit open after {self.failures} failures; next probe in {self.wait:.1f}s")
+
+class RetryBudget:
+    """
+    Caps retries to a fraction of recent requests (plus a small floor), so a
+    server incident does not multiply fleet traffic.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 1, window: float = 60):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._requests = deque()
+        self._retries = deque()
+
+    def _trim(self, now: float):
+        for events in (self._requests, self._retries):
+            while events and events[0] < now - self.window:
+                events.popleft()
+
+    def record_request(self):
+        self._requests.append(time.monotonic())
+
+    def try_retry(self) -> bool:
+        """Spends one retry if the budget allows it."""
+        now = time.monotonic()
+        self._trim(now)
+        if len(self._retries) >= self.min_retries + self.ratio * len(self._requests):
+            return False
+        self._retries.append(now)
+        return True
+
+class Transport:
+    """
+    Request layer over the shared session: bounded retries with jittered
+    exponential backoff for transient failures, a retry budget, a circuit
+    breaker and a latency histogram per request name.
+
+    Body encoding is negotiated: requests start as JSON and advertise every
+    available codec in Accept. When the server answers in a binary type it
+    supports, later requests are sent in that type; an HTTP 415 drops back to JSON.
+    """
+
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+
+    def __init__(self, session: aiohttp.ClientSession, timeout: float = 5, max_retries: int = 2,
+                 retry_base: float = 0.5, retry_cap: float = 5, breaker: Optional[CircuitBreaker] = None,
+                 budget: Optional[RetryBudget] = None):
+        self.session = session
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_cap = retry_cap
+        self.breaker = breaker or CircuitBreaker()
+        self.budget = budget or RetryBudget()
+        self.latency: Dict[str, metrics.Histogram] = {}
+        self.codecs = available_codecs()
+        self.content_type = JSON
+        self.counters = {"requests": 0, "retries": 0, "failures": 0, "rejected_by_breaker": 0, "budget_exhausted": 0}
+
+    def observe(self, name: str, seconds: float):
+        histogram = self.latency.get(name)
+        if histogram is None:
+            histogram = self.latency[name] = metrics.Histogram(LATENCY_BUCKETS)
+        histogram.observe(seconds)
+        metrics.observe("heartbeat_rtt_seconds", seconds, request=name)
+
+    def encode(self, payload: Dict[str, Any]) -> bytes:
+        return self.codecs[self.content_type][0](payload)
+
+    def decode(self, body: bytes, content_type: str = JSON) -> Dict[str, Any]:
+        return self.codecs.get(content_type, self.codecs[JSON])[1](body)
+
+    async def _post_once(self, url: str, payload: Dict[str, Any], name: str) -> Dict[str, Any]:
+        started = time.monotonic()
+        headers = {"Content-Type": self.content_type, "Accept": ", ".join(self.codecs)}
+        try:
+            async with self.session.post(url, data=self.encode(payload), headers=headers,
+                                         timeout=aiohttp.ClientTimeout(total=self.timeout)) as response:
+                if response.status == 415 and self.content_type != JSON:
+                    logger.warning(f"Server rejected {self.content_type}; falling back to JSON")
+                    self.content_type = JSON
+                    return await self._post_once(url, payload, name)
+                if response.status in self.RETRY_STATUS:
+                    raise TransientHTTPError(f"HTTP {response.status}")
+                if response.status != 200:
+                    raise aiohttp.ClientResponseError(response.request_info, response.history,
+                                                      status=response.status, message="Heartbeat rejected")
+                body = await response.read()
+                if response.content_type in self.codecs and response.content_type != self.content_type:
+                    logger.info(f"Server speaks {response.content_type}; switching heartbeat encoding")
+                    self.content_type = response.content_type
+                return self.decode(body, response.content_type)
+        finally:
+            self.observe(name, time.monotonic() - started)
+
+    async def post_json(self, url: str, payload: Dict[str, Any], name: str = "heartbeat") -> Dict[str, Any]:
+        """
+        POSTs payload and returns the decoded JSON response.
+        Raises CircuitOpenError without sending while the breaker is open.
+        """
+        if not self.breaker.allow():
+            self.counters["rejected_by_breaker"] += 1
+            raise CircuitOpenError(f"Circuit open; retry in {self.breaker.retry_in():.0f}s")
+        self.budget.record_request()
+        self.counters["requests"] += 1
+        attempt = 0
+        while True:
+            try:
+                data = await self._post_once(url, payload, name)
+                self.breaker.record_success()
+                return data
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError, TransientHTTPError) as e:
+                retryable = attempt < self.max_retries and self.breaker.state == "closed"
+                if retryable and not self.budget.try_retry():
+                    self.counters["budget_exhausted"] += 1
+                    retryable = False
+                if not retryable:
+                    self.counters["failures"] += 1
+                    self.breaker.record_failure()
+                    raise
+                self.counters["retries"] += 1
+                logger.debug(f"Retrying {name} after: {e}")
+                await asyncio.sleep(backoff(attempt, self.retry_base, self.retry_cap))
+                attempt += 1
+            except Exception:
+                # Non-transient (e.g. 4xx): the server answered, so the breaker counts it
+                # as reachable (a half-open probe must not leave it half-open)
+                self.counters["failures"] += 1
+                self.breaker.record_success()
+                raise
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "encoding": self.content_type,
+            "breaker": self.breaker.state,
+            "breaker_trips": self.breaker.trips,
+            **self.counters,
+            "latency": {name: latency_snapshot(hist) for name, hist in self.latency.items()}
+        }
+
+class AdaptivePoller:
+    """
+    Poll interval policy for when push is unavailable.
+    - Idle and status ACKs stretch the interval towards max_interval.
+    - Dispatch commands (a job arrived) snap it back to min_interval.
+    - Failures back off exponentially up to max_backoff.
+    """
+
+    DISPATCH_COMMANDS = ("PAUSE",)
+
+    def __init__(self, base_interval: float = 5, min_interval: float = 1,
+                 max_interval: float = 30, max_backoff: float = 60, growth: float = 1.5):
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_backoff = max_backoff
+        self.growth = growth
+        self.interval = base_interval
+        self.failures = 0
+
+    def on_response(self, data: Dict[str, Any]):
+        self.failures = 0
+        hint = data.get("next_poll")
+        if isinstance(hint, (int, float)) and hint > 0:
+            # Server-provided hint wins
+            self.interval = min(max(hint, self.min_interval), self.max_interval)
+        elif data.get("command") in self.DISPATCH_COMMANDS:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.growth, self.max_interval)
+
+    def on_failure(self):
+        self.failures += 1
+
+    def next_delay(self) -> float:
+        if self.failures:
+            # Full jitter spreads a recovering fleet across the whole backoff window
+            return max(self.min_interval, backoff(self.failures, self.base_interval, self.max_backoff))
+        return jittered(self.interval)
+
+class JobChannel:
+    """
+    Delivers heartbeats and receives commands over the shared aiohttp session.
+
+    Push mode keeps a WebSocket open: heartbeats go up every beat_interval and
+    commands come down the moment the server issues them. When the socket
+    cannot be established the channel falls back to adaptive HTTP polling and
+    retries push every push_retry seconds. Over the socket, a message only
+    acknowledges a beat if it echoes the beat's "seq" as "ack". A socket that
+    closes within push_retry of connecting is treated like a failed connect.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, url: str,
+                 build_payload: Callable[[], Awaitable[Dict[str, Any]]],
+                 on_command: Callable[[Dict[str, Any]], None],
+                 ws_url: Optional[str] = None, beat_interval: float = 5,
+                 push_retry: float = 60, poller: Optional[AdaptivePoller] = None,
+                 transport: Optional[Transport] = None):
+        self.session = session
+        self.transport = transport or Transport(session)
+        self.url = url
+        self.ws_url = ws_url
+        self.build_payload = build_payload
+        self.on_command = on_command
+        self.beat_interval = beat_interval
+        self.push_retry = push_retry
+        self.poller = poller or AdaptivePoller(base_interval=beat_interval)
+        self.mode = "poll"
+
+    async def poll_once(self) -> Optional[Dict[str, Any]]:
+        """Sends one HTTP heartbeat and hands the response to on_command."""
+        payload = await self.build_payload()
+        data = await self.transport.post_json(self.url, payload)
+        if "seq" in payload:
+            # An HTTP response answers the beat it came back on, echoed or not
+            data.setdefault("ack", payload["seq"])
+        self.on_command(data)
+        return data
+
+    async def _beat_over_ws(self, ws):
+        loop = asyncio.get_running_loop()
+        while not ws.closed:
+            started = loop.time()
+            payload = await self.build_payload()
+            if self.transport.content_type == JSON:
+                await ws.send_json(payload)
+            else:
+                await ws.send_bytes(self.transport.encode(payload))
+            await asyncio.sleep(max(0, self.beat_interval - (loop.time() - started)))
+
+    async def _receive_over_ws(self, ws):
+        async for msg in ws:
+            if msg.type == aiohttp.WSMsgType.TEXT:
+                self.on_command(msg.json())
+            elif msg.type == aiohttp.WSMsgType.BINARY:
+                self.on_command(self.transport.decode(msg.data, self.transport.content_type))
+            elif msg.type == aiohttp.WSMsgType.ERROR:
+                break
+
+    async def run_push(self):
+        """
+        Runs the WebSocket channel until it closes. Raises if it cannot connect,
+        or if sending or handling stops with an error (the socket is closed first).
+        """
+        started = time.monotonic()
+        async with self.session.ws_connect(self.ws_url, heartbeat=self.beat_interval * 2) as ws:
+            self.transport.observe("ws_connect", time.monotonic() - started)
+            self.mode = "push"
+            logger.info(f"Push channel open: {self.ws_url}")
+            # Either side stopping ends the connection, so beats never stop silently
+            tasks = {asyncio.create_task(self._beat_over_ws(ws)), asyncio.create_task(self._receive_over_ws(ws))}
+            try:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                self.mode = "poll"
+        logger.warning("Push channel closed.")
+
+    async def run_poll(self, duration: Optional[float] = None):
+        """Adaptive HTTP polling, for `duration` seconds or forever."""
+        loop = asyncio.get_running_loop()
+        deadline = None if duration is None else loop.time() + duration
+        while deadline is None or loop.time() < deadline:
+            try:
+                self.poller.on_response(await self.poll_once())
+            except CircuitOpenError:
+                pass # Already logged when the breaker opened
+            except Exception as e:
+                self.poller.on_failure()
+                logger.error(f"Connection Lost: {e}")
+            # Never probe before the breaker would let the request through
+            await asyncio.sleep(max(self.poller.next_delay(), self.transport.breaker.retry_in()))
+
+    async def run(self):
+        while True:
+            if self.ws_url:
+                try:
+                    opened = time.monotonic()
+                    await self.run_push()
+                    if time.monotonic() - opened > self.push_retry:
+                        await asyncio.sleep(jittered(1)) # Clean close of a long-lived socket: reconnect promptly
+                        continue
+                    # Closed soon after connecting: back off like a failed connect instead of reconnecting in a loop
+                    logger.warning("Push channel closed right after connecting. Falling back to polling.")
+                except Exception as e:
+                    logger.warning(f"Push unavailable ({e}). Falling back to polling.")
+            await self.run_poll(self.push_retry if self.ws_url else None)